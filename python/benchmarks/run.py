@@ -0,0 +1,378 @@
+"""
+Benchmarks for the vision, control and comms hot paths.
+
+    python benchmarks/run.py                 # run everything, compare with baselines.json
+    python benchmarks/run.py --only vision   # cases whose name contains "vision"
+    python benchmarks/run.py --update        # record the current numbers as the new baselines
+
+A case fails when its throughput drops, or its p99 latency grows, by more than the
+tolerance recorded in baselines.json (overridable on the command line). Each case is
+warmed up, then timed in several rounds, and the whole case is repeated; the median of
+each is reported, so one lucky or unlucky stretch cannot set or break the bar.
+
+Baselines are machine specific: re-record them with --update on the machine that runs
+the check. --update runs everything a second time against the new numbers and only
+writes them if that run passes.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import codec, config, detection  # noqa: E402
+from src.codec import FRAME_HEADER  # noqa: E402
+from src.shared import make_persons  # noqa: E402
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_TOLERANCES = {"throughput": 0.5, "p99": 1.5}
+
+FRAME_SHAPE = (config.FRAME_HEIGHT, config.FRAME_WIDTH, 3)
+PERSON_COUNTS = {"0": 0, "1": 1, "many": 12}
+
+
+class Measurement:
+    def __init__(self, samples_s, elapsed_s, ops):
+        self.samples_s = np.asarray(samples_s, dtype=np.float64)
+        self.elapsed_s = elapsed_s
+        self.ops = ops
+
+    def summary(self):
+        return {
+            "throughput_per_s": self.ops / self.elapsed_s,
+            "p50_ms": float(np.percentile(self.samples_s, 50) * 1000),
+            "p99_ms": float(np.percentile(self.samples_s, 99) * 1000),
+        }
+
+
+def time_calls(func, iterations, warmup_s=1.0, rounds=5):
+    """Times `iterations` calls of `func` per round, after `warmup_s` of untimed calls, and keeps the median round."""
+    warmup_end = time.perf_counter() + warmup_s
+    while time.perf_counter() < warmup_end:
+        func()
+    measurements = []
+    for _ in range(rounds):
+        samples = np.empty(iterations)
+        start = time.perf_counter()
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            func()
+            samples[i] = time.perf_counter() - t0
+        measurements.append(Measurement(samples, time.perf_counter() - start, iterations))
+    measurements.sort(key=lambda measurement: measurement.elapsed_s)
+    return measurements[len(measurements) // 2]
+
+
+# --- vision -------------------------------------------------------------------------
+
+class SyntheticDetector(detection.ExportedYoloDetector):
+    """
+    Exported-graph detector whose network is replaced by a canned raw YOLOv8 output, so
+    pre-processing, decoding, NMS and annotation are measured without model weights.
+    """
+
+    def __init__(self, persons, seed=0):
+        super().__init__(model_path=None)
+        self.output = self._raw_output(persons, np.random.default_rng(seed))
+
+    def load(self):
+        pass
+
+    def _infer(self, blob):
+        return self.output
+
+    def _raw_output(self, persons, rng, num_classes=80, candidates_per_person=20):
+        num_anchors = sum((self.imgsz // stride) ** 2 for stride in (8, 16, 32))
+        output = np.zeros((1, 4 + num_classes, num_anchors), dtype=np.float32)
+        output[0, :4] = rng.uniform(0, self.imgsz, (4, num_anchors))
+        output[0, 4:] = rng.uniform(0, self.conf * 0.5, (num_classes, num_anchors))
+        anchors = rng.choice(num_anchors, persons * candidates_per_person, replace=False)
+        for person, chunk in enumerate(np.split(anchors, persons) if persons else []):
+            cx, cy = rng.uniform(80, self.imgsz - 80, 2)
+            # Overlapping candidates around each person, as the real head produces
+            output[0, 0, chunk] = cx + rng.normal(0, 3, chunk.size)
+            output[0, 1, chunk] = cy + rng.normal(0, 3, chunk.size)
+            output[0, 2, chunk] = 40 + rng.normal(0, 2, chunk.size)
+            output[0, 3, chunk] = 100 + rng.normal(0, 4, chunk.size)
+            output[0, 4 + detection.PERSON_CLASS_ID, chunk] = rng.uniform(self.conf, 0.95, chunk.size)
+        return output
+
+
+def bench_scan_for_person(persons, annotate, iterations):
+    frame = np.random.default_rng(1).integers(0, 255, FRAME_SHAPE, dtype=np.uint8)
+    detection._detector = SyntheticDetector(persons)
+    result = detection.scan_for_person(frame, annotate=annotate)[0]
+    assert len(result) == persons, f"expected {persons} persons, decoded {len(result)}"
+    return time_calls(lambda: detection.scan_for_person(frame, annotate=annotate), iterations)
+
+
+def bench_scan_for_person_model(iterations):
+    frame = np.random.default_rng(1).integers(0, 255, FRAME_SHAPE, dtype=np.uint8)
+    detection._detector = detection.create_detector()
+    detection._detector.ensure_loaded()
+    return time_calls(lambda: detection.scan_for_person(frame, annotate=False), iterations)
+
+
+# --- control ------------------------------------------------------------------------
+
+def synthetic_persons(count, seed=0):
+    rng = np.random.default_rng(seed)
+    x_min = rng.uniform(0, config.FRAME_WIDTH - 80, count)
+    y_min = rng.uniform(0, config.FRAME_HEIGHT - 130, count)
+    persons = make_persons(np.stack([x_min, y_min, x_min + 40 + rng.uniform(0, 40, count),
+                                     y_min + 100 + rng.uniform(0, 30, count), rng.uniform(0.3, 0.95, count)], axis=1))
+    persons["track_id"] = np.arange(count)
+    return persons
+
+
+def bench_offset_and_velocity(persons, iterations):
+    """For a person array of `persons` persons, or for a single PersonBoundingBox if `persons` is None."""
+    from src.offset import PersonBoundingBox, calculate_offset, calculate_velocity_command
+    if persons is None:
+        frame = PersonBoundingBox(300.0, 200.0, 380.0, 330.0, 0.9)
+    else:
+        frame = synthetic_persons(persons)
+    return time_calls(lambda: calculate_velocity_command(calculate_offset(frame)), iterations)
+
+
+def bench_select_target(policy, iterations):
+    from src.offset import calculate_offset, select_target
+    frame = synthetic_persons(PERSON_COUNTS["many"])
+    track_id = int(frame["track_id"][-1])
+    return time_calls(lambda: select_target(frame, calculate_offset(frame), policy, track_id), iterations)
+
+
+def bench_centering_update(iterations):
+    """One control tick with a detection arriving every fifth tick, as at 20Hz control / 4Hz inference."""
+    from src.offset import CenteringController, calculate_offset
+    controller = CenteringController()
+    offset = calculate_offset(synthetic_persons(1)[0])
+    clock = {"now": 0.0, "ticks": 0}
+
+    def tick():
+        clock["now"] += 0.05
+        clock["ticks"] += 1
+        if clock["ticks"] % 5 == 0:
+            controller.observe(offset, clock["now"] - 0.15, 10.0)
+        controller.update(clock["now"], 0.5, -0.3)
+
+    return time_calls(tick, iterations)
+
+
+def bench_geolocate(persons, iterations):
+    """Ground positions of every person in a frame, from telemetry matched to the capture time."""
+    from pymavlink import mavutil
+    from src.geolocation import Geolocator
+    from src.telemetry import TelemetryCache
+    telemetry = TelemetryCache()
+    telemetry.update(mavutil.mavlink.MAVLink_global_position_int_message(0, 473977420, 85455940, 548000, 60000, 0, 0, 0, 0))
+    telemetry.update(mavutil.mavlink.MAVLink_attitude_message(0, 0.02, -0.05, 1.2, 0.0, 0.0, 0.0))
+    geolocator = Geolocator(telemetry, tolerance_s=None)
+    frame = synthetic_persons(persons)
+    capture_time = time.monotonic()
+    return time_calls(lambda: geolocator.locate(frame, capture_time), iterations)
+
+
+# --- comms --------------------------------------------------------------------------
+
+class LoopbackBaseStation(threading.Thread):
+    """Stand-in for the C++ base station: reads length-prefixed frames and ACKs each one."""
+
+    ACK = codec.encode_json({"status": "success"})
+
+    def __init__(self):
+        super().__init__(name="loopback-base-station", daemon=True)
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.receive_times = []
+        self.condition = threading.Condition()
+
+    def run(self):
+        sock, _ = self.listener.accept()
+        buffer = b""
+        with sock:
+            while True:
+                try:
+                    data = sock.recv(65536)
+                except ConnectionResetError:
+                    return
+                if not data:
+                    return
+                buffer += data
+                while len(buffer) >= FRAME_HEADER.size:
+                    (length,) = FRAME_HEADER.unpack_from(buffer)
+                    if len(buffer) < FRAME_HEADER.size + length:
+                        break
+                    payload = buffer[FRAME_HEADER.size:FRAME_HEADER.size + length]
+                    buffer = buffer[FRAME_HEADER.size + length:]
+                    received = time.perf_counter()
+                    count = len(codec.decode_frame(payload))
+                    sock.sendall(FRAME_HEADER.pack(len(self.ACK)) + self.ACK)
+                    with self.condition:
+                        self.receive_times.extend([received] * count)
+                        self.condition.notify_all()
+
+    def wait_for(self, count, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.receive_times) >= count, timeout)
+
+
+def bench_link_burst(wire_format, burst, repeats=5):
+    from src.communication import BaseStationLink
+    server = LoopbackBaseStation()
+    server.start()
+    link = BaseStationLink("127.0.0.1", server.port, max_queue_size=burst, wire_format=wire_format)
+    messages = [{
+        "message_type": "gps_coordinates",
+        "timestamp": int(time.time() * 1000) + i,
+        "latitude": 47.397742 + i * 1e-6,
+        "longitude": 8.545594 - i * 1e-6,
+        "altitude": 20.0,
+    } for i in range(burst)]
+
+    latencies = []
+    elapsed = 0.0
+    try:
+        for repeat in range(repeats + 1):
+            already = len(server.receive_times)
+            start = time.perf_counter()
+            enqueue_times = []
+            for message in messages:
+                enqueue_times.append(time.perf_counter())
+                link.enqueue(message)
+            if not server.wait_for(already + burst, timeout=30.0):
+                raise RuntimeError(f"base station received {len(server.receive_times) - already} of {burst} messages")
+            if repeat == 0:
+                continue  # warm-up: connection setup
+            received = server.receive_times[already:already + burst]
+            elapsed += received[-1] - start
+            latencies.extend(np.asarray(received) - np.asarray(enqueue_times))
+        if link.dropped:
+            raise RuntimeError(f"link dropped {link.dropped} messages")
+    finally:
+        link.close()
+    return Measurement(latencies, elapsed, burst * repeats)
+
+
+# --- runner -------------------------------------------------------------------------
+
+def build_cases(args):
+    cases = {}
+    for label, persons in PERSON_COUNTS.items():
+        cases[f"vision.scan_for_person[{label}]"] = \
+            lambda persons=persons: bench_scan_for_person(persons, False, args.iterations)
+    cases["vision.scan_for_person_annotated[many]"] = \
+        lambda: bench_scan_for_person(PERSON_COUNTS["many"], True, args.iterations)
+    if args.model:
+        cases["vision.scan_for_person_model"] = lambda: bench_scan_for_person_model(args.iterations)
+    cases["control.offset_and_velocity"] = lambda: bench_offset_and_velocity(None, args.iterations * 50)
+    for label in ("1", "many"):
+        cases[f"control.offset_and_velocity[{label}]"] = \
+            lambda label=label: bench_offset_and_velocity(PERSON_COUNTS[label], args.iterations * 50)
+    for policy in ("largest", "most_central", "tracked"):
+        cases[f"control.select_target[{policy}]"] = \
+            lambda policy=policy: bench_select_target(policy, args.iterations * 50)
+    cases["control.centering_update"] = lambda: bench_centering_update(args.iterations * 50)
+    for label in ("1", "many"):
+        cases[f"control.geolocate[{label}]"] = \
+            lambda label=label: bench_geolocate(PERSON_COUNTS[label], args.iterations * 50)
+    for wire_format in ("json", "binary"):
+        cases[f"comms.link_burst[{wire_format}]"] = \
+            lambda wire_format=wire_format: bench_link_burst(wire_format, args.burst)
+    return {name: case for name, case in cases.items() if not args.only or any(o in name for o in args.only)}
+
+
+def compare(summary, baseline, tolerances):
+    """Returns the list of regressions of `summary` against `baseline`."""
+    problems = []
+    min_throughput = baseline["throughput_per_s"] * (1 - tolerances["throughput"])
+    if summary["throughput_per_s"] < min_throughput:
+        problems.append(f"throughput {summary['throughput_per_s']:.1f}/s < {min_throughput:.1f}/s")
+    max_p99 = baseline["p99_ms"] * (1 + tolerances["p99"])
+    if summary["p99_ms"] > max_p99:
+        problems.append(f"p99 {summary['p99_ms']:.3f}ms > {max_p99:.3f}ms")
+    return problems
+
+
+def measure(case, repeats):
+    """Runs `case` `repeats` times and returns the summary of the run with the median throughput."""
+    summaries = sorted((case().summary() for _ in range(repeats)), key=lambda summary: summary["throughput_per_s"])
+    return summaries[len(summaries) // 2]
+
+
+def run_cases(cases, baselines, tolerances, repeats):
+    """Measures and prints every case. Returns the summaries and whether any case failed or regressed."""
+    failed = False
+    results = {}
+    print(f"{'case':<42} {'ops/s':>12} {'p50 ms':>10} {'p99 ms':>10}  status")
+    for name, case in cases.items():
+        try:
+            summary = measure(case, repeats)
+        except Exception as e:
+            print(f"{name:<42} {'':>12} {'':>10} {'':>10}  ERROR: {e!r}")
+            failed = True
+            continue
+        results[name] = summary
+        baseline = baselines.get(name)
+        if baseline is None:
+            status = "no baseline"
+        else:
+            problems = compare(summary, baseline, tolerances)
+            status = "REGRESSION: " + "; ".join(problems) if problems else "ok"
+            failed = failed or bool(problems)
+        print(f"{name:<42} {summary['throughput_per_s']:>12.1f} {summary['p50_ms']:>10.3f} {summary['p99_ms']:>10.3f}  {status}")
+    return results, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the hot-path benchmarks and check them against baselines.")
+    parser.add_argument("--only", nargs="*", help="run only cases whose name contains one of these strings")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per vision case (control runs 50x more)")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of each case; the median run is reported")
+    parser.add_argument("--burst", type=int, default=1000, help="messages per comms burst")
+    parser.add_argument("--model", action="store_true", help="also benchmark the configured detector with real weights")
+    parser.add_argument("--update", action="store_true",
+                        help="write the results as the new baselines, if a second run passes them")
+    parser.add_argument("--throughput-tolerance", type=float, help="allowed fractional throughput drop")
+    parser.add_argument("--p99-tolerance", type=float, help="allowed fractional p99 latency increase")
+    args = parser.parse_args()
+
+    baselines = {"tolerances": dict(DEFAULT_TOLERANCES), "cases": {}}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+    tolerances = dict(baselines.get("tolerances", DEFAULT_TOLERANCES))
+    if args.throughput_tolerance is not None:
+        tolerances["throughput"] = args.throughput_tolerance
+    if args.p99_tolerance is not None:
+        tolerances["p99"] = args.p99_tolerance
+
+    cases = build_cases(args)
+    results, failed = run_cases(cases, baselines["cases"], tolerances, args.repeats)
+    if not args.update:
+        return 1 if failed else 0
+
+    candidates = {name: {key: round(value, 4) for key, value in summary.items()} for name, summary in results.items()}
+    print("\nVerifying the new baselines with a second run...")
+    _, unstable = run_cases({name: cases[name] for name in candidates}, candidates, tolerances, args.repeats)
+    if unstable:
+        print("Baselines not written: this machine does not reproduce them. Re-run on a quieter machine.")
+        return 1
+    baselines["tolerances"] = tolerances
+    baselines["cases"].update(candidates)
+    with open(BASELINES_PATH, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Baselines written to {BASELINES_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,54 +1,82 @@
-import time
-from src.drone_controller import DroneController
-from src.communication import BaseStationCommunicator
-from src import config
+import logging
+from src.preflight import Preflight
+from src.communication import BaseStationCommunicator, close_links
+from src import metrics
+from src.route_planner import RoutePlanner
+
+logger = logging.getLogger("deliver")
 
 def main():
     """
     Main function for the delivery drone.
     Orchestrates the multi-location delivery mission.
         - Waits for coordinates, flies to the location, detect the person, centers the person and then drops the payload.
+        - Targets that queue up are visited in a planned order that keeps the total flight distance short.
 
     """
-    print("Delivery drone initiated.")
+    metrics.configure_logging()
+    metrics.start_exporter()
+    logger.info("Delivery drone initiated.")
 
-    drone = DroneController()
     communicator = BaseStationCommunicator()
 
-    if not drone.connect():
-        print("Failed to connect to drone. Exiting.")
-        return
+    try:
+        # Listen for targets right away so ones sent during preflight or in flight are queued
+        if not communicator.start_receiving().is_running:
+            logger.error("Failed to start listening for delivery coordinates. Exiting.")
+            return
+
+        # The camera is only checked here; each delivery opens it for its own approach
+        preflight = Preflight(keep_camera=False)
+        if not preflight.run():
+            logger.error("Preflight failed. Exiting.")
+            return
+        drone = preflight.drone
+
+        # Launch position, used to keep enough battery for the return leg
+        home = drone.get_current_gps()
+        planner = RoutePlanner(home)
 
-    if not drone.start_offboard_mode():
-        print("Failed to set offboard mode. Exiting.")
-        return
+        # Main mission loop
+        while True:
+            new_targets = communicator.pending_coordinates()
+            if not new_targets and not len(planner):
+                logger.info("Waiting for next delivery location from base station...")
+                target_gps = communicator.receive_coordinates()
 
-    # Main mission loop
-    while True:
-        print("\nWaiting for next delivery location from base station...")
-        target_gps = communicator.receive_coordinates()
+                if not target_gps:
+                    logger.info("No coordinates received or an error occurred. Mission complete or standing by.")
+                    break
+                new_targets = [target_gps]
 
-        if not target_gps:
-            print("No coordinates received or an error occurred. Mission complete or standing by.")
-            break
+            # Re-plan the visiting order whenever new targets arrive
+            position = drone.get_current_gps()
+            if new_targets:
+                logger.info("Received %d new target(s); %d pending.", len(new_targets), len(planner) + len(new_targets))
+                planner.add(new_targets, position)
 
-        print(f"Received new target: Lat: {target_gps.latitude_deg}, Lon: {target_gps.longitude_deg}")
+            if position and not planner.within_budget(position, drone.flight_budget_m()):
+                logger.warning("Not enough battery to reach the next target and return. %d target(s) not delivered.", len(planner))
+                break
 
-        # 1. Navigate to the target GPS coordinates
-        if not drone.goto_gps_coordinates(target_gps):
-            print(f"Failed to navigate to the delivery location. Skipping to next.")
-            continue
+            target_gps = planner.pop_next()
+            logger.info("Next target: Lat: %s, Lon: %s", target_gps.latitude_deg, target_gps.longitude_deg)
 
-        # 2. Start the centering and payload drop sequence
-        print("Reached delivery location. Starting final approach and payload drop.")
-        drone.center_on_person_and_drop_payload()
+            # 1. Navigate to the target GPS coordinates, scanning for the person on the way
+            # 2. Center on the person and drop the payload
+            if not drone.deliver_to(target_gps):
+                logger.warning("Delivery to this location failed. Skipping to next.")
+                continue
 
-    # 3. After all deliveries, return to base or land
-    print("\nDelivery mission finished. Returning to home.")
-    if not drone.return_to_home():
-        print("Failed to initiate Return to Launch (RTL).")
+        # 3. After all deliveries, return to base or land
+        logger.info("Delivery mission finished. Returning to home.")
+        if not drone.return_to_home():
+            logger.error("Failed to initiate Return to Launch (RTL).")
 
-    print("Delivery mission complete.")
+        logger.info("Delivery mission complete.")
+    finally:
+        # Sends what is still queued for the base station and spools the rest
+        close_links()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
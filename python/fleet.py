@@ -0,0 +1,30 @@
+import logging
+from src import config, metrics
+from src.detector_pool import DetectorPool
+from src.fleet import FleetManager
+
+logger = logging.getLogger("fleet")
+
+
+def main():
+    """
+    Main function for a ground node running several vehicles.
+    Connects every vehicle in `config.FLEET_VEHICLES`, loads the detector once for all of
+    their cameras, lets the scouts search and sends delivery drones to what they find.
+    """
+
+    metrics.configure_logging()
+    metrics.start_exporter()
+    logger.info("Fleet of %d vehicle(s) initiated.", len(config.FLEET_VEHICLES))
+
+    fleet = FleetManager(detector=DetectorPool())
+    try:
+        if not fleet.connect():
+            logger.error("No vehicle connected. Exiting.")
+            return
+        fleet.run()
+    finally:
+        fleet.close()
+
+if __name__ == "__main__":
+    main()
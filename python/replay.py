@@ -0,0 +1,101 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import sys
+import time
+
+from src import config
+from src.capture import open_capture
+from src.metrics import configure_logging
+from src.replay import FakeAutopilot, ReplayDroneController, ReplayMetrics, SimulatedCamera, offset_position
+
+logger = logging.getLogger("replay")
+
+
+def run_step(drone, coro, deadline, name):
+    """Runs one mission step on the drone's runtime. Returns its result, or False if the deadline passes."""
+    future = drone.runtime.submit(coro)
+    try:
+        return future.result(max(deadline - time.monotonic(), 0.0))
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        logger.warning("%s did not finish before the timeout.", name.capitalize())
+        return False
+
+
+def run_mission(drone, autopilot, args):
+    deadline = time.monotonic() + args.timeout
+    if not run_step(drone, drone.takeoff_async(args.altitude), deadline, "takeoff"):
+        return False
+
+    if args.mission == "center":
+        return bool(run_step(drone, drone.center_and_drop_async(), deadline, "centering"))
+    if args.mission == "deliver":
+        target = offset_position(autopilot.home, args.target_north, args.target_east, args.altitude)
+        return bool(run_step(drone, drone.deliver_to_async(target, args.altitude), deadline, "delivery"))
+    # The scout loop ends when the recorded source runs out
+    future = drone.runtime.submit(drone.scout_async())
+    try:
+        future.result(max(deadline - time.monotonic(), 0.0))
+        return True
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        return True
+
+
+def main():
+    """
+    Runs a mission offline: frames come from a video file or image directory and the
+    vehicle is a scripted fake autopilot on a local UDP port (optionally replaying a
+    tlog). Prints frames/s, detection-to-velocity-command latency and time-to-center.
+    """
+    parser = argparse.ArgumentParser(description="Replay a mission against recorded frames and a fake autopilot.")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--mission", choices=("center", "deliver", "scout"), default="center")
+    parser.add_argument("--tlog", help="replay vehicle telemetry from this tlog instead of simulating it")
+    parser.add_argument("--port", type=int, default=14650, help="local UDP port for the fake autopilot")
+    parser.add_argument("--altitude", type=float, default=10.0, help="takeoff and delivery altitude (m)")
+    parser.add_argument("--target-north", type=float, default=30.0, help="deliver: target offset north of home (m)")
+    parser.add_argument("--target-east", type=float, default=0.0, help="deliver: target offset east of home (m)")
+    parser.add_argument("--pixels-per-m", type=float, default=40.0, help="image shift per metre the vehicle moves")
+    parser.add_argument("--fast", action="store_true", help="read the source as fast as it decodes instead of at its frame rate")
+    parser.add_argument("--loop", action="store_true", help="restart an image directory after its last image")
+    parser.add_argument("--timeout", type=float, default=120.0, help="give up on the mission after this many seconds")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+    configure_logging()
+
+    # Headless and self-contained: no windows, nothing spooled for a base station that is not there
+    config.ENABLE_VIDEO_DISPLAY = False
+    config.SPOOL_ENABLED = False
+    config.REPLAY_LOOP_IMAGES = args.loop
+
+    autopilot = FakeAutopilot(f"udpout:127.0.0.1:{args.port}", tlog=args.tlog)
+    autopilot.start()
+
+    metrics = ReplayMetrics()
+    camera = lambda: SimulatedCamera(open_capture(args.source, realtime=not args.fast), autopilot, args.pixels_per_m)
+    drone = ReplayDroneController(camera, metrics)
+    drone.connection_url = f"udpin:127.0.0.1:{args.port}"
+
+    completed = False
+    try:
+        if drone.connect() and drone.start_offboard_mode():
+            completed = run_mission(drone, autopilot, args)
+    finally:
+        autopilot.stop()
+        if drone.telemetry is not None:
+            drone.telemetry.stop()
+
+    report = metrics.report()
+    report.update({"mission": args.mission, "completed": completed})
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if completed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,31 @@
-import time
-from src.drone_controller import DroneController
+import logging
+from src.preflight import Preflight
+from src import metrics
+from src.communication import close_links
+
+logger = logging.getLogger("scout")
 
 
 def main():
     """
     Main function for the scout drone.
-    Connects to the drone, scans for a person, and sends their location.
+    Brings up the drone, detector and camera together, scans for persons, and sends their locations.
     """
 
-    print("Scout drone initiated.")
-
-    drone = DroneController()
-    
-    if not drone.connect():
-        return
+    metrics.configure_logging()
+    metrics.start_exporter()
+    logger.info("Scout drone initiated.")
 
-    if not drone.start_offboard_mode():
-        return
+    try:
+        preflight = Preflight()
+        if not preflight.run():
+            logger.error("Preflight failed. Exiting.")
+            return
 
-    drone.start_person_detection_and_communication()
+        preflight.drone.start_person_detection_and_communication()
+    finally:
+        # Sends what is still queued for the base station and spools the rest
+        close_links()
 
 if __name__ == "__main__":
     main()
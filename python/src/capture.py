@@ -0,0 +1,94 @@
+import os
+import time
+
+import cv2
+
+from src import config
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class ImageDirectoryCapture:
+    """
+    Serves the images in a directory, in name order, through the `cv2.VideoCapture`
+    methods the pipeline uses. With `loop` the sequence restarts after the last image.
+    """
+
+    def __init__(self, directory, loop=False):
+        self.paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.loop = loop
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self.index = 0
+        image = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return image is not None, image
+
+    def get(self, prop):
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self.paths = []
+
+
+class PacedCapture:
+    """Delivers frames from a recorded source no faster than `fps`, the way a live camera would."""
+
+    def __init__(self, capture, fps):
+        self.capture = capture
+        self.period = 1.0 / fps
+        self.next_frame_time = None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        now = time.monotonic()
+        if self.next_frame_time is None:
+            self.next_frame_time = now
+        elif now < self.next_frame_time:
+            time.sleep(self.next_frame_time - now)
+        self.next_frame_time = max(self.next_frame_time + self.period, time.monotonic() - self.period)
+        return self.capture.read()
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def release(self):
+        self.capture.release()
+
+
+def open_capture(source, realtime=config.REPLAY_REALTIME):
+    """
+    Opens a frame source for the camera pipeline.
+
+    `source` is a camera index or stream URL, a video file, a directory of images, or a
+    callable returning a capture-like object. Recorded sources are paced at their frame
+    rate when `realtime` is set, otherwise they are read as fast as they decode.
+    """
+    if callable(source):
+        return source()
+    if isinstance(source, str) and os.path.isdir(source):
+        capture = ImageDirectoryCapture(source, loop=config.REPLAY_LOOP_IMAGES)
+        return PacedCapture(capture, config.REPLAY_IMAGE_FPS) if realtime else capture
+
+    capture = cv2.VideoCapture(source)
+    if realtime and isinstance(source, str) and os.path.isfile(source):
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        return PacedCapture(capture, fps if fps > 0 else config.REPLAY_IMAGE_FPS)
+    return capture
@@ -0,0 +1,163 @@
+import json
+import struct
+
+# Every message on a base station stream is prefixed with its length as a 4-byte
+# big-endian integer
+FRAME_HEADER = struct.Struct("!I")
+
+# Binary telemetry frames (all fields little-endian):
+#   header : magic b"DB", format version (u8), record count (u8)
+#   records: record type (u8) followed by that type's fixed layout
+# Latitude/longitude are degrees * 1e7 (same scaling as MAVLink), timestamps are Unix ms.
+# A vehicle record tags the records after it with a drone's MAVLink system id (0 for
+# untagged), so one frame can carry the traffic of a whole fleet.
+MAGIC = b"DB"
+VERSION = 1
+MAX_RECORDS_PER_FRAME = 255
+
+HEADER = struct.Struct("<2sBB")
+GPS_RECORD = struct.Struct("<Qiif")  # timestamp, latitude, longitude, altitude_m
+STATUS_RECORD = struct.Struct("<QB")  # timestamp, flag
+VEHICLE_RECORD = struct.Struct("<B")  # MAVLink system id
+
+GPS_COORDINATES = 1
+PAYLOAD_STATUS = 2
+PERSON_DETECTION_STATUS = 3
+VEHICLE = 4
+
+RECORD_TYPES = {
+    "gps_coordinates": GPS_COORDINATES,
+    "payload_status": PAYLOAD_STATUS,
+    "person_detection_status": PERSON_DETECTION_STATUS,
+}
+STATUS_FIELDS = {
+    PAYLOAD_STATUS: ("payload_status", "dropped"),
+    PERSON_DETECTION_STATUS: ("person_detection_status", "detected"),
+}
+
+
+class CodecError(ValueError):
+    pass
+
+
+def encode_json(message):
+    try:
+        return json.dumps(message, separators=(",", ":")).encode("utf-8")
+    except (TypeError, ValueError) as e:
+        raise CodecError(f"Cannot encode message as JSON: {e}") from None
+
+
+def encode_binary(messages):
+    """
+    Packs up to MAX_RECORDS_PER_FRAME message dicts into one binary frame. A missing field,
+    or a value the record layout cannot hold (NaN, None, a drone_id over 255...), raises
+    CodecError.
+    """
+    try:
+        return _encode_binary(messages)
+    except (KeyError, TypeError, ValueError, OverflowError, struct.error) as e:
+        if isinstance(e, CodecError):
+            raise
+        raise CodecError(f"Message does not fit the binary layout: {e!r}") from None
+
+
+def _encode_binary(messages):
+    if len(messages) > MAX_RECORDS_PER_FRAME:
+        raise CodecError(f"At most {MAX_RECORDS_PER_FRAME} records fit in one frame, got {len(messages)}")
+
+    parts = []
+    record_count = len(messages)
+    drone_id = 0
+    for message in messages:
+        message_type = message.get("message_type")
+        record_type = RECORD_TYPES.get(message_type)
+        if record_type is None:
+            raise CodecError(f"No binary layout for message type '{message_type}'")
+
+        if message.get("drone_id", 0) != drone_id:
+            drone_id = message.get("drone_id", 0)
+            parts.append(bytes((VEHICLE,)) + VEHICLE_RECORD.pack(drone_id))
+            record_count += 1
+        parts.append(bytes((record_type,)))
+        if record_type == GPS_COORDINATES:
+            parts.append(GPS_RECORD.pack(
+                message["timestamp"],
+                int(round(message["latitude"] * 1e7)),
+                int(round(message["longitude"] * 1e7)),
+                message["altitude"]))
+        else:
+            _, field = STATUS_FIELDS[record_type]
+            parts.append(STATUS_RECORD.pack(message["timestamp"], int(bool(message[field]))))
+
+    if record_count > MAX_RECORDS_PER_FRAME:
+        raise CodecError(f"At most {MAX_RECORDS_PER_FRAME} records fit in one frame, got {record_count}")
+    return HEADER.pack(MAGIC, VERSION, record_count) + b"".join(parts)
+
+
+def is_binary(payload):
+    return payload[:len(MAGIC)] == MAGIC
+
+
+def decode_binary(payload):
+    if len(payload) < HEADER.size:
+        raise CodecError("Truncated frame header")
+    magic, version, count = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC:
+        raise CodecError("Not a binary telemetry frame")
+    if version != VERSION:
+        raise CodecError(f"Unsupported binary frame version {version}")
+
+    messages = []
+    offset = HEADER.size
+    drone_id = 0
+    try:
+        for _ in range(count):
+            record_type = payload[offset]
+            offset += 1
+            if record_type == VEHICLE:
+                (drone_id,) = VEHICLE_RECORD.unpack_from(payload, offset)
+                offset += VEHICLE_RECORD.size
+                continue
+            if record_type == GPS_COORDINATES:
+                timestamp, latitude, longitude, altitude = GPS_RECORD.unpack_from(payload, offset)
+                offset += GPS_RECORD.size
+                messages.append({
+                    "message_type": "gps_coordinates",
+                    "timestamp": timestamp,
+                    "latitude": latitude / 1e7,
+                    "longitude": longitude / 1e7,
+                    "altitude": altitude,
+                })
+            elif record_type in STATUS_FIELDS:
+                timestamp, flag = STATUS_RECORD.unpack_from(payload, offset)
+                offset += STATUS_RECORD.size
+                message_type, field = STATUS_FIELDS[record_type]
+                messages.append({"message_type": message_type, "timestamp": timestamp, field: bool(flag)})
+            else:
+                raise CodecError(f"Unknown record type {record_type}")
+            if drone_id:
+                messages[-1]["drone_id"] = drone_id
+    except (IndexError, struct.error):
+        raise CodecError("Truncated binary frame") from None
+    return messages
+
+
+def encode_frame(messages, wire_format):
+    """Encodes a batch of messages as one frame payload. JSON frames carry exactly one message."""
+    if wire_format == "binary":
+        return encode_binary(messages)
+    if wire_format == "json":
+        if len(messages) != 1:
+            raise CodecError("JSON frames carry exactly one message")
+        return encode_json(messages[0])
+    raise CodecError(f"Unknown wire format '{wire_format}'")
+
+
+def decode_frame(payload):
+    """Decodes a frame payload of either format into a list of message dicts."""
+    if is_binary(payload):
+        return decode_binary(payload)
+    try:
+        return [json.loads(payload.decode("utf-8"))]
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise CodecError(f"Invalid JSON frame: {e}") from None
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from pymavlink import mavutil
+
+from src import config
+from src.metrics import METRICS
+from src.telemetry import TelemetryCache
+
+logger = logging.getLogger(__name__)
+
+
+class CommandTimeoutError(TimeoutError):
+    pass
+
+
+def command_name(command):
+    entry = mavutil.mavlink.enums['MAV_CMD'].get(command)
+    return entry.name if entry else str(command)
+
+
+class PendingCommand:
+    def __init__(self, command, params, timeout, max_retransmits):
+        self.command = command
+        self.params = params
+        self.timeout = timeout
+        self.max_retransmits = max_retransmits
+        self.confirmation = 0
+        self.deadline = None
+        self.sent_at = None
+        self.future = Future()
+
+
+class CommandManager:
+    """
+    Sends COMMAND_LONGs and matches the resulting COMMAND_ACKs to them by command id.
+
+    Each `send()` returns a Future that resolves to the COMMAND_ACK message. Commands with
+    different ids are in flight at the same time; ACKs for commands nobody is waiting on
+    are ignored. A command that is not acknowledged in time is retransmitted with its
+    confirmation field incremented, as the MAVLink command protocol specifies, and an
+    IN_PROGRESS ACK stops retransmission while the autopilot works on it. MAVLink ACKs
+    only carry the command id, so a second command with the same id waits for the first.
+    """
+
+    def __init__(self, master, telemetry: TelemetryCache):
+        self.master = master
+        self.pending = {}  # command id -> deque of PendingCommand; the head is the one in flight
+        self.condition = threading.Condition()
+        self.send_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        telemetry.add_listener(self._on_message)
+        self.thread = threading.Thread(target=self._monitor, name="command-manager", daemon=True)
+        self.thread.start()
+
+    def send(self, command, *params, timeout=config.COMMAND_ACK_TIMEOUT_S,
+             max_retransmits=config.COMMAND_MAX_RETRANSMITS):
+        params = tuple(params) + (0,) * (7 - len(params))
+        pending = PendingCommand(command, params, timeout, max_retransmits)
+        with self.condition:
+            queue = self.pending.setdefault(command, collections.deque())
+            queue.append(pending)
+            if len(queue) == 1:
+                self._transmit(pending)
+        return pending.future
+
+    def wait_accepted(self, future, timeout=None):
+        """Blocks until `future` resolves. Returns True if the command was accepted."""
+        try:
+            ack = future.result(timeout)
+        except Exception as e:
+            logger.warning("Command failed: %s", e)
+            return False
+        return self._is_accepted(ack)
+
+    async def wait_accepted_async(self, future):
+        """Awaitable version of `wait_accepted()`."""
+        try:
+            ack = await asyncio.wrap_future(future)
+        except Exception as e:
+            logger.warning("Command failed: %s", e)
+            return False
+        return self._is_accepted(ack)
+
+    @staticmethod
+    def _is_accepted(ack):
+        if ack.result != mavutil.mavlink.MAV_RESULT_ACCEPTED:
+            result = mavutil.mavlink.enums['MAV_RESULT'][ack.result].name
+            logger.warning("Command %s was not accepted (%s).", command_name(ack.command), result)
+            return False
+        return True
+
+    def close(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+            for queue in self.pending.values():
+                for pending in queue:
+                    pending.future.cancel()
+            self.pending.clear()
+        self.thread.join(timeout=2.0)
+
+    def _transmit(self, pending: PendingCommand):
+        # Called with self.condition held
+        pending.deadline = time.monotonic() + pending.timeout
+        if pending.sent_at is None:
+            pending.sent_at = time.monotonic()
+        with self.send_lock, METRICS.span("mavlink.command_send"):
+            self.master.mav.command_long_send(
+                self.master.target_system, self.master.target_component,
+                pending.command, pending.confirmation, *pending.params)
+        self.condition.notify_all()
+
+    def _finish(self, command, ack=None, error=None):
+        # Called with self.condition held
+        queue = self.pending.get(command)
+        pending = queue.popleft()
+        if queue:
+            self._transmit(queue[0])
+        else:
+            del self.pending[command]
+        if error is not None:
+            METRICS.counter("mavlink.command_timeouts").inc()
+            pending.future.set_exception(error)
+        else:
+            METRICS.histogram("mavlink.command_ack", "seconds").record(time.monotonic() - pending.sent_at)
+            pending.future.set_result(ack)
+
+    def _on_message(self, msg):
+        if msg.get_type() != 'COMMAND_ACK':
+            return
+        with self.condition:
+            if msg.command not in self.pending:
+                return
+            if msg.result == mavutil.mavlink.MAV_RESULT_IN_PROGRESS:
+                # The autopilot has the command; wait longer but never retransmit it
+                pending = self.pending[msg.command][0]
+                pending.deadline = time.monotonic() + config.COMMAND_IN_PROGRESS_TIMEOUT_S
+                pending.max_retransmits = pending.confirmation
+                self.condition.notify_all()
+                return
+            self._finish(msg.command, ack=msg)
+
+    def _monitor(self):
+        with self.condition:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                for command, queue in list(self.pending.items()):
+                    pending = queue[0]
+                    if pending.deadline > now:
+                        continue
+                    if pending.confirmation < pending.max_retransmits:
+                        pending.confirmation += 1
+                        METRICS.counter("mavlink.command_retransmits").inc()
+                        logger.info("No ACK for %s. Retransmitting (%d/%d)...", command_name(command), pending.confirmation, pending.max_retransmits)
+                        self._transmit(pending)
+                    else:
+                        self._finish(command, error=CommandTimeoutError(
+                            f"No ACK for {command_name(command)} after {pending.confirmation + 1} attempts"))
+                deadlines = [queue[0].deadline for queue in self.pending.values()]
+                self.condition.wait(max(min(deadlines) - time.monotonic(), 0.0) if deadlines else None)
@@ -1,43 +1,283 @@
+import logging
+import os
+import queue
+import select
 import socket
-import json
+import threading
 import time
-from src import config
+from src import codec, config
+from src.metrics import METRICS
+from src.codec import FRAME_HEADER
+from src.coordinate_server import get_coordinate_server
+from src.spool import MessageSpool
 from src.shared import GPSCoordinates
+from src.sightings import NEW, SightingIndex
 
-class BaseStationCommunicator:
-    def __init__(self, ip=config.BASE_STATION_IP, port=config.BASE_STATION_PORT):
-        self.server_ip = ip
-        self.server_port = port
+logger = logging.getLogger(__name__)
+
+class BaseStationConnection:
+    """A long-lived TCP connection to the base station, (re)connected on demand."""
+
+    def __init__(self, ip, port):
+        self.address = (ip, port)
+        self.sock = None
+        self.reconnects = 0
+
+    @property
+    def is_connected(self):
+        return self.sock is not None
+
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=config.CONNECT_TIMEOUT_S)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.sock = sock
+        self.reconnects += 1
+        METRICS.counter("base_station.connects").inc()
+
+    def send_frame(self, payload: bytes):
+        if self.sock is not None:
+            # Notice a connection the server has already closed before writing into it
+            self._discard_responses()
+        if self.sock is None:
+            self.connect()
+        try:
+            self.sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+            self._discard_responses()
+        except OSError:
+            self.close()
+            raise
+
+    def _discard_responses(self):
+        """Reads and drops any acknowledgments so the server never blocks on a full receive window."""
+        while select.select([self.sock], [], [], 0)[0]:
+            if not self.sock.recv(4096):
+                # The server closed its side; reconnect on the next send
+                self.close()
+                return
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class BaseStationLink:
+    """
+    Bounded send queue in front of a persistent BaseStationConnection.
+
+    `enqueue()` returns immediately; a background thread owns the socket and does all
+    connecting, retrying and backoff, so callers on the camera/control loop never block.
+
+    With a spool, messages that cannot be delivered are written to disk instead of being
+    dropped, and the sender replays them in order whenever it has no live traffic to send.
+    While the link is known to be down, new messages go straight to the spool.
+    """
+
+    def __init__(self, ip, port, max_queue_size=config.SEND_QUEUE_MAX_SIZE,
+                 wire_format=config.BASE_STATION_WIRE_FORMAT, spool: MessageSpool = None):
+        self.connection = BaseStationConnection(ip, port)
+        self.wire_format = wire_format
+        # Only binary frames can carry more than one record; half the frame's records leaves
+        # room for a vehicle record before every message, so a batch of valid messages always fits
+        self.max_batch_size = min(config.TELEMETRY_BATCH_MAX_RECORDS, codec.MAX_RECORDS_PER_FRAME // 2) \
+            if wire_format == "binary" else 1
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.stop_event = threading.Event()
+        self.spool = spool
+        self.link_down = False
+        self.next_replay_time = 0.0
+        self.dropped = 0
+        self.retries = 0
+        self.thread = threading.Thread(target=self._run, name=f"base-station-sender-{port}", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, message):
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return True
+            except queue.Full:
+                # Drop (or spool) the oldest message rather than block the caller
+                try:
+                    oldest = self.queue.get_nowait()
+                    self.queue.task_done()
+                    if self.spool is not None:
+                        self.spool.append(oldest)
+                        METRICS.counter("base_station.spooled").inc()
+                    else:
+                        self.dropped += 1
+                        METRICS.counter("base_station.dropped").inc()
+                        logger.warning("Send queue full. Dropped the oldest pending message.")
+                except queue.Empty:
+                    pass
+
+    def flush(self, timeout=None):
+        """Waits until every queued message has been handled. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=2.0):
+        self.flush(timeout)
+        self.stop_event.set()
+        self.thread.join(timeout)
+        self.connection.close()
+        if self.spool is not None:
+            # Whatever could not be sent in time is kept for the next run
+            while True:
+                try:
+                    self.spool.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.spool.close()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                # Idle: catch up on spooled messages
+                self._replay_spool()
+                continue
+            # Whatever else piled up while the last frame was in flight goes out in the same frame
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.link_down and self.spool is not None:
+                    self._spool_batch(batch)
+                elif not self._send_with_retry(batch) and self.spool is not None:
+                    self._spool_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if self.queue.empty():
+                self._replay_spool()
+
+    def _spool_batch(self, batch):
+        spooled = 0
+        for message in batch:
+            try:
+                self.spool.append(message)
+                spooled += 1
+            except (TypeError, ValueError) as e:
+                logger.error("Dropping a message that cannot be spooled: %s", e)
+        METRICS.counter("base_station.spooled").inc(spooled)
+
+    def _replay_spool(self):
+        """Replays spooled messages, oldest first, for as long as no live traffic is waiting."""
+        while self.queue.empty() and not self.stop_event.is_set():
+            if self.spool is None or time.monotonic() < self.next_replay_time or not self.spool.has_pending():
+                return
+            messages, position = self.spool.read_batch(self.max_batch_size)
+            try:
+                if messages:
+                    self.connection.send_frame(codec.encode_frame(messages, self.wire_format))
+            except codec.CodecError as e:
+                logger.error("Discarding %d spooled message(s) that cannot be encoded: %s", len(messages), e)
+            except OSError as e:
+                self.link_down = True
+                self.next_replay_time = time.monotonic() + config.SPOOL_REPLAY_RETRY_S
+                logger.info("Base station still unreachable (%s). Retrying spool replay in %.0fs.", e, config.SPOOL_REPLAY_RETRY_S)
+                return
+            if self.link_down:
+                logger.info("Base station link restored. Replaying spooled messages.")
+            self.link_down = False
+            self.spool.commit(position)
+
+    def _encodes(self, message):
+        try:
+            codec.encode_frame([message], self.wire_format)
+        except codec.CodecError:
+            return False
+        return True
+
+    def _send_with_retry(self, messages):
+        """Handles the core logic of transmitting a frame with retries."""
+        try:
+            payload = codec.encode_frame(messages, self.wire_format)
+        except codec.CodecError as e:
+            # Drop only the messages that cannot be encoded, not the whole batch
+            valid = [message for message in messages if self._encodes(message)]
+            logger.error("Dropping %d message(s) that cannot be encoded: %s", len(messages) - len(valid), e)
+            if not valid:
+                return True  # Nothing left to send, and nothing worth spooling
+            messages = valid
+            payload = codec.encode_frame(messages, self.wire_format)
 
-    def _transmit_message(self, message):
-        """Handles the core logic of transmitting a message with retries."""
-        message_json = json.dumps(message)
         for attempt in range(config.MAX_RETRY_ATTEMPTS):
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                    sock.settimeout(2.0)  # 2-second timeout for connection
-                    sock.connect((self.server_ip, self.server_port))
-                    sock.sendall(message_json.encode('utf-8'))
-                    print(f"Successfully transmitted message of type '{message.get('message_type', 'unknown')}'.")
-                    return True
-            except socket.timeout:
-                print(f"Connection timed out. Retrying...")
-            except ConnectionRefusedError:
-                delay = config.BASE_RETRY_DELAY_S * (2 ** attempt)
-                print(f"Connection refused. Retrying in {delay:.1f}s...")
-                time.sleep(delay)
+                with METRICS.span("base_station.send"):
+                    self.connection.send_frame(payload)
+                METRICS.counter("base_station.messages_sent").inc(len(messages))
+                self.link_down = False
+                return True
             except socket.gaierror as e:
-                print(f"Address-related error connecting to server: {e}")
+                logger.error("Address-related error connecting to server: %s", e)
                 # No retry for this, as it's a configuration issue
                 return False
-            except Exception as e:
+            except OSError as e:
+                self.retries += 1
+                METRICS.counter("base_station.retries").inc()
                 delay = config.BASE_RETRY_DELAY_S * (2 ** attempt)
-                print(f"An unexpected error occurred during transmission: {e}. Retrying in {delay:.1f}s...")
-                time.sleep(delay)
-        
-        print(f"Failed to transmit message after {config.MAX_RETRY_ATTEMPTS} attempts.")
+                logger.warning("Failed to send %d message(s): %s. Retrying in %.1fs...", len(messages), e, delay)
+                if self.stop_event.wait(delay):
+                    break
+
+        logger.error("Failed to transmit message after %d attempts.", config.MAX_RETRY_ATTEMPTS)
+        self.link_down = True
+        self.next_replay_time = time.monotonic() + config.SPOOL_REPLAY_RETRY_S
         return False
 
+
+_links = {}
+_links_lock = threading.Lock()
+
+
+def get_link(ip, port):
+    """Returns the shared link for (ip, port), so every communicator in the process reuses one connection."""
+    with _links_lock:
+        link = _links.get((ip, port))
+        if link is None:
+            spool = MessageSpool(os.path.join(config.SPOOL_DIR, f"{ip}_{port}")) if config.SPOOL_ENABLED else None
+            link = _links[(ip, port)] = BaseStationLink(ip, port, spool=spool)
+        return link
+
+
+def close_links(timeout=2.0):
+    """Delivers what is still queued on every link (spooling what cannot be sent) and closes them."""
+    with _links_lock:
+        links = list(_links.values())
+        _links.clear()
+    for link in links:
+        link.close(timeout)
+
+
+class BaseStationCommunicator:
+    def __init__(self, ip=config.BASE_STATION_IP, port=config.BASE_STATION_PORT, drone_id=None):
+        self.server_ip = ip
+        self.server_port = port
+        # MAVLink system id added to every message when several drones share the link
+        self.drone_id = drone_id
+        self.link = get_link(ip, port)
+
+    def _transmit_message(self, message):
+        """Queues a message for the background sender. Never blocks on the network."""
+        if self.drone_id is not None:
+            message["drone_id"] = self.drone_id
+        return self.link.enqueue(message)
+
     def create_gps_message(self, coords: GPSCoordinates):
         return {
             "message_type": "gps_coordinates",
@@ -67,31 +307,69 @@ class BaseStationCommunicator:
         }
         return self._transmit_message(message)
 
+    def start_receiving(self):
+        """Starts the process-wide listener that queues delivery targets sent by the base station."""
+        return get_coordinate_server()
+
     def receive_coordinates(self, timeout=30.0):
-        print("Waiting to receive coordinates...")
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.settimeout(timeout)
-            try:
-                sock.bind((self.server_ip, self.server_port))
-                sock.listen()
-                conn, addr = sock.accept()
-                with conn:
-                    print(f"Connected by {addr}")
-                    data = conn.recv(1024)
-                    if not data:
-                        return None
-                    message = json.loads(data.decode('utf-8'))
-                    if message.get("message_type") == "gps_coordinates":
-                        return GPSCoordinates(
-                            latitude_deg=message["latitude"],
-                            longitude_deg=message["longitude"],
-                            absolute_altitude_m=message["altitude"],
-                            relative_altitude_m=message["altitude"]
-                        )
-                    return None
-            except socket.timeout:
-                print("Timed out waiting for a connection.")
-                return None
-            except Exception as e:
-                print(f"An error occurred while receiving coordinates: {e}")
-                return None
\ No newline at end of file
+        logger.info("Waiting to receive coordinates...")
+        server = self.start_receiving()
+        if not server.is_running:
+            return None
+        target = server.get_target(timeout)
+        if target is None:
+            logger.info("Timed out waiting for coordinates.")
+        return target
+
+    def pending_coordinates(self):
+        """Returns every target received so far that has not been taken yet, without waiting."""
+        server = self.start_receiving()
+        targets = []
+        while server.is_running:
+            target = server.get_target(timeout=0)
+            if target is None:
+                break
+            targets.append(target)
+        return targets
+
+
+class TelemetryCoalescer:
+    """
+    Reduces per-frame scout telemetry to what the base station actually uses.
+
+    Detection status is sent only when it changes or when the heartbeat interval has
+    passed. Coordinate fixes are clustered into distinct people by a SightingIndex: each
+    person is reported once when first confirmed, then again only when their estimated
+    position moves meaningfully.
+    """
+
+    def __init__(self, communicator: BaseStationCommunicator,
+                 heartbeat_s=config.DETECTION_STATUS_HEARTBEAT_S, sightings=None, clock=time.monotonic):
+        self.communicator = communicator
+        self.heartbeat_s = heartbeat_s
+        self.sightings = sightings if sightings is not None else SightingIndex(clock=clock)
+        self.clock = clock
+        self.last_detected = None
+        self.last_status_time = None
+
+    def update_detection(self, detected: bool):
+        """Returns True if a status message was sent."""
+        now = self.clock()
+        if (detected != self.last_detected or self.last_status_time is None
+                or now - self.last_status_time >= self.heartbeat_s):
+            self.last_detected = detected
+            self.last_status_time = now
+            self.communicator.transmit_person_detected_status(detected)
+            return True
+        return False
+
+    def add_fix(self, coords: GPSCoordinates):
+        """Adds a fix to the sighting index. Returns True if a coordinate report was sent."""
+        sighting, event = self.sightings.add(coords)
+        if event is None:
+            return False
+        logger.info("Person %d %s: Lat: %s, Lon: %s (%d fixes)", sighting.sighting_id,
+                    "sighted" if event == NEW else "moved", sighting.latitude_deg, sighting.longitude_deg,
+                    sighting.fixes)
+        self.communicator.transmit_coordinates(sighting.coordinates())
+        return True
@@ -4,6 +4,23 @@
 # For a physical drone via telemetry radio, use something like '/dev/ttyUSB0' (Linux) or 'COM3' (Windows)
 CONNECTION_URL = "udp:127.0.0.1:14540"
 
+# Telemetry streams requested from the autopilot (message name -> rate in Hz), how many
+# recent messages of each type are kept, and the oldest position still treated as current
+TELEMETRY_STREAM_RATES_HZ = {
+    "GLOBAL_POSITION_INT": 10,
+    "ATTITUDE": 10,
+    "SYS_STATUS": 1,
+    "BATTERY_STATUS": 1,
+}
+TELEMETRY_HISTORY_LENGTH = 8
+TELEMETRY_MAX_AGE_S = 2.0
+
+# MAVLink command protocol: ACK timeout per attempt, retransmissions before giving up,
+# and how long to wait once the autopilot reports a command IN_PROGRESS
+COMMAND_ACK_TIMEOUT_S = 1.5
+COMMAND_MAX_RETRANSMITS = 2
+COMMAND_IN_PROGRESS_TIMEOUT_S = 10.0
+
 # Default takeoff altitude in meters
 DEFAULT_TAKEOFF_ALTITUDE_SCOUT = 60
 DEFAULT_TAKEOFF_ALTITUDE_DELIVER = 10
@@ -11,6 +28,36 @@ DEFAULT_TAKEOFF_ALTITUDE_DELIVER = 10
 # Enable or disable video display for person detection
 ENABLE_VIDEO_DISPLAY = False
 
+# Person detection backend: "ultralytics" (PyTorch), "onnx" (ONNX Runtime) or "openvino"
+# Exported models are produced with src.detection.export_model(), e.g. "yolov8n.onnx"
+# or "yolov8n_openvino_model/yolov8n.xml"
+DETECTION_BACKEND = "ultralytics"
+DETECTION_MODEL_PATH = "yolov8n.pt"
+DETECTION_IMGSZ = 640
+DETECTION_CONFIDENCE = 0.25
+DETECTION_IOU = 0.45
+DETECTION_WARMUP_RUNS = 2
+DETECTION_NUM_THREADS = 0  # 0 lets the runtime pick
+# Adaptive inference: each detection runs at the largest INFERENCE_IMGSZ_LADDER size whose
+# latency fits INFERENCE_LATENCY_BUDGET_S, but never so small that a person (PERSON_WIDTH_M
+# across, seen from the current altitude) spans fewer than DETECTION_MIN_PERSON_PX input
+# pixels. Once persons are found, detection is cropped to them (padded by
+# INFERENCE_ROI_MARGIN box sizes) and slow detections are bridged by optical flow, up to
+# INFERENCE_MAX_STRIDE frames per detection. The whole frame is searched again at least
+# every INFERENCE_SEARCH_INTERVAL_S. Exported graphs always run at their export size.
+ADAPTIVE_INFERENCE = True
+INFERENCE_LATENCY_BUDGET_S = 0.1
+INFERENCE_IMGSZ_LADDER = (320, 416, 512, 640)
+INFERENCE_MAX_STRIDE = 4
+INFERENCE_ROI_MARGIN = 1.5
+INFERENCE_SEARCH_INTERVAL_S = 1.0
+PERSON_WIDTH_M = 0.5
+DETECTION_MIN_PERSON_PX = 12
+# Person tracking across frames: minimum box overlap to continue a track, and how many
+# frames a track survives without a match
+TRACKER_IOU_THRESHOLD = 0.3
+TRACKER_MAX_MISSED_FRAMES = 5
+
 # Payload release servo settings
 PAYLOAD_SERVO_CHANNEL = 8  # Example: Servo connected to output channel 8
 PAYLOAD_SERVO_OPEN_PWM = 1900 # PWM value for open/release
@@ -19,10 +66,35 @@ PAYLOAD_SERVO_CLOSED_PWM = 1100 # PWM value for closed/hold
 # Person detection and centering settings
 CENTERING_TIMEOUT = 30  # seconds
 
+# Camera source: device index, stream URL, video file or a directory of images
+CAMERA_SOURCE = 0
+
+# Longest the start-up preflight waits for the camera's first frame
+PREFLIGHT_CAMERA_TIMEOUT_S = 5.0
+
+# Recorded sources (video files, image directories) are paced at their frame rate like a
+# live camera when REPLAY_REALTIME is set; image directories play at REPLAY_IMAGE_FPS
+REPLAY_REALTIME = True
+REPLAY_IMAGE_FPS = 30.0
+REPLAY_LOOP_IMAGES = False
+
+# Capture/inference pipeline: how long the control loops wait for a new detection
+# result, and the oldest frame they will still act on
+PIPELINE_RESULT_TIMEOUT_S = 1.0
+PIPELINE_MAX_RESULT_AGE_S = 0.5
+# "threads" runs capture and inference on threads of the flight process; "processes" gives
+# each its own process, passing frames through FRAME_RING_SLOTS shared-memory buffers (at least 4)
+PIPELINE_MODE = "threads"
+FRAME_RING_SLOTS = 4
+
 # Frame dimensions for person detection
 FRAME_WIDTH = 640
 FRAME_HEIGHT = 480
 
+# Which person to center on: "largest", "most_central", "highest_confidence", or
+# "tracked" (the largest at first, then the same person for as long as it is tracked)
+TARGET_SELECTION_POLICY = "tracked"
+
 # Centering thresholds in pixels
 CENTERING_THRESHOLD_X = 10
 CENTERING_THRESHOLD_Y = 10
@@ -30,12 +102,118 @@ CENTERING_THRESHOLD_Y = 10
 # Velocity control for centering
 MAX_VELOCITY = 2.0  # m/s
 VELOCITY_SCALING_FACTOR = 0.01
+# Centering runs a PID per horizontal axis at a fixed rate, independent of detection.
+# Gains act on the person's offset in metres (m/s per m, per m*s, per m/s); the pixel
+# offset is scaled to metres from the relative altitude and the camera's field of view
+CENTERING_CONTROL_RATE_HZ = 20.0
+CENTERING_KP = 1.0
+CENTERING_KI = 0.05
+CENTERING_KD = 0.3
+CENTERING_INTEGRAL_ZONE_M = 1.0
+CENTERING_DERIVATIVE_FILTER_S = 0.1
+CENTERING_MIN_ALTITUDE_M = 1.0
+# Detections are compensated for the drone's motion since capture, so centering acts on
+# frames up to this old (the approach scan still uses PIPELINE_MAX_RESULT_AGE_S)
+CENTERING_MAX_MEASUREMENT_AGE_S = 1.0
+CAMERA_HORIZONTAL_FOV_DEG = 62.2
+# Camera mounting for geolocating persons: pitch from the vehicle's nose (-90 looks straight
+# down), and whether a gimbal holds it level. A stabilized gimbal's attitude is read from
+# GIMBAL_DEVICE_ATTITUDE_STATUS when the vehicle receives it. Attitude and position are
+# matched to each frame's capture time within GEOLOCATION_TELEMETRY_TOLERANCE_S.
+CAMERA_MOUNT_PITCH_DEG = -90.0
+CAMERA_GIMBAL_STABILIZED = False
+GEOLOCATION_TELEMETRY_TOLERANCE_S = 0.25
 
 # GPS navigation settings                               │
 GPS_REACHED_TOLERANCE_M = 2.0 
+# Arrival is also declared when the closing speed will bring the drone inside the
+# tolerance before the next position update, looking at most this far ahead
+ARRIVAL_MAX_LOOKAHEAD_S = 0.5
+
+# Route planning: distance the drone can fly on a full battery (None to plan without a
+# battery budget) and the fraction of the battery kept in reserve
+BATTERY_FULL_RANGE_M = 8000.0
+BATTERY_RESERVE_FRACTION = 0.2
+# During a delivery approach, a person seen within this distance of the target starts
+# centering straight away instead of waiting for arrival
+APPROACH_SCAN_RADIUS_M = 15.0
 
 # Base station communication settings
 BASE_STATION_IP = "127.0.0.1"
 BASE_STATION_PORT = 8080
 MAX_RETRY_ATTEMPTS = 3
-BASE_RETRY_DELAY_S = 0.5 
\ No newline at end of file
+BASE_RETRY_DELAY_S = 0.5
+CONNECT_TIMEOUT_S = 2.0
+SEND_QUEUE_MAX_SIZE = 256  # messages; the oldest is dropped when full
+# Listener for delivery targets sent by the base station
+COORDINATE_SERVER_IP = "0.0.0.0"
+COORDINATE_SERVER_PORT = 8081
+DELIVERY_QUEUE_MAX_SIZE = 100
+
+# Local spool for messages the base station could not receive; replayed in order once
+# the link is back
+SPOOL_ENABLED = True
+SPOOL_DIR = "spool"
+SPOOL_SEGMENT_BYTES = 1024 * 1024
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+SPOOL_REPLAY_RETRY_S = 5.0
+# Spooled messages are fsynced once this many bytes or seconds have built up since the last fsync
+SPOOL_SYNC_BYTES = 64 * 1024
+SPOOL_SYNC_INTERVAL_S = 1.0
+
+# Wire format for base station messages: "json" (one message per frame) or "binary"
+# (compact src.codec records; several queued messages are packed into one frame)
+BASE_STATION_WIRE_FORMAT = "json"
+TELEMETRY_BATCH_MAX_RECORDS = 32
+
+# Scout telemetry coalescing: detection status is sent on change or at this heartbeat
+DETECTION_STATUS_HEARTBEAT_S = 2.0
+# Person sightings: fixes within SIGHTING_RADIUS_M of a known person refine that person's
+# position instead of being reported again. A person is reported once they have
+# SIGHTING_MIN_FIXES fixes, then again whenever the estimate moves SIGHTING_UPDATE_DISTANCE_M.
+# Fixes are geolocated from the camera geometry, so the radius only has to cover GPS and
+# attitude error; persons closer together than this are reported as one.
+SIGHTING_RADIUS_M = 8.0
+SIGHTING_UPDATE_DISTANCE_M = 5.0
+SIGHTING_MIN_FIXES = 3
+
+# Fleet (fleet.py): vehicles driven from one process, each with its own MAVLink connection
+# (distinct UDP port and system id) and camera. Roles are "scout" or "delivery".
+FLEET_VEHICLES = [
+    {"name": "scout-1", "role": "scout", "connection_url": "udp:127.0.0.1:14540", "camera_source": 0},
+    {"name": "delivery-1", "role": "delivery", "connection_url": "udp:127.0.0.1:14550", "camera_source": 1},
+]
+# How often idle delivery drones are matched with pending targets, and how long the fleet
+# waits for new targets once the scouts are done and every delivery has finished
+FLEET_DISPATCH_INTERVAL_S = 1.0
+FLEET_IDLE_TIMEOUT_S = 30.0
+# Shared detector for a fleet: worker processes (each loads the model once), the most
+# frames run in one batched inference, and how long a batch waits for more frames
+DETECTOR_POOL_WORKERS = 1
+DETECTOR_POOL_MAX_BATCH = 4
+DETECTOR_POOL_BATCH_WINDOW_S = 0.005
+
+# Mission recording: while a camera pipeline runs, frames go to a video and detections,
+# offsets, velocity commands and positions to RECORDING_CHUNK_ROWS-row .npz chunks, in a
+# new directory under RECORDING_DIR. Writing happens on a background thread; items that
+# do not fit in its RECORDING_QUEUE_SIZE queue are dropped rather than waited for
+RECORDING_ENABLED = False
+RECORDING_DIR = "recordings"
+RECORDING_QUEUE_SIZE = 256
+RECORDING_CHUNK_ROWS = 1024
+RECORDING_VIDEO_FPS = 15.0
+RECORDING_VIDEO_FOURCC = "mp4v"
+
+# Logging: level and format ("text" or "json", one object per line)
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "text"
+
+# Metrics: histograms keep the last METRICS_WINDOW samples. Snapshots are appended to
+# METRICS_FILE every METRICS_EXPORT_INTERVAL_S ("file"), served for Prometheus on
+# METRICS_HTTP_HOST:METRICS_HTTP_PORT/metrics ("prometheus"), or not exported (None)
+METRICS_WINDOW = 1024
+METRICS_EXPORT = "file"
+METRICS_FILE = "metrics.jsonl"
+METRICS_EXPORT_INTERVAL_S = 10.0
+METRICS_HTTP_HOST = "127.0.0.1"
+METRICS_HTTP_PORT = 9108
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import math
+import queue
+import threading
+
+from src import codec, config
+from src.codec import FRAME_HEADER
+from src.shared import GPSCoordinates
+
+logger = logging.getLogger(__name__)
+
+MAX_FRAME_SIZE = 1 << 20
+
+SUCCESS_RESPONSE = b'{"status":"success"}'
+ERROR_RESPONSE = b'{"status":"error","message":"Invalid GPS data"}'
+FULL_RESPONSE = b'{"status":"error","message":"Delivery queue full"}'
+
+
+def parse_target(message):
+    """Returns GPSCoordinates for a valid gps_coordinates message, otherwise None."""
+    if message.get("message_type") != "gps_coordinates":
+        return None
+    try:
+        latitude = float(message["latitude"])
+        longitude = float(message["longitude"])
+        altitude = float(message["altitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not all(math.isfinite(v) for v in (latitude, longitude, altitude)):
+        return None
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    return GPSCoordinates(
+        latitude_deg=latitude,
+        longitude_deg=longitude,
+        absolute_altitude_m=altitude,
+        relative_altitude_m=altitude
+    )
+
+
+def json_object_end(data):
+    """
+    Index just past the `}` that closes the JSON object at the start of `data` (bytes),
+    or None if it has not arrived yet. Only braces and strings are tracked, so a complete
+    but malformed object is found too and can be rejected instead of waited on.
+    """
+    depth = 0
+    in_string = escaped = False
+    for index, byte in enumerate(data):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif byte == 0x5C:  # backslash
+                escaped = True
+            elif byte == 0x22:  # closing quote
+                in_string = False
+        elif byte == 0x22:
+            in_string = True
+        elif byte == 0x7B:  # {
+            depth += 1
+        elif byte == 0x7D:  # }
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+
+class ClientStream:
+    """Buffers a client's byte stream so frames and JSON objects split across reads are reassembled."""
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+        self.buffer = b""
+
+    async def fill(self):
+        chunk = await self.reader.read(4096)
+        self.buffer += chunk
+        return bool(chunk)
+
+    async def read_exactly(self, size):
+        while len(self.buffer) < size:
+            if not await self.fill():
+                raise asyncio.IncompleteReadError(self.buffer, size)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    async def read_json(self):
+        """
+        Reads the bare JSON object at the start of the buffer. A complete object that is
+        not valid JSON is consumed and raises json.JSONDecodeError (or UnicodeDecodeError).
+        """
+        while (end := json_object_end(self.buffer)) is None:
+            if len(self.buffer) > MAX_FRAME_SIZE:
+                raise ValueError("Unterminated JSON message")
+            if not await self.fill():
+                raise asyncio.IncompleteReadError(self.buffer, None)
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return json.loads(data)
+
+
+class CoordinateServer:
+    """
+    Long-running asyncio listener that receives delivery targets from the base station.
+
+    Any number of clients may connect at once and stream targets over one connection,
+    either length-prefixed (JSON or binary frames, see src.codec) or as bare JSON objects.
+    Validated targets are put on `targets`, a thread-safe queue the mission loop consumes.
+    The event loop runs on its own daemon thread.
+    """
+
+    def __init__(self, host=config.COORDINATE_SERVER_IP, port=config.COORDINATE_SERVER_PORT,
+                 max_pending=config.DELIVERY_QUEUE_MAX_SIZE):
+        self.host = host
+        self.port = port
+        self.targets = queue.Queue(maxsize=max_pending)
+        self.loop = None
+        self.thread = None
+        self.error = None
+        self._ready = threading.Event()
+        self._stop = None
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, timeout=5.0):
+        if self.is_running:
+            return True
+        self._ready.clear()
+        self.thread = threading.Thread(target=self._run, name="coordinate-server", daemon=True)
+        self.thread.start()
+        self._ready.wait(timeout)
+        return self.error is None and self.is_running
+
+    def stop(self):
+        if self.loop is not None and self._stop is not None:
+            self.loop.call_soon_threadsafe(self._stop.set)
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    def get_target(self, timeout=None):
+        """Returns the next received target, or None if none arrives within `timeout`."""
+        try:
+            return self.targets.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except OSError as e:
+            self.error = e
+            logger.error("Coordinate server could not listen on %s:%d: %s", self.host, self.port, e)
+        finally:
+            self._ready.set()
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        logger.info("Listening for delivery coordinates on %s:%d", self.host, self.port)
+        self._ready.set()
+        async with server:
+            await self._stop.wait()
+
+    async def _handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        logger.info("Connected by %s", peer)
+        stream = ClientStream(reader)
+        try:
+            while True:
+                if not stream.buffer.lstrip() and not await stream.fill():
+                    break
+                stream.buffer = stream.buffer.lstrip()
+                if stream.buffer.startswith(b"{"):
+                    # Bare JSON object, answered without framing
+                    try:
+                        response = self._accept([await stream.read_json()])
+                    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                        logger.warning("Rejected malformed JSON from %s: %s", peer, e)
+                        response = ERROR_RESPONSE
+                    writer.write(response)
+                else:
+                    (length,) = FRAME_HEADER.unpack(await stream.read_exactly(FRAME_HEADER.size))
+                    if length > MAX_FRAME_SIZE:
+                        raise ValueError(f"Oversized frame ({length} bytes)")
+                    payload = await stream.read_exactly(length)
+                    try:
+                        response = self._accept(codec.decode_frame(payload))
+                    except codec.CodecError as e:
+                        logger.warning("Rejected frame from %s: %s", peer, e)
+                        response = ERROR_RESPONSE
+                    writer.write(FRAME_HEADER.pack(len(response)) + response)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            logger.warning("%s disconnected mid-message.", peer)
+        except (ValueError, OSError) as e:
+            logger.warning("Dropping connection from %s: %s", peer, e)
+        finally:
+            writer.close()
+
+    def _accept(self, messages):
+        accepted = False
+        for message in messages:
+            target = parse_target(message) if isinstance(message, dict) else None
+            if target is None:
+                continue
+            try:
+                self.targets.put_nowait(target)
+            except queue.Full:
+                logger.warning("Delivery queue full. Rejecting target.")
+                return FULL_RESPONSE
+            accepted = True
+            logger.info("Queued delivery target: Lat: %s, Lon: %s", target.latitude_deg, target.longitude_deg)
+        return SUCCESS_RESPONSE if accepted else ERROR_RESPONSE
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_coordinate_server():
+    """Returns the process-wide coordinate server, starting it on first use."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = CoordinateServer()
+        if not _server.is_running:
+            _server.start()
+        return _server
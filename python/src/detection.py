@@ -1,35 +1,372 @@
+import logging
+import threading
+
 import cv2
-from ultralytics import YOLO
+import numpy as np
+
+from src import config
+from src.shared import PERSON_DTYPE, make_persons
+
+logger = logging.getLogger(__name__)
+
+# COCO class index for 'person'
+PERSON_CLASS_ID = 0
+
+# Detections are returned as a PERSON_DTYPE structured array, one element per person
+NO_PERSONS = np.empty(0, dtype=PERSON_DTYPE)
+NO_PERSONS.flags.writeable = False
+
+
+class Detector:
+    """
+    Base class for person detection backends.
+
+    The model is not touched until `ensure_loaded()` is called (normally by the first
+    `detect()`), so importing this module stays cheap. `imgsz` is the default inference
+    size; backends with `dynamic_imgsz` also honour a per-call size.
+    """
+
+    dynamic_imgsz = False
+
+    def __init__(self, model_path, imgsz=config.DETECTION_IMGSZ,
+                 conf=config.DETECTION_CONFIDENCE, iou=config.DETECTION_IOU):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.is_loaded = False
+        self._load_lock = threading.Lock()
+
+    @property
+    def fixed_imgsz(self):
+        """The only inference size the backend runs at, or None if it honours a per-call size."""
+        return None if self.dynamic_imgsz else self.imgsz
+
+    def load(self):
+        raise NotImplementedError
+
+    def _detect(self, frame, imgsz):
+        raise NotImplementedError
+
+    def warmup(self, runs=config.DETECTION_WARMUP_RUNS):
+        """Runs a few inferences on a blank frame so the first real frame is not slowed down by lazy allocations."""
+        dummy = np.zeros((config.FRAME_HEIGHT, config.FRAME_WIDTH, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self._detect(dummy, self.imgsz)
+
+    def ensure_loaded(self):
+        if self.is_loaded:
+            return
+        with self._load_lock:
+            if self.is_loaded:
+                return
+            logger.info("Loading %s model from %s...", type(self).__name__, self.model_path)
+            self.load()
+            self.warmup()
+            self.is_loaded = True
+            logger.info("Detection model loaded and warmed up.")
+
+    def detect(self, frame, imgsz=None):
+        self.ensure_loaded()
+        return self._detect(frame, imgsz or self.imgsz)
+
+    def detect_batch(self, frames, imgsz=None):
+        """Detects persons in several frames, returning one array per frame."""
+        self.ensure_loaded()
+        return self._detect_batch(frames, imgsz or self.imgsz)
+
+    def _detect_batch(self, frames, imgsz):
+        # Exported graphs have a fixed batch size of 1
+        return [self._detect(frame, imgsz) for frame in frames]
+
+
+class UltralyticsDetector(Detector):
+    """Runs the model through Ultralytics/PyTorch. Accepts `.pt` weights (or anything YOLO() can load)."""
+
+    dynamic_imgsz = True
+
+    def load(self):
+        from ultralytics import YOLO
+        self.model = YOLO(self.model_path)
+
+    def _detect(self, frame, imgsz):
+        # Restrict NMS and the output to 'person' so no other class is ever decoded
+        results = self.model(frame, imgsz=imgsz, conf=self.conf, iou=self.iou,
+                             classes=[PERSON_CLASS_ID], verbose=False)
+        return self._persons(results[0].boxes)
+
+    def _detect_batch(self, frames, imgsz):
+        # One forward pass over the whole batch
+        results = self.model(list(frames), imgsz=imgsz, conf=self.conf, iou=self.iou,
+                             classes=[PERSON_CLASS_ID], verbose=False)
+        return [self._persons(result.boxes) for result in results]
+
+    @staticmethod
+    def _persons(boxes):
+        if len(boxes) == 0:
+            return NO_PERSONS
+        # boxes.data is (N, 6) = xyxy, conf, cls; one device-to-host transfer for the whole frame
+        return make_persons(boxes.data[:, :5].cpu().numpy())
+
+
+class ExportedYoloDetector(Detector):
+    """
+    Shared pre/post-processing for YOLOv8 graphs exported with `export_model()`.
+
+    Exported graphs take a letterboxed (1, 3, imgsz, imgsz) RGB tensor and return a raw
+    (1, 4 + num_classes, num_anchors) prediction tensor; box decoding and NMS happen here
+    so no PyTorch is needed at runtime. The input size is fixed at export, so a per-call
+    `imgsz` is ignored.
+    """
+
+    input_dtype = np.float32
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Per-thread input tensor, reused while the frame shape stays the same
+        self._buffers = threading.local()
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def _letterbox(self, frame_shape):
+        """
+        Scale, padding and input tensor for frames of `frame_shape`. The multi-megabyte
+        tensor is allocated once, with the padding already filled in: allocating it per
+        frame costs a page fault per page, which took longer than the resize itself.
+        """
+        buffers = self._buffers
+        key = (frame_shape, self.input_dtype)
+        if getattr(buffers, "key", None) != key:
+            height, width = frame_shape[:2]
+            scale = min(self.imgsz / height, self.imgsz / width)
+            resized_w, resized_h = int(round(width * scale)), int(round(height * scale))
+            pad_x = (self.imgsz - resized_w) // 2
+            pad_y = (self.imgsz - resized_h) // 2
+            buffers.resized = np.empty((resized_h, resized_w, 3), dtype=np.uint8)
+            buffers.blob = np.full((1, 3, self.imgsz, self.imgsz), 114 / 255.0, dtype=self.input_dtype)
+            buffers.image = buffers.blob[0, :, pad_y:pad_y + resized_h, pad_x:pad_x + resized_w]
+            buffers.geometry = scale, resized_w, resized_h, pad_x, pad_y
+            buffers.key = key
+        return buffers
+
+    def _preprocess(self, frame):
+        buffers = self._letterbox(frame.shape)
+        scale, resized_w, resized_h, pad_x, pad_y = buffers.geometry
+        resized = cv2.resize(frame, (resized_w, resized_h), dst=buffers.resized, interpolation=cv2.INTER_LINEAR)
+        # HWC BGR -> CHW RGB in [0, 1], written straight into the tensor
+        np.multiply(resized.transpose(2, 0, 1)[::-1], 1 / 255.0, out=buffers.image, casting="unsafe")
+        return buffers.blob, scale, pad_x, pad_y
+
+    def _postprocess(self, output, frame_shape, scale, pad_x, pad_y):
+        predictions = np.asarray(output, dtype=np.float32)[0]
+        # Only the 'person' score row is needed, so the other 79 classes are never touched
+        scores = predictions[4 + PERSON_CLASS_ID]
+        keep = scores >= self.conf
+        if not np.any(keep):
+            return NO_PERSONS
+
+        cx, cy, w, h = predictions[:4, keep]
+        scores = scores[keep]
+        x_min = (cx - w / 2 - pad_x) / scale
+        y_min = (cy - h / 2 - pad_y) / scale
+        box_w = w / scale
+        box_h = h / scale
+
+        indices = cv2.dnn.NMSBoxes(
+            np.stack([x_min, y_min, box_w, box_h], axis=1).tolist(),
+            scores.tolist(), self.conf, self.iou)
+
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if indices.size == 0:
+            return NO_PERSONS
+
+        height, width = frame_shape[:2]
+        persons = np.empty(indices.size, dtype=PERSON_DTYPE)
+        persons["x_min"] = np.clip(x_min[indices], 0, width)
+        persons["y_min"] = np.clip(y_min[indices], 0, height)
+        persons["x_max"] = np.clip(x_min[indices] + box_w[indices], 0, width)
+        persons["y_max"] = np.clip(y_min[indices] + box_h[indices], 0, height)
+        persons["confidence"] = scores[indices]
+        persons["track_id"] = -1
+        return persons
 
-model = YOLO('yolov8n.pt')
+    def _detect(self, frame, imgsz):
+        blob, scale, pad_x, pad_y = self._preprocess(frame)
+        return self._postprocess(self._infer(blob), frame.shape, scale, pad_x, pad_y)
 
-def scan_for_person(frame):
+
+class OnnxDetector(ExportedYoloDetector):
+    """Runs an exported `.onnx` graph on the CPU with ONNX Runtime."""
+
+    def load(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.DETECTION_NUM_THREADS:
+            options.intra_op_num_threads = config.DETECTION_NUM_THREADS
+        self.session = ort.InferenceSession(
+            self.model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        if model_input.type == "tensor(float16)":
+            self.input_dtype = np.float16
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(ExportedYoloDetector):
+    """Runs an exported OpenVINO IR (`.xml`) on the CPU with the OpenVINO runtime."""
+
+    def load(self):
+        import openvino as ov
+
+        core = ov.Core()
+        properties = {"PERFORMANCE_HINT": "LATENCY"}
+        if config.DETECTION_NUM_THREADS:
+            properties["INFERENCE_NUM_THREADS"] = config.DETECTION_NUM_THREADS
+        self.compiled_model = core.compile_model(self.model_path, "CPU", properties)
+        self.output = self.compiled_model.output(0)
+
+    def _infer(self, blob):
+        return self.compiled_model([blob])[self.output]
+
+
+DETECTOR_BACKENDS = {
+    "ultralytics": UltralyticsDetector,
+    "onnx": OnnxDetector,
+    "openvino": OpenVinoDetector,
+}
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def create_detector(backend=config.DETECTION_BACKEND, model_path=config.DETECTION_MODEL_PATH):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detection backend '{backend}'. "
+                         f"Expected one of: {', '.join(DETECTOR_BACKENDS)}")
+    return DETECTOR_BACKENDS[backend](model_path)
+
+
+def get_detector():
+    """Returns the process-wide detector, creating it (but not loading it) on first use."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = create_detector()
+    return _detector
+
+
+def box_iou(a, b):
+    """Pairwise intersection-over-union of two person arrays, as a (len(a), len(b)) matrix."""
+    width = np.minimum(a["x_max"][:, None], b["x_max"]) - np.maximum(a["x_min"][:, None], b["x_min"])
+    height = np.minimum(a["y_max"][:, None], b["y_max"]) - np.maximum(a["y_min"][:, None], b["y_min"])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area_a = (a["x_max"] - a["x_min"]) * (a["y_max"] - a["y_min"])
+    area_b = (b["x_max"] - b["x_min"]) * (b["y_max"] - b["y_min"])
+    return intersection / np.maximum(area_a[:, None] + area_b - intersection, 1e-6)
+
+
+class PersonTracker:
     """
-    Scans a given frame for the presence of a person using YOLOv8.
+    Keeps each person's `track_id` stable across frames by greedily matching every box to
+    the best-overlapping box of the previous frames. A track that finds no match for more
+    than `max_missed` frames is forgotten.
+    """
+
+    def __init__(self, iou_threshold=config.TRACKER_IOU_THRESHOLD, max_missed=config.TRACKER_MAX_MISSED_FRAMES):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = NO_PERSONS  # last box of every live track
+        self.missed = np.empty(0, dtype=np.int32)
+        self.next_id = 0
+
+    def update(self, persons):
+        """Assigns `track_id` to every person (in place when the array is writeable) and returns the array."""
+        if not len(persons) and not len(self.tracks):
+            return persons
+        if not persons.flags.writeable:
+            persons = persons.copy()
+
+        ious = box_iou(self.tracks, persons)
+        track_index = np.full(len(persons), -1)
+        while ious.size:
+            track, person = np.unravel_index(ious.argmax(), ious.shape)
+            if ious[track, person] < self.iou_threshold:
+                break
+            track_index[person] = track
+            ious[track, :] = -1
+            ious[:, person] = -1
+
+        matched = track_index >= 0
+        track_ids = persons["track_id"]
+        track_ids[matched] = self.tracks["track_id"][track_index[matched]]
+        new_ids = np.arange(self.next_id, self.next_id + np.count_nonzero(~matched), dtype=np.int32)
+        track_ids[~matched] = new_ids
+        self.next_id += len(new_ids)
+
+        unmatched_tracks = np.ones(len(self.tracks), dtype=bool)
+        unmatched_tracks[track_index[matched]] = False
+        missed = self.missed[unmatched_tracks] + 1
+        keep = missed <= self.max_missed
+        self.tracks = np.concatenate([persons, self.tracks[unmatched_tracks][keep]])
+        self.missed = np.concatenate([np.zeros(len(persons), dtype=np.int32), missed[keep]])
+        return persons
+
+
+def annotate_frame(frame, persons):
+    """Returns a copy of `frame` with the `persons` array drawn on it."""
+    annotated_frame = frame.copy()
+    for x_min, y_min, x_max, y_max, confidence, track_id in persons.tolist():
+        label = f"person {confidence:.2f}" if track_id < 0 else f"person #{track_id} {confidence:.2f}"
+        cv2.rectangle(annotated_frame, (int(x_min), int(y_min)), (int(x_max), int(y_max)), (0, 255, 0), 2)
+        cv2.putText(annotated_frame, label, (int(x_min), max(int(y_min) - 5, 0)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return annotated_frame
+
+
+def export_model(fmt="onnx", half=False, int8=False, model_path="yolov8n.pt"):
+    """
+    Exports the PyTorch weights to a graph the CPU backends can run.
 
     Args:
-        frame (numpy.ndarray): The image frame to scan.
+        fmt (str): "onnx" or "openvino".
+        half (bool): Export FP16 weights.
+        int8 (bool): Quantize to INT8 (OpenVINO only; needs calibration data available to Ultralytics).
 
     Returns:
-        tuple: A tuple containing:
-            - list: A list of bounding boxes for detected persons. Each bounding box is a
-              tuple of (x_min, y_min, x_max, y_max, confidence).
-            - numpy.ndarray: The frame with detections annotated.
+        str: Path of the exported model, suitable for `config.DETECTION_MODEL_PATH`.
+    """
+    from ultralytics import YOLO
+    return YOLO(model_path).export(format=fmt, imgsz=config.DETECTION_IMGSZ, half=half, int8=int8)
+
+
+def scan_for_person(frame, annotate=None, imgsz=None):
     """
-    results = model(frame)
-    persons = []
-    annotated_frame = results[0].plot()
+    Scans a given frame for the presence of a person using the configured detector backend.
 
-    # Iterate through detection results to find 'person' (class ID 0 in COCO dataset)
-    for r in results:
-        for i, c in enumerate(r.boxes.cls):
-            if model.names[int(c)] == 'person':
-                # Get the bounding box coordinates and confidence
-                bbox = r.boxes.xyxy[i].cpu().numpy()
-                confidence = r.boxes.conf[i].cpu().numpy()
-                persons.append((bbox[0], bbox[1], bbox[2], bbox[3], float(confidence)))
+    Args:
+        frame (numpy.ndarray): The image frame to scan.
+        annotate (bool): Whether to build an annotated copy of the frame. Defaults to
+            `config.ENABLE_VIDEO_DISPLAY`, so headless flights skip drawing entirely.
+        imgsz (int): Inference size for this frame, if the backend supports changing it.
+            Defaults to `config.DETECTION_IMGSZ`.
 
-    return persons, annotated_frame
+    Returns:
+        tuple: A tuple containing:
+            - numpy.ndarray: A PERSON_DTYPE structured array of detected persons, with
+              x_min, y_min, x_max, y_max, confidence and track_id fields.
+            - numpy.ndarray: The frame with detections annotated, or None when not annotating.
+    """
+    persons = get_detector().detect(frame, imgsz)
+    if annotate is None:
+        annotate = config.ENABLE_VIDEO_DISPLAY
+    return persons, annotate_frame(frame, persons) if annotate else None
 
 
 if __name__ == "__main__":
@@ -46,9 +383,9 @@ if __name__ == "__main__":
             print("Error: Could not read frame from video stream.")
             break
 
-        persons, annotated_frame = scan_for_person(frame)
+        persons, annotated_frame = scan_for_person(frame, annotate=True)
 
-        if persons:
+        if len(persons):
             print(f"Detected {len(persons)} person(s).")
             for person in persons:
                 print(f"  - BBox: {person}")
@@ -61,4 +398,4 @@ if __name__ == "__main__":
             break
 
     cap.release()
-    cv2.destroyAllWindows()
\ No newline at end of file
+    cv2.destroyAllWindows()
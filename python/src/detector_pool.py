@@ -0,0 +1,135 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from src import config, detection
+from src.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# The detector owned by each worker process, loaded once by _load_worker_detector()
+_worker_detector = None
+
+
+def _load_worker_detector(backend, model_path):
+    global _worker_detector
+    _worker_detector = detection.create_detector(backend, model_path)
+    _worker_detector.ensure_loaded()
+
+
+def _detect_batch(frames, imgsz):
+    return _worker_detector.detect_batch(frames, imgsz)
+
+
+class DetectorPool:
+    """
+    One detector shared by every camera pipeline in the process.
+
+    The model runs in `workers` separate processes, each loading it once. Frames
+    submitted while every worker is busy are queued, and the next free worker takes up
+    to `max_batch` of them (all at the same inference size) in a single batched
+    inference. Callers block in `detect()` the same way they would on a local detector,
+    so a pool can be given to a CameraPipeline in place of `scan_for_person`.
+    """
+
+    def __init__(self, workers=config.DETECTOR_POOL_WORKERS, max_batch=config.DETECTOR_POOL_MAX_BATCH,
+                 batch_window_s=config.DETECTOR_POOL_BATCH_WINDOW_S,
+                 backend=config.DETECTION_BACKEND, model_path=config.DETECTION_MODEL_PATH):
+        self.max_batch = max_batch
+        self.batch_window_s = batch_window_s
+        # The workers' detectors are created with the default size, as create_detector() does
+        self.fixed_imgsz = None if detection.DETECTOR_BACKENDS[backend].dynamic_imgsz else config.DETECTION_IMGSZ
+        # Spawned, not forked: the parent already runs telemetry and sender threads
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_worker_detector, initargs=(backend, model_path))
+        self.idle_workers = threading.Semaphore(workers)
+        self.requests = queue.Queue()
+        self.held = None  # a request taken while batching that needs a different size
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="detector-pool-batcher", daemon=True)
+        self.thread.start()
+
+    def detect(self, frame, imgsz=None):
+        """Returns the persons in `frame`, as `Detector.detect()` does."""
+        if self.stop_event.is_set():
+            raise RuntimeError("Detector pool is closed.")
+        future = concurrent.futures.Future()
+        self.requests.put((frame, imgsz, future))
+        return future.result()
+
+    def scan_for_person(self, frame, annotate=None, imgsz=None):
+        """Drop-in replacement for `detection.scan_for_person()` that runs on the pool."""
+        persons = self.detect(frame, imgsz)
+        if annotate is None:
+            annotate = config.ENABLE_VIDEO_DISPLAY
+        return persons, detection.annotate_frame(frame, persons) if annotate else None
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            # Wait for a free worker first, so frames pile up (and batch) while all are busy
+            if not self.idle_workers.acquire(timeout=0.5):
+                continue
+            batch = self._next_batch()
+            if not batch:
+                self.idle_workers.release()
+                continue
+            METRICS.histogram("detector_pool.batch_size").record(len(batch))
+            try:
+                result = self.executor.submit(_detect_batch, [frame for frame, _, _ in batch], batch[0][1])
+            except RuntimeError as e:
+                # The executor has been shut down
+                self.idle_workers.release()
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            result.add_done_callback(lambda result, batch=batch: self._deliver(batch, result))
+
+    def _next_batch(self):
+        if self.held is not None:
+            batch, self.held = [self.held], None
+        else:
+            try:
+                batch = [self.requests.get(timeout=0.5)]
+            except queue.Empty:
+                return []
+        deadline = time.monotonic() + self.batch_window_s
+        while len(batch) < self.max_batch:
+            try:
+                request = self.requests.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if request[1] != batch[0][1]:
+                self.held = request
+                break
+            batch.append(request)
+        return batch
+
+    def _deliver(self, batch, result):
+        self.idle_workers.release()
+        try:
+            persons = result.result()
+        except Exception as e:
+            logger.error("Batched detection failed: %s", e)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), frame_persons in zip(batch, persons):
+            future.set_result(frame_persons)
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2.0)
+        if self.held is not None:
+            self.requests.put(self.held)
+            self.held = None
+        while True:
+            try:
+                _, _, future = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("Detector pool is closed."))
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -1,60 +1,108 @@
 
 from pymavlink import mavutil
+import asyncio
+import functools
+import logging
 import time
 import math
-from src import config
-from src.communication import BaseStationCommunicator
-from src.detection import scan_for_person
-from src.offset import PersonBoundingBox, calculate_offset, calculate_velocity_command
+import numpy as np
+from src import config, geo
+from src.communication import BaseStationCommunicator, TelemetryCoalescer
+from src.pipeline import create_pipeline
+from src.recorder import MissionRecorder
+from src.metrics import METRICS
+from src.runtime import get_runtime
+from src.commands import CommandManager
+from src.telemetry import MavlinkTelemetry
+from src.geolocation import Geolocator
+from src.offset import CenteringController, calculate_offset, select_target
 import cv2
 
-from src.shared import GPSCoordinates
+from src.shared import GPSCoordinates, VelocityCommand
+from src.sightings import SightingIndex
 
-class VelocityCommand:
-    def __init__(self, north_m_s, east_m_s, down_m_s):
-        self.north_m_s = north_m_s
-        self.east_m_s = east_m_s
-        self.down_m_s = down_m_s
+logger = logging.getLogger(__name__)
 
 class DroneController:
-    def __init__(self):
-        self.connection_url = config.CONNECTION_URL
+    def __init__(self, connection_url=config.CONNECTION_URL, camera_source=config.CAMERA_SOURCE, recorder=None):
+        self.connection_url = connection_url
         self.master = None
+        self.telemetry = None
+        self.commands = None
+        self.geolocator = None
         self.is_connected = False
         self.communicator = BaseStationCommunicator()
+        # Event loop the *_async methods run on; the blocking methods are thin wrappers around it
+        self.runtime = get_runtime()
+        # Records each vision task for post-flight analysis when config.RECORDING_ENABLED is set
+        self.recorder = recorder if recorder is not None else MissionRecorder()
+        # Builds the capture -> detection pipeline for each vision task
+        self.pipeline_factory = functools.partial(create_pipeline, camera_source, altitude=self.relative_altitude,
+                                                  recorder=self.recorder)
+        # Persons seen while scouting; scouts in a fleet share one index
+        self.sightings = SightingIndex()
 
     def connect(self):
         try:
-            print(f"Connecting to drone on {self.connection_url}...")
+            logger.info("Connecting to drone on %s...", self.connection_url)
             self.master = mavutil.mavlink_connection(self.connection_url, autoreconnect=True)
             self.master.wait_heartbeat(timeout=5)
-            print(f"Heartbeat from system (system {self.master.target_system} component {self.master.target_component})")
+            logger.info("Heartbeat from system (system %d component %d)", self.master.target_system, self.master.target_component)
+            # From here on only the telemetry reader thread reads from the connection
+            self.telemetry = MavlinkTelemetry(self.master)
+            self.telemetry.add_listener(self._record_position)
+            self.telemetry.start()
+            self.commands = CommandManager(self.master, self.telemetry)
+            self.geolocator = Geolocator(self.telemetry)
             self.is_connected = True
             return True
         except Exception as e:
-            print(f"Failed to connect: {e}")
+            logger.error("Failed to connect: %s", e)
             return False
 
-    def _wait_for_ack(self, command_name, timeout=3):
-        try:
-            ack = self.master.recv_match(type='COMMAND_ACK', blocking=True, timeout=timeout)
-            if ack and ack.command == command_name and ack.result == mavutil.mavlink.MAV_RESULT_ACCEPTED:
-                return True
-            print(f"Command {mavutil.mavlink.enums['MAV_CMD'][command_name].name} was not accepted.")
-            return False
-        except Exception as e:
-            print(f"Error waiting for ACK: {e}")
-            return False
+    async def _wait_for_ack(self, ack_future):
+        """Waits for a command sent through `self.commands` to be acknowledged. Returns True if accepted."""
+        return await self.commands.wait_accepted_async(ack_future)
 
     def get_current_gps(self):
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
         
-        msg = self.master.recv_match(type='GLOBAL_POSITION_INT', blocking=True, timeout=3)
+        # Non-blocking: the telemetry reader keeps the latest position up to date
+        msg = self.telemetry.latest('GLOBAL_POSITION_INT', max_age=config.TELEMETRY_MAX_AGE_S)
         if not msg:
-            print("Failed to get GPS data.")
+            logger.warning("Failed to get GPS data.")
             return None
             
+        return self._gps_from_message(msg)
+
+    def relative_altitude(self):
+        """Height above home in metres from the latest position, or None without a fresh one. Safe from any thread."""
+        if self.telemetry is None:
+            return None
+        msg = self.telemetry.latest('GLOBAL_POSITION_INT', max_age=config.TELEMETRY_MAX_AGE_S)
+        return msg.relative_alt / 1000.0 if msg else None
+
+    def get_battery_remaining(self):
+        """Remaining battery as a fraction (0-1), or None if the autopilot does not report it."""
+        msg = self.telemetry.latest('SYS_STATUS', max_age=config.TELEMETRY_MAX_AGE_S * 5)
+        if not msg or msg.battery_remaining < 0:
+            return None
+        return msg.battery_remaining / 100.0
+
+    def flight_budget_m(self):
+        """Distance the drone can still fly before dipping into its battery reserve, or None if unknown."""
+        remaining = self.get_battery_remaining()
+        if remaining is None or config.BATTERY_FULL_RANGE_M is None:
+            return None
+        return config.BATTERY_FULL_RANGE_M * max(remaining - config.BATTERY_RESERVE_FRACTION, 0.0)
+
+    def _record_position(self, msg):
+        if msg.get_type() == 'GLOBAL_POSITION_INT':
+            self.recorder.record_position(msg)
+
+    @staticmethod
+    def _gps_from_message(msg):
         return GPSCoordinates(
             msg.lat / 1e7,
             msg.lon / 1e7,
@@ -66,96 +114,144 @@ class DroneController:
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
             
-        self.master.mav.set_position_target_local_ned_send(
-            0, 
-            self.master.target_system,
-            self.master.target_component,
-            mavutil.mavlink.MAV_FRAME_LOCAL_NED,
-            0b0000111111000111, 
-            0, 0, 0,
-            cmd.north_m_s, cmd.east_m_s, cmd.down_m_s,
-            0, 0, 0, 
-            0, 0)
+        self.recorder.record_command(cmd)
+        with METRICS.span("mavlink.velocity_send"):
+            self.master.mav.set_position_target_local_ned_send(
+                0, 
+                self.master.target_system,
+                self.master.target_component,
+                mavutil.mavlink.MAV_FRAME_LOCAL_NED,
+                0b0000111111000111, 
+                0, 0, 0,
+                cmd.north_m_s, cmd.east_m_s, cmd.down_m_s,
+                0, 0, 0, 
+                0, 0)
+
+    def _distance_to(self, target_gps: GPSCoordinates):
+        """Distance in metres from the current position to `target_gps`, or None without a GPS fix."""
+        current_gps = self.get_current_gps()
+        if not current_gps:
+            return None
+        return float(geo.distance_3d_m(
+            current_gps.latitude_deg, current_gps.longitude_deg, current_gps.relative_altitude_m,
+            target_gps.latitude_deg, target_gps.longitude_deg, target_gps.relative_altitude_m))
+
+    @staticmethod
+    def _approach_state(msg, target_gps: GPSCoordinates):
+        """Distance to `target_gps` and closing speed towards it (m/s) from one GLOBAL_POSITION_INT."""
+        offset = geo.geodetic_to_enu(
+            target_gps.latitude_deg, target_gps.longitude_deg, target_gps.relative_altitude_m,
+            msg.lat / 1e7, msg.lon / 1e7, msg.relative_alt / 1000.0)
+        distance = math.hypot(*offset)
+        if distance == 0:
+            return 0.0, 0.0
+        # vx/vy/vz are north/east/down in cm/s; reorder to east/north/up
+        velocity = (msg.vy / 100.0, msg.vx / 100.0, -msg.vz / 100.0)
+        closing_speed = sum(o * v for o, v in zip(offset, velocity)) / distance
+        return distance, closing_speed
 
     def start_offboard_mode(self):
+        return self.runtime.run(self.start_offboard_mode_async())
+
+    def takeoff(self, altitude_m):
+        return self.runtime.run(self.takeoff_async(altitude_m))
+
+    def release_payload(self):
+        return self.runtime.run(self.release_payload_async())
+
+    def goto_gps_coordinates(self, target_gps: GPSCoordinates, tolerance_m=config.GPS_REACHED_TOLERANCE_M, timeout=120):
+        return self.runtime.run(self.goto_async(target_gps, tolerance_m, timeout))
+
+    def land(self):
+        return self.runtime.run(self.land_async())
+
+    def return_to_home(self):
+        return self.runtime.run(self.return_to_home_async())
+
+    def center_on_person_and_drop_payload(self):
+        return self.runtime.run(self.center_and_drop_async())
+
+    def deliver_to(self, target_gps: GPSCoordinates, cruise_altitude_m=config.DEFAULT_TAKEOFF_ALTITUDE_DELIVER):
+        return self.runtime.run(self.deliver_to_async(target_gps, cruise_altitude_m))
+
+    def start_person_detection_and_communication(self):
+        return self.runtime.run(self.scout_async())
+
+    async def start_offboard_mode_async(self):
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
 
         mode = 'GUIDED'
         if mode not in self.master.mode_mapping():
-            print(f"GUIDED mode is not supported.")
+            logger.error("GUIDED mode is not supported.")
             return False
 
         mode_id = self.master.mode_mapping()[mode]
         
-        print("Arming vehicle...")
-        self.master.mav.command_long_send(
-            self.master.target_system, self.master.target_component,
-            mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0, 1, 0, 0, 0, 0, 0, 0)
-        
-        if not self._wait_for_ack(mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM):
+        # Arm only once the autopilot has confirmed the mode, so it never arms in whatever mode it was in
+        logger.info("Setting mode to %s...", mode)
+        mode_ack = self.commands.send(
+            mavutil.mavlink.MAV_CMD_DO_SET_MODE,
+            mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED, mode_id)
+        if not await self._wait_for_ack(mode_ack):
+            logger.error("Failed to set mode to %s. Not arming.", mode)
             return False
-        print("Vehicle armed.")
+        logger.info("Mode set to %s. Arming vehicle...", mode)
 
-        print(f"Setting mode to {mode}...")
-        self.master.mav.set_mode_send(
-            self.master.target_system,
-            mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED,
-            mode_id)
-
-        if not self._wait_for_ack(mavutil.mavlink.MAV_CMD_DO_SET_MODE):
-             return False
-        print(f"Mode set to {mode}.")
+        arm_ack = self.commands.send(mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 1)
+        if not await self._wait_for_ack(arm_ack):
+            # A lost ACK does not mean the vehicle stayed disarmed
+            logger.error("Arming was not acknowledged. Disarming to be safe.")
+            await self._wait_for_ack(self.commands.send(mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0))
+            return False
+        logger.info("Vehicle armed.")
         return True
 
-    def takeoff(self, altitude_m):
+    async def takeoff_async(self, altitude_m):
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
 
-        print(f"Taking off to {altitude_m}m...")
-        self.master.mav.command_long_send(
-            self.master.target_system, self.master.target_component,
-            mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, 0, 0, 0, 0, 0, 0, 0, altitude_m)
+        logger.info("Taking off to %sm...", altitude_m)
+        ack = self.commands.send(mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, 0, 0, 0, 0, 0, 0, altitude_m)
 
-        if not self._wait_for_ack(mavutil.mavlink.MAV_CMD_NAV_TAKEOFF):
-            print("Failed to acknowledge takeoff command.")
+        if not await self._wait_for_ack(ack):
+            logger.error("Failed to acknowledge takeoff command.")
             return False
 
-        # Wait for the drone to reach the target altitude
+        # Wait for the drone to reach the target altitude, checking every position update
         while True:
-            msg = self.master.recv_match(type='GLOBAL_POSITION_INT', blocking=True)
+            msg = await self.telemetry.wait_for_async(
+                'GLOBAL_POSITION_INT', lambda m: m.relative_alt / 1000.0 >= altitude_m * 0.95, timeout=1)
             if msg:
-                relative_alt = msg.relative_alt / 1000.0
-                print(f"Current altitude: {relative_alt:.2f}m")
-                if relative_alt >= altitude_m * 0.95:
-                    print("Reached target altitude.")
-                    return True
-            time.sleep(1)
+                logger.info("Reached target altitude.")
+                return True
+            current = self.telemetry.latest('GLOBAL_POSITION_INT')
+            if current:
+                logger.info("Current altitude: %.2fm", current.relative_alt / 1000.0)
 
-    def release_payload(self):
+    async def release_payload_async(self):
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
 
-        print(f"Releasing payload on servo channel {config.PAYLOAD_SERVO_CHANNEL}...")
-        self.master.mav.command_long_send(
-            self.master.target_system, self.master.target_component,
-            mavutil.mavlink.MAV_CMD_DO_SET_SERVO, 0,
+        logger.info("Releasing payload on servo channel %d...", config.PAYLOAD_SERVO_CHANNEL)
+        ack = self.commands.send(
+            mavutil.mavlink.MAV_CMD_DO_SET_SERVO,
             config.PAYLOAD_SERVO_CHANNEL,  # servo number
-            config.PAYLOAD_SERVO_OPEN_PWM,  # PWM value for open
-            0, 0, 0, 0, 0) # Unused parameters
-        
-        if not self._wait_for_ack(mavutil.mavlink.MAV_CMD_DO_SET_SERVO):
-            print("Failed to acknowledge payload release command.")
+            config.PAYLOAD_SERVO_OPEN_PWM)  # PWM value for open
+
+        if not await self._wait_for_ack(ack):
+            logger.error("Failed to acknowledge payload release command.")
             return False
-        print("Payload release command sent.")
+        logger.info("Payload release command sent.")
         self.communicator.transmit_payload_dropped_status(True)
         return True
 
-    def goto_gps_coordinates(self, target_gps: GPSCoordinates, tolerance_m=1.0, timeout=120):
+    async def goto_async(self, target_gps: GPSCoordinates, tolerance_m=config.GPS_REACHED_TOLERANCE_M, timeout=120):
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
 
-        print(f"Navigating to Lat: {target_gps.latitude_deg}, Lon: {target_gps.longitude_deg}, Alt: {target_gps.relative_altitude_m}m...")
+        logger.info("Navigating to Lat: %s, Lon: %s, Alt: %sm...",
+                    target_gps.latitude_deg, target_gps.longitude_deg, target_gps.relative_altitude_m)
 
         # Send MAV_CMD_NAV_WAYPOINT command
         self.master.mav.send(
@@ -172,149 +268,268 @@ class DroneController:
             )
         )
 
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            current_gps = self.get_current_gps()
-            if current_gps:
-                # Simple Euclidean distance check (approximation for small distances)
-                # More accurate would be haversine formula
-                distance = math.sqrt(
-                    ((current_gps.latitude_deg - target_gps.latitude_deg) * 111319.9)**2 + 
-                    ((current_gps.longitude_deg - target_gps.longitude_deg) * 111319.9 * math.cos(math.radians(current_gps.latitude_deg)))**2 + 
-                    ((current_gps.relative_altitude_m - target_gps.relative_altitude_m))**2
-                )
-                
-                print(f"Distance to target: {distance:.2f}m")
-                if distance < tolerance_m:
-                    print("Reached target GPS coordinates.")
-                    return True
-            time.sleep(1) # Check every second
+        # Evaluate every position update as it arrives, reporting progress once a second
+        arrival = geo.ArrivalDetector(tolerance_m, config.ARRIVAL_MAX_LOOKAHEAD_S)
+        deadline = time.monotonic() + timeout
+        last_report = 0.0
+        while time.monotonic() < deadline:
+            msg = await self.telemetry.wait_for_async('GLOBAL_POSITION_INT', timeout=deadline - time.monotonic())
+            if msg is None:
+                continue
+            distance, closing_speed = self._approach_state(msg, target_gps)
+            if arrival.update(distance, closing_speed, msg.time_boot_ms / 1000.0):
+                logger.info("Reached target GPS coordinates (%.2fm, closing at %.1fm/s).", distance, closing_speed)
+                return True
+            if time.monotonic() - last_report >= 1.0:
+                logger.info("Distance to target: %.2fm", distance)
+                last_report = time.monotonic()
 
-        print("Navigation to GPS coordinates timed out.")
+        logger.warning("Navigation to GPS coordinates timed out.")
         return False
 
-    def land(self):
+    async def land_async(self):
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
 
-        print("Initiating landing sequence...")
-        self.master.mav.command_long_send(
-            self.master.target_system, self.master.target_component,
-            mavutil.mavlink.MAV_CMD_NAV_LAND, 0, 0, 0, 0, 0, 0, 0, 0) # All params 0 for current position
-        
+        logger.info("Initiating landing sequence...")
+        ack = self.commands.send(mavutil.mavlink.MAV_CMD_NAV_LAND) # All params 0 for current position
+
+        if not await self._wait_for_ack(ack):
+            logger.error("Failed to acknowledge land command.")
+            return False
+
         # Wait for the drone to land (simplified check)
         start_time = time.time()
         timeout = 120 # seconds
         while time.time() - start_time < timeout:
-            msg = self.master.recv_match(type='GLOBAL_POSITION_INT', blocking=True, timeout=1)
-            if msg and msg.relative_alt / 1000.0 < 0.5: # Landed if relative altitude is very low
-                print("Drone has landed.")
+            # Landed if relative altitude is very low
+            msg = await self.telemetry.wait_for_async('GLOBAL_POSITION_INT', lambda m: m.relative_alt / 1000.0 < 0.5, timeout=1)
+            if msg:
+                logger.info("Drone has landed.")
                 return True
-            time.sleep(1)
-        print("Landing timed out or failed.")
+        logger.warning("Landing timed out or failed.")
         return False
 
-    def return_to_home(self):
+    async def return_to_home_async(self):
         if not self.is_connected:
             raise ConnectionError("Not connected to drone.")
 
-        print("Initiating Return To Launch (RTL) sequence...")
-        self.master.mav.command_long_send(
-            self.master.target_system, self.master.target_component,
-            mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH, 0, 0, 0, 0, 0, 0, 0, 0)
-        
-        if not self._wait_for_ack(mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH):
-            print("Failed to acknowledge RTL command.")
+        logger.info("Initiating Return To Launch (RTL) sequence...")
+        ack = self.commands.send(mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH)
+
+        if not await self._wait_for_ack(ack):
+            logger.error("Failed to acknowledge RTL command.")
             return False
-        print("RTL command sent. Drone should be returning to home.")
+        logger.info("RTL command sent. Drone should be returning to home.")
         return True
 
-    def center_on_person_and_drop_payload(self):
-        cap = cv2.VideoCapture(0)
-
-        if not cap.isOpened():
-            print("Error: Could not open video stream for delivery sequence.")
-            return
+    async def center_and_drop_async(self, pipeline=None):
+        """
+        Centers over the largest person in view and releases the payload. Uses `pipeline`
+        if one is already running (e.g. from the approach), otherwise starts its own.
+        Returns True once the payload has been released, False if the person could not be
+        centered within `config.CENTERING_TIMEOUT`.
+
+        Velocity commands go out at `config.CENTERING_CONTROL_RATE_HZ` whatever the
+        detection rate; detections are fed to the controller as they arrive.
+        """
+        owns_pipeline = pipeline is None
+        if owns_pipeline:
+            pipeline = self.pipeline_factory()
+            if not pipeline.start():
+                logger.error("Could not open video stream for delivery sequence.")
+                return False
+
+        logger.info("Starting delivery sequence...")
+        controller = CenteringController()
+        observer = asyncio.ensure_future(self._observe_persons(pipeline, controller))
+        period = 1.0 / config.CENTERING_CONTROL_RATE_HZ
+        deadline = time.monotonic() + config.CENTERING_TIMEOUT
+        next_tick = time.monotonic()
+        last_capture_time = None
+        try:
+            while time.monotonic() < deadline:
+                if observer.done():
+                    # The pipeline stopped or the display window was closed
+                    return False
+
+                now = time.monotonic()
+                msg = self.telemetry.latest('GLOBAL_POSITION_INT', max_age=config.TELEMETRY_MAX_AGE_S)
+                north_m_s, east_m_s = (msg.vx / 100.0, msg.vy / 100.0) if msg else (0.0, 0.0)
+                with METRICS.span("control.update"):
+                    velocity_cmd, is_centered = controller.update(now, north_m_s, east_m_s)
+
+                if is_centered:
+                    logger.info("Person centered. Releasing payload.")
+                    await self.release_payload_async()
+                    await asyncio.sleep(2) # Wait for payload to drop
+                    logger.info("Payload released. Mission for this location is complete.")
+                    return True
 
-        print("Starting delivery sequence...")
+                self.send_velocity_command(velocity_cmd)
+                if controller.capture_time is not None and controller.capture_time != last_capture_time:
+                    # End-to-end: frame captured -> first velocity command computed from it
+                    last_capture_time = controller.capture_time
+                    METRICS.histogram("control.capture_to_command", "seconds").record(time.monotonic() - last_capture_time)
+                    logger.debug("Adjusting position. Velocity command: N=%.2f, E=%.2f (frame age %.0fms)",
+                                 velocity_cmd.north_m_s, velocity_cmd.east_m_s, (now - last_capture_time) * 1000)
+
+                next_tick += period
+                delay = next_tick - time.monotonic()
+                if delay < 0:
+                    # Fell behind (e.g. a slow send); keep the rate rather than bursting to catch up
+                    next_tick = time.monotonic()
+                    delay = 0
+                await asyncio.sleep(delay)
+
+            logger.warning("Could not center on a person within %ss. Hovering.", config.CENTERING_TIMEOUT)
+            self.send_velocity_command(VelocityCommand(0, 0, 0))
+            return False
+        finally:
+            observer.cancel()
+            if owns_pipeline:
+                pipeline.stop()
+                if config.ENABLE_VIDEO_DISPLAY:
+                    cv2.destroyAllWindows()
+
+    async def _observe_persons(self, pipeline, controller: CenteringController):
+        """
+        Feeds the offset of the target person in each fresh detection to `controller` until
+        the pipeline stops. The target is picked by `config.TARGET_SELECTION_POLICY`.
+        """
+        target_id = None
         while True:
-            success, frame = cap.read()
-            if not success:
-                print("Failed to grab frame for delivery sequence. Exiting.")
-                break
-
-            persons, annotated_frame = scan_for_person(frame)
-
-            if persons:
-                # Assume the largest bounding box is the target
-                target_person = max(persons, key=lambda p: (p[2] - p[0]) * (p[3] - p[1]))
-                person_bbox = PersonBoundingBox(*target_person)
-                
-                offset = calculate_offset(person_bbox)
-
-                if offset.is_centered:
-                    print("Person centered. Releasing payload.")
-                    self.release_payload()
-                    time.sleep(2) # Wait for payload to drop
-                    print("Payload released. Mission for this location is complete.")
-                    break
-                else:
-                    velocity_cmd = calculate_velocity_command(offset)
-                    print(f"Adjusting position. Velocity command: N={velocity_cmd.north_m_s:.2f}, E={velocity_cmd.east_m_s:.2f}")
-                    self.send_velocity_command(velocity_cmd)
+            result = await pipeline.get_latest_async()
+            if result is None:
+                if not pipeline.is_running:
+                    logger.error("Failed to grab frame for delivery sequence. Exiting.")
+                    return
+                continue
+
+            persons = result.persons
+            if len(persons) and result.age_s <= controller.max_measurement_age_s:
+                msg = self.telemetry.latest('GLOBAL_POSITION_INT', max_age=config.TELEMETRY_MAX_AGE_S)
+                altitude_m = msg.relative_alt / 1000.0 if msg else config.DEFAULT_TAKEOFF_ALTITUDE_DELIVER
+                with METRICS.span("control.offset"):
+                    offsets = calculate_offset(persons)
+                    index = select_target(persons, offsets, track_id=target_id)
+                    target_id = int(persons["track_id"][index])
+                    target = offsets.select(index)
+                    controller.observe(target, result.capture_time, altitude_m)
+                self.recorder.record_offset(result.capture_time, target_id, target)
             else:
-                # If no person is detected, hover in place
-                print("No person detected. Hovering.")
-                self.send_velocity_command(VelocityCommand(0, 0, 0))
+                # Without a (fresh) detection the controller hovers once its last one is too old
+                logger.debug("No person detected.")
 
             if config.ENABLE_VIDEO_DISPLAY:
-                cv2.imshow("Delivery Sequence", annotated_frame)
+                cv2.imshow("Delivery Sequence", result.annotated_frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
-        
-        
-        cap.release()
-        cv2.destroyAllWindows()
+                    return
+
+    async def deliver_to_async(self, target_gps: GPSCoordinates, cruise_altitude_m=config.DEFAULT_TAKEOFF_ALTITUDE_DELIVER):
+        """
+        Flies to `target_gps` and drops the payload on the person there.
+
+        Only the target's latitude and longitude are used: a person's position is on the
+        ground, so the vehicle flies there at `cruise_altitude_m` above home.
+
+        The camera pipeline scans during the approach: once a person is detected within
+        `config.APPROACH_SCAN_RADIUS_M` of the target the navigation is cancelled and
+        centering starts immediately rather than after arrival.
+        """
+        target_gps = GPSCoordinates(target_gps.latitude_deg, target_gps.longitude_deg,
+                                    target_gps.absolute_altitude_m, cruise_altitude_m)
+        pipeline = self.pipeline_factory()
+        if not pipeline.start():
+            logger.error("Could not open video stream for delivery sequence.")
+            return False
 
-    def start_person_detection_and_communication(self):
-        cap = cv2.VideoCapture(0)
+        goto_task = asyncio.ensure_future(self.goto_async(target_gps))
+        person_in_range = False
+        try:
+            while not goto_task.done():
+                result = await pipeline.get_latest_async()
+                if result is None:
+                    if not pipeline.is_running:
+                        break
+                    continue
+                if len(result.persons) and result.age_s <= config.PIPELINE_MAX_RESULT_AGE_S:
+                    distance = self._distance_to(target_gps)
+                    if distance is not None and distance <= config.APPROACH_SCAN_RADIUS_M:
+                        logger.info("Person detected %.1fm from the delivery location. Starting final approach.", distance)
+                        person_in_range = True
+                        break
+
+            if person_in_range:
+                goto_task.cancel()
+            elif not await goto_task:
+                logger.warning("Failed to navigate to the delivery location.")
+                return False
+            else:
+                logger.info("Reached delivery location. Starting final approach and payload drop.")
 
-        if not cap.isOpened():
-            print("Error: Could not open video stream for person detection.")
+            return await self.center_and_drop_async(pipeline)
+        finally:
+            if not goto_task.done():
+                goto_task.cancel()
+            pipeline.stop()
+            if config.ENABLE_VIDEO_DISPLAY:
+                cv2.destroyAllWindows()
+
+    def locate_persons(self, persons, capture_time):
+        """
+        Ground position of each person in a frame, from the camera geometry. Falls back to
+        the drone's own position, as one fix for the whole frame, when the attitude or
+        position at capture time is not available.
+        """
+        with METRICS.span("scout.geolocate"):
+            located = self.geolocator.locate(persons, capture_time) if self.geolocator else None
+        if located is None:
+            METRICS.counter("scout.geolocation_fallbacks").inc()
+            current_gps = self.get_current_gps()
+            if current_gps is None:
+                logger.warning("Not able to get the drone's current GPS coordinates")
+                return []
+            logger.debug("Person detected at drone's current GPS: Lat: %s, Lon: %s", current_gps.latitude_deg, current_gps.longitude_deg)
+            return [current_gps]
+        lat, lon, alt = located
+        valid = np.isfinite(lat)
+        return [GPSCoordinates(float(person_lat), float(person_lon), float(person_alt), 0.0)
+                for person_lat, person_lon, person_alt in zip(lat[valid], lon[valid], alt[valid])]
+
+    async def scout_async(self):
+        pipeline = self.pipeline_factory()
+
+        if not pipeline.start():
+            logger.error("Could not open video stream for person detection.")
             return
 
-        print("Starting person detection and communication...")
-        while True:
-            success, frame = cap.read()
-            if not success:
-                print("Failed to grab frame for person detection. Exiting.")
-                break
-
-            person_detected, annotated_frame = scan_for_person(frame)
-            self.communicator.transmit_person_detected_status(person_detected)
-
-            if person_detected:
-                current_gps = self.get_current_gps()
-                if current_gps:
-                    print(f"Person detected at drone's current GPS: Lat: {current_gps.latitude_deg}, Lon: {current_gps.longitude_deg}")
-                    self.communicator.transmit_coordinates(current_gps)
-                else: 
-                    print("Not able to get the drone's current GPS coordinates")
+        logger.info("Starting person detection and communication...")
+        coalescer = TelemetryCoalescer(self.communicator, sightings=self.sightings)
+        try:
+            # get_latest() blocks until a new detection is ready, so this loop never busy-waits.
+            # In a real production scenario, you'd want a more robust exit condition,
+            # such as listening for a signal or a message from the base station.
+            while True:
+                result = await pipeline.get_latest_async()
+                if result is None:
+                    if not pipeline.is_running:
+                        logger.error("Failed to grab frame for person detection. Exiting.")
+                        break
+                    continue
+
+                person_detected = len(result.persons) > 0
+                coalescer.update_detection(person_detected)
+
+                if person_detected:
+                    for fix in self.locate_persons(result.persons, result.capture_time):
+                        self.recorder.record_fix(result.capture_time, fix)
+                        coalescer.add_fix(fix)
+                if config.ENABLE_VIDEO_DISPLAY:
+                    cv2.imshow("Person Detection", result.annotated_frame)
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        break
+        finally:
+            pipeline.stop()
             if config.ENABLE_VIDEO_DISPLAY:
-                cv2.imshow("Person Detection", annotated_frame)
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
-            else:
-                # In headless mode, provide a way to stop the loop, e.g., a simple time limit or external signal
-                # For now, we'll just break after a short delay to avoid an infinite loop in a non-interactive environment
-                time.sleep(0.1) # Small delay to prevent busy-waiting
-                # In a real production scenario, you'd want a more robust exit condition,
-                # such as listening for a signal or a message from the base station.
-                # For demonstration, we'll assume the script will be managed externally.
-                pass
-        
-        cap.release()
-        cv2.destroyAllWindows()
-
-
-
+                cv2.destroyAllWindows()
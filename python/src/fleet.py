@@ -0,0 +1,239 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import time
+
+import numpy as np
+
+from src import config, geo
+from src.communication import BaseStationCommunicator, close_links
+from src.coordinate_server import get_coordinate_server
+from src.drone_controller import DroneController
+from src.pipeline import CameraPipeline
+from src.shared import GPSCoordinates
+from src.sightings import SightingIndex
+
+logger = logging.getLogger(__name__)
+
+SCOUT = "scout"
+DELIVERY = "delivery"
+TAKEOFF_ALTITUDES = {
+    SCOUT: config.DEFAULT_TAKEOFF_ALTITUDE_SCOUT,
+    DELIVERY: config.DEFAULT_TAKEOFF_ALTITUDE_DELIVER,
+}
+
+
+class ScoutCommunicator(BaseStationCommunicator):
+    """Reports a scout's coordinates to the base station and also hands them to the fleet."""
+
+    def __init__(self, on_coordinates, **kwargs):
+        super().__init__(**kwargs)
+        self.on_coordinates = on_coordinates
+
+    def transmit_coordinates(self, coords: GPSCoordinates):
+        self.on_coordinates(coords)
+        return super().transmit_coordinates(coords)
+
+
+class FleetVehicle:
+    def __init__(self, name, role, connection_url, camera_source=config.CAMERA_SOURCE):
+        if role not in TAKEOFF_ALTITUDES:
+            raise ValueError(f"Unknown role '{role}' for {name}. Expected one of: {', '.join(TAKEOFF_ALTITUDES)}")
+        self.name = name
+        self.role = role
+        self.camera_source = camera_source
+        self.drone = DroneController(connection_url, camera_source)
+        self.home = None
+        self.busy = False
+
+    @property
+    def system_id(self):
+        return self.drone.master.target_system if self.drone.master is not None else None
+
+
+class FleetManager:
+    """
+    Drives several vehicles from one process.
+
+    Each vehicle keeps its own MAVLink connection (a distinct port and system id), but
+    all of them share the mission event loop, one detector (pass a DetectorPool so a
+    single model serves every camera) and one base-station link, with every message
+    tagged with the sender's system id. Scouts also share one SightingIndex, so a person
+    seen by several scouts is one target whose position keeps being refined until a
+    delivery drone is sent. Targets are dispatched to the nearest idle delivery drone that
+    has the battery to get there and back.
+    """
+
+    def __init__(self, vehicles=config.FLEET_VEHICLES, detector=None):
+        self.vehicles = [FleetVehicle(**spec) for spec in vehicles]
+        self.detector = detector
+        self.runtime = self.vehicles[0].drone.runtime if self.vehicles else None
+        self.sightings = SightingIndex()
+        self.targets = []  # Sightings not yet dispatched; only touched on the event loop
+        self.targeted = set()  # ids of every sighting ever queued as a target
+        self.last_target_time = time.monotonic()
+        self.wakeup = None
+        self.delivered = 0
+        self.failed = 0
+
+    def connect(self):
+        """Connects every vehicle at once. Vehicles that fail are dropped from the fleet."""
+        if not self.vehicles:
+            return False
+        with concurrent.futures.ThreadPoolExecutor(len(self.vehicles)) as pool:
+            connected = list(pool.map(lambda vehicle: vehicle.drone.connect(), self.vehicles))
+
+        for vehicle, ok in zip(self.vehicles, connected):
+            if not ok:
+                logger.error("%s did not connect. Continuing without it.", vehicle.name)
+                continue
+            drone = vehicle.drone
+            drone.sightings = self.sightings
+            drone.recorder.name = vehicle.name
+            logger.info("%s (%s) is system %d.", vehicle.name, vehicle.role, vehicle.system_id)
+            if vehicle.role == SCOUT:
+                drone.communicator = ScoutCommunicator(self.report_target, drone_id=vehicle.system_id)
+            else:
+                drone.communicator = BaseStationCommunicator(drone_id=vehicle.system_id)
+            if self.detector is not None:
+                drone.pipeline_factory = functools.partial(
+                    CameraPipeline, vehicle.camera_source, self.detector.scan_for_person,
+                    altitude=drone.relative_altitude, recorder=drone.recorder,
+                    fixed_imgsz=self.detector.fixed_imgsz)
+        self.vehicles = [vehicle for vehicle, ok in zip(self.vehicles, connected) if ok]
+        return bool(self.vehicles)
+
+    def report_target(self, coords: GPSCoordinates):
+        """Queues a delivery target. Safe to call from any thread."""
+        self.runtime.loop.call_soon_threadsafe(self._add_target, coords)
+
+    def _add_target(self, coords):
+        # Scout reports are sighting estimates already in the index. Targets from the base
+        # station are added to it, so a person is never queued (or delivered to) twice.
+        sighting = self.sightings.nearest(coords)
+        if sighting is None:
+            sighting, _ = self.sightings.add(coords)
+        if sighting.sighting_id in self.targeted:
+            return
+        self.targeted.add(sighting.sighting_id)
+        self.targets.append(sighting)
+        self.last_target_time = time.monotonic()
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def run(self):
+        return self.runtime.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Launches every vehicle, then scouts search while delivery drones serve targets.
+        Returns once the scouts have finished, no delivery is in flight and no new target has
+        arrived for `config.FLEET_IDLE_TIMEOUT_S`; targets no drone can reach are left
+        undelivered. Every vehicle then returns home.
+        """
+        self.wakeup = asyncio.Event()
+        launched = await asyncio.gather(*(self._launch(vehicle) for vehicle in self.vehicles))
+        vehicles = [vehicle for vehicle, ok in zip(self.vehicles, launched) if ok]
+        scouts = [vehicle for vehicle in vehicles if vehicle.role == SCOUT]
+        deliveries = [vehicle for vehicle in vehicles if vehicle.role == DELIVERY]
+        logger.info("Fleet airborne: %d scout(s), %d delivery drone(s).", len(scouts), len(deliveries))
+
+        scout_tasks = [asyncio.ensure_future(vehicle.drone.scout_async()) for vehicle in scouts]
+        try:
+            await self._dispatch(deliveries, scout_tasks)
+        finally:
+            for task in scout_tasks:
+                task.cancel()
+            logger.info("Fleet mission finished: %d delivered, %d failed, %d not attempted.",
+                        self.delivered, self.failed, len(self.targets))
+            await asyncio.gather(*(vehicle.drone.return_to_home_async() for vehicle in vehicles),
+                                 return_exceptions=True)
+
+    async def _launch(self, vehicle):
+        drone = vehicle.drone
+        vehicle.home = drone.get_current_gps()
+        if not await drone.start_offboard_mode_async():
+            logger.error("%s could not switch to offboard mode.", vehicle.name)
+            return False
+        if not await drone.takeoff_async(TAKEOFF_ALTITUDES[vehicle.role]):
+            logger.error("%s failed to take off.", vehicle.name)
+            return False
+        if vehicle.home is None:
+            vehicle.home = drone.get_current_gps()
+        return True
+
+    async def _dispatch(self, deliveries, scout_tasks):
+        server = get_coordinate_server()
+        deliveries_in_flight = set()
+        last_activity = time.monotonic()
+        while True:
+            while server.is_running:
+                target = server.get_target(timeout=0)
+                if target is None:
+                    break
+                self._add_target(target)
+
+            for vehicle, target in self._assign([v for v in deliveries if not v.busy]):
+                self.targets.remove(target)
+                vehicle.busy = True
+                deliveries_in_flight.add(asyncio.ensure_future(self._deliver(vehicle, target)))
+            deliveries_in_flight = {task for task in deliveries_in_flight if not task.done()}
+
+            if deliveries_in_flight or not all(task.done() for task in scout_tasks):
+                last_activity = time.monotonic()
+            elif time.monotonic() - max(last_activity, self.last_target_time) >= config.FLEET_IDLE_TIMEOUT_S:
+                return
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), config.FLEET_DISPATCH_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+
+    def _assign(self, idle):
+        """Pairs idle delivery drones with pending targets, closest pairs first, within each drone's battery."""
+        positions = {vehicle: vehicle.drone.get_current_gps() for vehicle in idle}
+        idle = [vehicle for vehicle in idle if positions[vehicle] is not None]
+        if not idle or not self.targets:
+            return []
+
+        target_lat = np.array([t.latitude_deg for t in self.targets])
+        target_lon = np.array([t.longitude_deg for t in self.targets])
+        outbound = geo.haversine_m(
+            np.array([positions[v].latitude_deg for v in idle])[:, None],
+            np.array([positions[v].longitude_deg for v in idle])[:, None],
+            target_lat[None, :], target_lon[None, :])
+        for row, vehicle in enumerate(idle):
+            budget = vehicle.drone.flight_budget_m()
+            if budget is not None and vehicle.home is not None:
+                inbound = geo.haversine_m(target_lat, target_lon, vehicle.home.latitude_deg, vehicle.home.longitude_deg)
+                outbound[row, outbound[row] + inbound > budget] = np.inf
+
+        assignments = []
+        while np.isfinite(outbound).any():
+            row, column = np.unravel_index(np.argmin(outbound), outbound.shape)
+            assignments.append((idle[row], self.targets[column]))
+            outbound[row, :] = np.inf
+            outbound[:, column] = np.inf
+        return assignments
+
+    async def _deliver(self, vehicle, target):
+        logger.info("Dispatching %s to Lat: %s, Lon: %s", vehicle.name, target.latitude_deg, target.longitude_deg)
+        try:
+            if await vehicle.drone.deliver_to_async(target.coordinates()):
+                self.delivered += 1
+            else:
+                self.failed += 1
+                logger.warning("%s could not deliver to Lat: %s, Lon: %s", vehicle.name, target.latitude_deg, target.longitude_deg)
+        finally:
+            vehicle.busy = False
+            self.wakeup.set()
+
+    def close(self):
+        for vehicle in self.vehicles:
+            if vehicle.drone.telemetry is not None:
+                vehicle.drone.telemetry.stop()
+        if self.detector is not None:
+            self.detector.close()
+        close_links()
@@ -0,0 +1,128 @@
+"""
+Geodesy helpers. Every function takes scalars or NumPy arrays (degrees and metres)
+and broadcasts, so the same code handles one position or a whole set of waypoints.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8  # mean Earth radius, used for great-circle distances
+
+# WGS84 ellipsoid, used for the ECEF/ENU conversions
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_EP2 = WGS84_E2 / (1 - WGS84_E2)
+
+
+def _radians(*values):
+    return [np.radians(np.asarray(value, dtype=np.float64)) for value in values]
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres between (lat1, lon1) and (lat2, lon2)."""
+    lat1, lon1, lat2, lon2 = _radians(lat1, lon1, lat2, lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distance_3d_m(lat1, lon1, alt1, lat2, lon2, alt2):
+    """Great-circle distance combined with the altitude difference."""
+    return np.hypot(haversine_m(lat1, lon1, lat2, lon2), np.asarray(alt2, dtype=np.float64) - alt1)
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial bearing from (lat1, lon1) to (lat2, lon2), in degrees clockwise from north [0, 360)."""
+    lat1, lon1, lat2, lon2 = _radians(lat1, lon1, lat2, lon2)
+    dlon = lon2 - lon1
+    y = np.sin(dlon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+
+def geodetic_to_ecef(lat, lon, alt):
+    """WGS84 geodetic -> Earth-centred Earth-fixed coordinates. Returns an array of shape (..., 3)."""
+    lat, lon = _radians(lat, lon)
+    alt = np.asarray(alt, dtype=np.float64)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    x = (n + alt) * np.cos(lat) * np.cos(lon)
+    y = (n + alt) * np.cos(lat) * np.sin(lon)
+    z = (n * (1 - WGS84_E2) + alt) * sin_lat
+    return np.stack(np.broadcast_arrays(x, y, z), axis=-1)
+
+
+def ecef_to_geodetic(ecef):
+    """ECEF coordinates of shape (..., 3) -> (lat, lon, alt), using Bowring's closed-form approximation."""
+    ecef = np.asarray(ecef, dtype=np.float64)
+    x, y, z = ecef[..., 0], ecef[..., 1], ecef[..., 2]
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * WGS84_A, p * WGS84_B)
+    lat = np.arctan2(z + WGS84_EP2 * WGS84_B * np.sin(theta) ** 3,
+                     p - WGS84_E2 * WGS84_A * np.cos(theta) ** 3)
+    lon = np.arctan2(y, x)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    # Height from whichever of p and z is better conditioned at this latitude
+    alt = np.where(np.abs(np.cos(lat)) > 1e-6,
+                   p / np.cos(lat) - n,
+                   np.abs(z) - WGS84_B)
+    return np.degrees(lat), np.degrees(lon), alt
+
+
+def _enu_rotation(ref_lat, ref_lon):
+    """Rows are the east, north and up unit vectors at the reference point, in ECEF."""
+    lat, lon = _radians(ref_lat, ref_lon)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+    return np.array([
+        [-sin_lon, cos_lon, 0.0],
+        [-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat],
+        [cos_lat * cos_lon, cos_lat * sin_lon, sin_lat],
+    ])
+
+
+def geodetic_to_enu(lat, lon, alt, ref_lat, ref_lon, ref_alt):
+    """
+    Geodetic points -> local east/north/up metres relative to a single reference point.
+    Returns an array of shape (..., 3).
+    """
+    offset = geodetic_to_ecef(lat, lon, alt) - geodetic_to_ecef(ref_lat, ref_lon, ref_alt)
+    return offset @ _enu_rotation(ref_lat, ref_lon).T
+
+
+def enu_to_geodetic(enu, ref_lat, ref_lon, ref_alt):
+    """Local east/north/up metres of shape (..., 3) relative to a reference point -> (lat, lon, alt)."""
+    ecef = np.asarray(enu, dtype=np.float64) @ _enu_rotation(ref_lat, ref_lon) + geodetic_to_ecef(ref_lat, ref_lon, ref_alt)
+    return ecef_to_geodetic(ecef)
+
+
+class ArrivalDetector:
+    """
+    Decides when a vehicle has reached its target from a stream of position samples.
+
+    A sample inside `tolerance_m` is an arrival. So is a sample whose closing speed will
+    carry the vehicle inside the tolerance before the next sample is due, which declares
+    arrival on the first qualifying update rather than one update late. The sample
+    interval is measured from the timestamps passed to `update()`.
+    """
+
+    def __init__(self, tolerance_m, max_lookahead_s=0.5):
+        self.tolerance_m = tolerance_m
+        self.max_lookahead_s = max_lookahead_s
+        self._last_timestamp = None
+        self._interval_s = None
+
+    def update(self, distance_m, closing_speed_m_s, timestamp):
+        """Feeds one sample (closing speed is positive when approaching). Returns True once arrived."""
+        if self._last_timestamp is not None and timestamp > self._last_timestamp:
+            interval = timestamp - self._last_timestamp
+            self._interval_s = interval if self._interval_s is None else 0.8 * self._interval_s + 0.2 * interval
+        self._last_timestamp = timestamp
+
+        if distance_m <= self.tolerance_m:
+            return True
+        if self._interval_s is None or closing_speed_m_s <= 0:
+            return False
+        lookahead_s = min(self._interval_s, self.max_lookahead_s)
+        return distance_m - closing_speed_m_s * lookahead_s <= self.tolerance_m
@@ -0,0 +1,132 @@
+"""
+Person geolocation from camera geometry.
+
+A pixel is turned into a ray through a pinhole camera model, the ray is rotated into the
+local north/east/down frame using the camera's attitude at capture time, and it is
+intersected with flat ground at the vehicle's relative altitude. Everything is
+vectorized over the persons in a frame, so one scout position tags everyone in view.
+"""
+
+import math
+
+import numpy as np
+from pymavlink import mavutil
+
+from src import config, geo
+from src.offset import get_person_center_x, get_person_center_y
+
+# Camera axes (x right, y down the image, z along the optical axis) expressed in the
+# frame of a level, forward-looking camera (x forward, y right, z down)
+CAMERA_AXES = np.array([
+    [0.0, 0.0, 1.0],
+    [1.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0],
+])
+
+# Rays that come within this angle of the horizon (or point above it) never reach the ground
+MIN_DEPRESSION_RAD = math.radians(2.0)
+
+GIMBAL_YAW_IN_EARTH_FRAME = (mavutil.mavlink.GIMBAL_DEVICE_FLAGS_YAW_LOCK |
+                             mavutil.mavlink.GIMBAL_DEVICE_FLAGS_YAW_IN_EARTH_FRAME)
+
+
+def camera_matrix(width=config.FRAME_WIDTH, height=config.FRAME_HEIGHT,
+                  horizontal_fov_deg=config.CAMERA_HORIZONTAL_FOV_DEG):
+    """Pinhole intrinsics for square pixels and a centred principal point."""
+    focal_px = (width / 2) / math.tan(math.radians(horizontal_fov_deg) / 2)
+    return np.array([
+        [focal_px, 0.0, width / 2],
+        [0.0, focal_px, height / 2],
+        [0.0, 0.0, 1.0],
+    ])
+
+
+def euler_rotation(roll, pitch, yaw):
+    """Rotation from a body frame to north/east/down for MAVLink Euler angles (radians, ZYX order)."""
+    cr, sr = math.cos(roll), math.sin(roll)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    return np.array([
+        [cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+        [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+        [-sp, cp * sr, cp * cr],
+    ])
+
+
+def quaternion_to_euler(w, x, y, z):
+    """(roll, pitch, yaw) in radians for a unit quaternion."""
+    roll = math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = math.asin(max(-1.0, min(1.0, 2 * (w * y - z * x))))
+    yaw = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return roll, pitch, yaw
+
+
+def ground_offsets(u, v, camera_to_ned, height_m, intrinsics=None):
+    """
+    North and east offsets in metres, from the camera to where pixels (u, v) meet flat
+    ground `height_m` below it. `camera_to_ned` is the rotation of a level,
+    forward-looking camera frame into north/east/down. Pixels whose ray does not reach
+    the ground come back as NaN.
+    """
+    intrinsics = camera_matrix() if intrinsics is None else intrinsics
+    u, v = np.broadcast_arrays(np.asarray(u, dtype=np.float64), np.asarray(v, dtype=np.float64))
+    pixels = np.stack([u, v, np.ones_like(u)], axis=-1)
+    rays = pixels @ np.linalg.inv(intrinsics).T @ (camera_to_ned @ CAMERA_AXES).T
+    down = rays[..., 2]
+    hits = down > np.linalg.norm(rays, axis=-1) * math.sin(MIN_DEPRESSION_RAD)
+    scale = np.where(hits, height_m / np.where(hits, down, 1.0), np.nan)
+    return rays[..., 0] * scale, rays[..., 1] * scale
+
+
+class Geolocator:
+    """
+    Locates the persons in a frame on the ground, from the vehicle's telemetry at the
+    moment the frame was captured.
+
+    With a fixed camera the vehicle's attitude is combined with the mount pitch. With a
+    stabilized gimbal the gimbal's own GIMBAL_DEVICE_ATTITUDE_STATUS is used when the
+    vehicle receives it, otherwise the camera is assumed to hold the mount pitch and
+    follow the vehicle's heading.
+    """
+
+    def __init__(self, telemetry, intrinsics=None, mount_pitch_deg=config.CAMERA_MOUNT_PITCH_DEG,
+                 stabilized=config.CAMERA_GIMBAL_STABILIZED, tolerance_s=config.GEOLOCATION_TELEMETRY_TOLERANCE_S):
+        self.telemetry = telemetry
+        self.intrinsics = camera_matrix() if intrinsics is None else intrinsics
+        self.mount = euler_rotation(0.0, math.radians(mount_pitch_deg), 0.0)
+        self.stabilized = stabilized
+        self.tolerance_s = tolerance_s
+
+    def camera_orientation(self, capture_time):
+        """Rotation of the camera into north/east/down at `capture_time`, or None without attitude data."""
+        attitude = self.telemetry.at('ATTITUDE', capture_time, self.tolerance_s)
+        if attitude is None:
+            return None
+        if not self.stabilized:
+            return euler_rotation(attitude.roll, attitude.pitch, attitude.yaw) @ self.mount
+        gimbal = self.telemetry.at('GIMBAL_DEVICE_ATTITUDE_STATUS', capture_time, self.tolerance_s)
+        if gimbal is None:
+            return euler_rotation(0.0, 0.0, attitude.yaw) @ self.mount
+        roll, pitch, yaw = quaternion_to_euler(*gimbal.q)
+        if not gimbal.flags & GIMBAL_YAW_IN_EARTH_FRAME:
+            yaw += attitude.yaw
+        return euler_rotation(roll, pitch, yaw)
+
+    def locate(self, persons, capture_time):
+        """
+        Ground position of every person in `persons` (a PERSON_DTYPE array) in the frame
+        captured at `capture_time`. Returns (lat, lon, absolute_alt) arrays with NaN for
+        persons that could not be located, or None if the telemetry for that moment is
+        missing.
+        """
+        position = self.telemetry.at('GLOBAL_POSITION_INT', capture_time, self.tolerance_s)
+        orientation = self.camera_orientation(capture_time)
+        if position is None or orientation is None:
+            return None
+        height_m = position.relative_alt / 1000.0
+        if height_m < config.CENTERING_MIN_ALTITUDE_M:
+            return None
+        north, east = ground_offsets(get_person_center_x(persons), get_person_center_y(persons),
+                                     orientation, height_m, self.intrinsics)
+        enu = np.stack([east, north, np.full_like(east, -height_m)], axis=-1)
+        return geo.enu_to_geodetic(enu, position.lat / 1e7, position.lon / 1e7, position.alt / 1000.0)
@@ -0,0 +1,244 @@
+"""
+Low-overhead instrumentation for the flight loops.
+
+Spans and histograms record into fixed-size ring buffers and counters are plain
+integers, so the hot path only pays for a `perf_counter()` pair and a lock. Percentiles
+are computed when a snapshot is taken, by the exporter thread, never by the loops.
+
+A histogram's unit is declared when it is first created: spans are in seconds, and
+anything else recorded in seconds must say so, e.g. `METRICS.histogram(name, "seconds")`.
+"""
+
+import contextlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+class RollingHistogram:
+    """Keeps the most recent `window` samples of a value, measured in `unit` (None for a plain count)."""
+
+    def __init__(self, window=config.METRICS_WINDOW, unit=None):
+        self.unit = unit
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._lock = threading.Lock()
+        self._next = 0
+        self.count = 0
+
+    def record(self, value):
+        with self._lock:
+            self._samples[self._next] = value
+            self._next = (self._next + 1) % len(self._samples)
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = self._samples[:min(self.count, len(self._samples))].copy()
+            count = self.count
+        summary = {"count": count}
+        if self.unit:
+            summary["unit"] = self.unit
+        if len(samples):
+            values = np.percentile(samples, PERCENTILES)
+            summary.update({f"p{p}": float(v) for p, v in zip(PERCENTILES, values)})
+            summary["max"] = float(samples.max())
+        return summary
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def histogram(self, name, unit=None) -> RollingHistogram:
+        """The `name` histogram, created with `unit` on first use."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, RollingHistogram(unit=unit))
+        return histogram
+
+    def counter(self, name) -> Counter:
+        counter = self.counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self.counters.setdefault(name, Counter())
+        return counter
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Records how long the `with` block takes into the `name` histogram."""
+        histogram = self.histogram(name, "seconds")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.record(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+        return {
+            "timestamp": time.time(),
+            "histograms": {name: h.snapshot() for name, h in sorted(histograms.items())},
+            "counters": {name: c.value for name, c in sorted(counters.items())},
+        }
+
+
+METRICS = MetricsRegistry()
+
+
+def prometheus_text(snapshot):
+    """
+    Renders a snapshot in the Prometheus text exposition format (histograms as summaries).
+    A histogram's unit, if it has one, becomes the metric name's suffix.
+    """
+    lines = []
+    for name, summary in snapshot["histograms"].items():
+        metric = "drone_" + name.replace(".", "_")
+        if "unit" in summary:
+            metric += "_" + summary["unit"]
+        lines.append(f"# TYPE {metric} summary")
+        for p in PERCENTILES:
+            if f"p{p}" in summary:
+                lines.append(f'{metric}{{quantile="{p / 100}"}} {summary[f"p{p}"]:.9f}')
+        lines.append(f"{metric}_count {summary['count']}")
+    for name, value in snapshot["counters"].items():
+        metric = "drone_" + name.replace(".", "_") + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter(threading.Thread):
+    """
+    Publishes registry snapshots every `interval_s`: appended as JSON lines to `path`,
+    or served at http://`host`:`port`/metrics for Prometheus to scrape.
+    """
+
+    def __init__(self, registry=METRICS, mode=config.METRICS_EXPORT, path=config.METRICS_FILE,
+                 host=config.METRICS_HTTP_HOST, port=config.METRICS_HTTP_PORT,
+                 interval_s=config.METRICS_EXPORT_INTERVAL_S):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.registry = registry
+        self.mode = mode
+        self.path = path
+        self.interval_s = interval_s
+        self.stop_event = threading.Event()
+        self.server = None
+        if mode == "prometheus":
+            self.server = ThreadingHTTPServer((host, port), self._handler())
+            self.server.daemon_threads = True
+
+    def _handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = prometheus_text(registry.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def run(self):
+        if self.server is not None:
+            logger.info("Serving metrics on http://%s:%d/metrics", *self.server.server_address[:2])
+            self.server.serve_forever(poll_interval=0.5)
+            return
+        while not self.stop_event.wait(self.interval_s):
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(self.registry.snapshot()) + "\n")
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        elif self.is_alive():
+            self.write_snapshot()
+        self.join(timeout=2.0)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter():
+    """Starts the process-wide exporter configured by `config.METRICS_EXPORT`, if any."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None and config.METRICS_EXPORT:
+            try:
+                _exporter = MetricsExporter()
+                _exporter.start()
+            except OSError as e:
+                logger.warning("Could not start the metrics exporter: %s", e)
+        return _exporter
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any `extra=` fields passed to the logger."""
+
+    _standard_fields = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in self._standard_fields})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    """Sets up the root logger from `config.LOG_LEVEL` / `config.LOG_FORMAT` ("text" or "json")."""
+    handler = logging.StreamHandler()
+    if (fmt or config.LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level or config.LOG_LEVEL)
@@ -1,10 +1,18 @@
 import math
+from collections import deque
+
+import numpy as np
+
 from src import config
-from src.drone_controller import VelocityCommand
+from src.shared import VelocityCommand
 
 
 
 class PersonBoundingBox:
+    """A single detection. Fields can be read by name like an element of a person array."""
+
+    __slots__ = ("x_min", "y_min", "x_max", "y_max", "confidence")
+
     def __init__(self, x_min, y_min, x_max, y_max, confidence):
         self.x_min = x_min
         self.y_min = y_min
@@ -12,49 +20,229 @@ class PersonBoundingBox:
         self.y_max = y_max
         self.confidence = confidence
 
+    def __getitem__(self, name):
+        return getattr(self, name)
+
 class Offset:
+    """Pixel offset from the frame centre: scalars for one person, arrays for a whole frame."""
+
+    __slots__ = ("x", "y", "is_centered")
+
     def __init__(self, x, y, is_centered):
         self.x = x
         self.y = y
         self.is_centered = is_centered
 
+    def select(self, index):
+        """The offset of the person at `index` of a whole-frame Offset."""
+        return Offset(self.x[index], self.y[index], self.is_centered[index])
+
+
+# Per-person score for each selection policy; the highest score is the target
+TARGET_POLICIES = {
+    "largest": lambda persons, offset: (persons["x_max"] - persons["x_min"]) * (persons["y_max"] - persons["y_min"]),
+    "most_central": lambda persons, offset: -np.hypot(offset.x, offset.y),
+    "highest_confidence": lambda persons, offset: persons["confidence"],
+}
+
 
+def get_person_center_x(persons):
+    return (persons["x_min"] + persons["x_max"]) / 2
 
+def get_person_center_y(persons):
+    return (persons["y_min"] + persons["y_max"]) / 2
 
-def get_person_center_x(person: PersonBoundingBox):
-    return (person.x_min + person.x_max) / 2
+# Frames with at most this many persons are computed in plain Python floats: numpy's
+# per-call overhead costs more than vectorizing saves for one or two persons
+SCALAR_PATH_MAX_PERSONS = 2
 
-def get_person_center_y(person: PersonBoundingBox):
-    return (person.y_min + person.y.max) / 2
 
-def calculate_offset(person: PersonBoundingBox):
-    frame_center_x = config.FRAME_WIDTH / 2
-    frame_center_y = config.FRAME_HEIGHT / 2
-    
-    person_center_x = get_person_center_x(person)
-    person_center_y = get_person_center_y(person)
-    
-    offset_x = person_center_x - frame_center_x
-    offset_y = person_center_y - frame_center_y
-    
-    is_centered = (abs(offset_x) <= config.CENTERING_THRESHOLD_X and 
-                   abs(offset_y) <= config.CENTERING_THRESHOLD_Y)
-    
+def _scalar_offset(x_min, y_min, x_max, y_max):
+    offset_x = (x_min + x_max) / 2 - config.FRAME_WIDTH / 2
+    offset_y = (y_min + y_max) / 2 - config.FRAME_HEIGHT / 2
+    return offset_x, offset_y, abs(offset_x) <= config.CENTERING_THRESHOLD_X and abs(offset_y) <= config.CENTERING_THRESHOLD_Y
+
+def _scalar_velocity(offset_x, offset_y, is_centered):
+    if is_centered:
+        return 0.0, 0.0
+    east_m_s = max(-config.MAX_VELOCITY, min(config.MAX_VELOCITY, offset_x * config.VELOCITY_SCALING_FACTOR))
+    north_m_s = max(-config.MAX_VELOCITY, min(config.MAX_VELOCITY, -offset_y * config.VELOCITY_SCALING_FACTOR))
+    return north_m_s, east_m_s
+
+def calculate_offset(persons):
+    """
+    Offset of each person's centre from the frame centre. `persons` is a person array (see
+    src.shared.PERSON_DTYPE), giving one array element per person, or a single element
+    or PersonBoundingBox, giving scalars.
+    """
+    if isinstance(persons, PersonBoundingBox):
+        return Offset(*_scalar_offset(persons.x_min, persons.y_min, persons.x_max, persons.y_max))
+    if not isinstance(persons, np.ndarray):
+        return Offset(*_scalar_offset(*persons.tolist()[:4]))
+    if len(persons) <= SCALAR_PATH_MAX_PERSONS:
+        rows = [_scalar_offset(*person[:4]) for person in persons.tolist()]
+        offset_x, offset_y, is_centered = zip(*rows) if rows else ((), (), ())
+        return Offset(np.array(offset_x), np.array(offset_y), np.array(is_centered, dtype=bool))
+
+    offset_x = get_person_center_x(persons) - config.FRAME_WIDTH / 2
+    offset_y = get_person_center_y(persons) - config.FRAME_HEIGHT / 2
+
+    is_centered = ((np.abs(offset_x) <= config.CENTERING_THRESHOLD_X) &
+                   (np.abs(offset_y) <= config.CENTERING_THRESHOLD_Y))
+
     return Offset(offset_x, offset_y, is_centered)
 
 def calculate_velocity_command(offset: Offset):
-    if offset.is_centered:
-        return VelocityCommand(0.0, 0.0, 0.0)
-    
-    east_m_s = max(-config.MAX_VELOCITY, 
-                   min(config.MAX_VELOCITY, 
-                       offset.x * config.VELOCITY_SCALING_FACTOR))
-    
-    north_m_s = max(-config.MAX_VELOCITY, 
-                    min(config.MAX_VELOCITY, 
-                        -offset.y * config.VELOCITY_SCALING_FACTOR))
-    
-    return VelocityCommand(north_m_s, east_m_s, 0.0)
+    """Proportional velocity command towards each person in `offset`; zero for anyone already centered."""
+    if not isinstance(offset.x, np.ndarray):
+        return VelocityCommand(*_scalar_velocity(offset.x, offset.y, offset.is_centered), 0.0)
+    if len(offset.x) <= SCALAR_PATH_MAX_PERSONS:
+        rows = [_scalar_velocity(*row) for row in zip(offset.x.tolist(), offset.y.tolist(), offset.is_centered.tolist())]
+        north_m_s, east_m_s = zip(*rows) if rows else ((), ())
+        return VelocityCommand(np.array(north_m_s), np.array(east_m_s), np.zeros(len(rows)))
+
+    # np.minimum/np.maximum rather than np.clip, which has several times their per-call overhead
+    east_m_s = np.minimum(np.maximum(offset.x * config.VELOCITY_SCALING_FACTOR, -config.MAX_VELOCITY), config.MAX_VELOCITY)
+    north_m_s = np.minimum(np.maximum(-offset.y * config.VELOCITY_SCALING_FACTOR, -config.MAX_VELOCITY), config.MAX_VELOCITY)
+
+    north_m_s = np.where(offset.is_centered, 0.0, north_m_s)
+    east_m_s = np.where(offset.is_centered, 0.0, east_m_s)
+    return VelocityCommand(north_m_s, east_m_s, np.zeros_like(north_m_s))
+
+def select_target(persons, offset: Offset = None, policy=config.TARGET_SELECTION_POLICY, track_id=None):
+    """
+    Index into `persons` of the person to center on, or None if the frame has none.
+
+    `policy` is one of TARGET_POLICIES, or "tracked": keep following `track_id` while the
+    tracker still sees it, otherwise pick the largest person. `offset` is the frame's
+    calculate_offset() result, if already computed.
+    """
+    if not len(persons):
+        return None
+    if policy == "tracked":
+        if track_id is not None:
+            matches = np.flatnonzero(persons["track_id"] == track_id)
+            if matches.size:
+                return int(matches[0])
+        policy = "largest"
+    if policy not in TARGET_POLICIES:
+        raise ValueError(f"Unknown target selection policy '{policy}'. "
+                         f"Expected one of: tracked, {', '.join(TARGET_POLICIES)}")
+    if offset is None and policy == "most_central":
+        offset = calculate_offset(persons)
+    return int(np.argmax(TARGET_POLICIES[policy](persons, offset)))
+
+
+def ground_metres_per_pixel(altitude_m):
+    """Ground distance covered by one pixel of the downward camera at `altitude_m`."""
+    half_fov = math.radians(config.CAMERA_HORIZONTAL_FOV_DEG) / 2
+    return 2 * max(altitude_m, config.CENTERING_MIN_ALTITUDE_M) * math.tan(half_fov) / config.FRAME_WIDTH
+
+
+class PIDController:
+    """
+    Single-axis PID with a clamped output. The integral only accumulates within
+    `integral_zone` of the setpoint and while the output is unsaturated (or the error is
+    pulling it back out of saturation), so it cannot wind up during a long approach.
+    """
+
+    def __init__(self, kp, ki, kd, output_limit, integral_zone=config.CENTERING_INTEGRAL_ZONE_M,
+                 derivative_filter_s=config.CENTERING_DERIVATIVE_FILTER_S):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.integral_zone = integral_zone
+        self.derivative_filter_s = derivative_filter_s
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.previous_error = None
+
+    def update(self, error, dt):
+        if self.previous_error is not None and dt > 0:
+            # First-order low-pass on the derivative: new detections make the error step
+            alpha = dt / (self.derivative_filter_s + dt)
+            self.derivative += alpha * ((error - self.previous_error) / dt - self.derivative)
+        self.previous_error = error
+
+        integral = self.integral + error * dt if abs(error) <= self.integral_zone else self.integral
+        output = self.kp * error + self.ki * integral + self.kd * self.derivative
+        if abs(output) <= self.output_limit or error * output < 0:
+            self.integral = integral
+        else:
+            output = self.kp * error + self.ki * self.integral + self.kd * self.derivative
+        return max(-self.output_limit, min(self.output_limit, output))
+
+
+class CenteringController:
+    """
+    Centering control at a fixed rate, decoupled from the detection rate.
+
+    `observe()` is called for every detection with the capture time of its frame and
+    `update()` on every control tick with the drone's current velocity. The drone's
+    position is dead-reckoned from those velocities, so each detection fixes the person's
+    position on the ground and every tick steers towards where the person is now relative
+    to the drone, not where they were when the frame was captured.
+    """
+
+    def __init__(self, kp=config.CENTERING_KP, ki=config.CENTERING_KI, kd=config.CENTERING_KD,
+                 max_velocity=config.MAX_VELOCITY, max_measurement_age_s=config.CENTERING_MAX_MEASUREMENT_AGE_S,
+                 history_s=2.0):
+        self.north = PIDController(kp, ki, kd, max_velocity)
+        self.east = PIDController(kp, ki, kd, max_velocity)
+        self.max_measurement_age_s = max_measurement_age_s
+        self.history_s = history_s
+        # (time, north, east) of the dead-reckoned drone position since the controller started
+        self.track = deque()
+        self.person = None  # (north, east) in the same frame as the track
+        self.tolerance = None  # (north, east) in metres
+        self.capture_time = None
+        self.last_update = None
+
+    def _drone_position(self, timestamp):
+        if not self.track:
+            return 0.0, 0.0
+        times, north, east = np.array(self.track).T
+        return float(np.interp(timestamp, times, north)), float(np.interp(timestamp, times, east))
+
+    def observe(self, offset: Offset, capture_time, altitude_m):
+        """Takes a person offset measured in the frame captured at `capture_time` (time.monotonic())."""
+        scale = ground_metres_per_pixel(altitude_m)
+        drone_north, drone_east = self._drone_position(capture_time)
+        # Image up is north and image right is east
+        self.person = (drone_north - offset.y * scale, drone_east + offset.x * scale)
+        self.tolerance = (config.CENTERING_THRESHOLD_Y * scale, config.CENTERING_THRESHOLD_X * scale)
+        self.capture_time = capture_time
+
+    def predicted_offset(self, now):
+        """The person's position relative to the drone at `now`, in metres north and east."""
+        drone_north, drone_east = self._drone_position(now)
+        return self.person[0] - drone_north, self.person[1] - drone_east
+
+    def update(self, now, north_m_s, east_m_s):
+        """
+        Advances the controller to `now` given the drone's velocity. Returns the velocity
+        command and whether the person is predicted to be centered. Without a detection
+        younger than `max_measurement_age_s` the command is a hover.
+        """
+        dt = 0.0 if self.last_update is None else now - self.last_update
+        self.last_update = now
+        north, east = self.track[-1][1:] if self.track else (0.0, 0.0)
+        self.track.append((now, north + north_m_s * dt, east + east_m_s * dt))
+        while self.track[0][0] < now - self.history_s:
+            self.track.popleft()
+
+        if self.person is None or now - self.capture_time > self.max_measurement_age_s:
+            self.north.reset()
+            self.east.reset()
+            return VelocityCommand(0.0, 0.0, 0.0), False
+
+        north_error, east_error = self.predicted_offset(now)
+        is_centered = abs(north_error) <= self.tolerance[0] and abs(east_error) <= self.tolerance[1]
+        return VelocityCommand(self.north.update(north_error, dt), self.east.update(east_error, dt), 0.0), is_centered
 
 
 if __name__ == '__main__':
@@ -66,7 +254,7 @@ if __name__ == '__main__':
     config.MAX_VELOCITY = 2.0
     config.VELOCITY_SCALING_FACTOR = 0.01
 
-    mock_person = PersonBoundingBox(300, 200, 340, 280, 0.9)
+    mock_person = PersonBoundingBox(360, 200, 400, 280, 0.9)
 
     offset = calculate_offset(mock_person)
     print(f"Offset: x={offset.x}, y={offset.y}, centered={offset.is_centered}")
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import threading
+import time
+
+import cv2
+
+from src import config
+from src.capture import open_capture
+from src.detection import annotate_frame, get_detector, scan_for_person
+from src.metrics import METRICS
+from src.scheduler import InferenceScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class CapturedFrame:
+    def __init__(self, frame_id, capture_time, image):
+        self.frame_id = frame_id
+        self.capture_time = capture_time  # time.monotonic() right after the grab
+        self.image = image
+
+
+class DetectionResult:
+    def __init__(self, frame_id, capture_time, persons, annotated_frame):
+        self.frame_id = frame_id
+        self.capture_time = capture_time
+        self.persons = persons
+        self.annotated_frame = annotated_frame
+
+    @property
+    def age_s(self):
+        return time.monotonic() - self.capture_time
+
+
+class LatestSlot:
+    """
+    Single-slot buffer with drop-oldest semantics: `put()` never blocks and overwrites
+    anything the reader has not taken yet, so the reader always gets the newest item.
+    """
+
+    def __init__(self, drop_counter=None):
+        self._condition = threading.Condition()
+        self._item = None
+        self._version = 0
+        self._taken_version = 0
+        self.dropped = 0
+        self.drop_counter = drop_counter
+
+    def put(self, item):
+        with self._condition:
+            if self._version > self._taken_version:
+                self.dropped += 1
+                if self.drop_counter is not None:
+                    self.drop_counter.inc()
+            self._item = item
+            self._version += 1
+            self._condition.notify_all()
+
+    def get_newer(self, version, timeout=None, stop_event=None):
+        """
+        Waits for an item newer than `version`. Returns (version, item), or (version, None)
+        on timeout or, once woken, if `stop_event` is set.
+        """
+        stopped = stop_event.is_set if stop_event is not None else lambda: False
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._version > version or stopped(), timeout):
+                return version, None
+            if self._version <= version:
+                return version, None
+            self._taken_version = self._version
+            return self._version, self._item
+
+    def peek(self, timeout=None):
+        """Waits until the slot holds an item and returns it without taking it, or None on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._version > 0, timeout):
+                return None
+            return self._item
+
+    def wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
+class FrameGrabber(threading.Thread):
+    """Reads the camera as fast as it delivers frames so OpenCV's internal buffer never backs up."""
+
+    def __init__(self, capture, frames: LatestSlot, stop_event: threading.Event):
+        super().__init__(name="frame-grabber", daemon=True)
+        self.capture = capture
+        self.frames = frames
+        self.stop_event = stop_event
+        self.frame_count = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with METRICS.span("capture.read"):
+                success, image = self.capture.read()
+            if not success:
+                logger.warning("Failed to grab frame from video stream. Stopping capture.")
+                break
+            self.frame_count += 1
+            self.frames.put(CapturedFrame(self.frame_count, time.monotonic(), image))
+        self.stop_event.set()
+        self.frames.wake()
+
+
+class DetectionWorker(threading.Thread):
+    """
+    Hands the newest captured frame to the inference scheduler, skipping any frames that
+    arrived in the meantime. The scheduler decides how much detection each frame gets and
+    keeps person track IDs stable across frames. Each processed frame and its persons are
+    passed on to `recorder`, if there is one.
+    """
+
+    def __init__(self, frames: LatestSlot, results: LatestSlot, stop_event: threading.Event,
+                 scheduler: InferenceScheduler, recorder=None):
+        super().__init__(name="detection-worker", daemon=True)
+        self.frames = frames
+        self.results = results
+        self.stop_event = stop_event
+        self.scheduler = scheduler
+        self.recorder = recorder
+
+    def run(self):
+        version = 0
+        try:
+            while not self.stop_event.is_set():
+                version, frame = self.frames.get_newer(version, timeout=0.5)
+                if frame is None:
+                    continue
+                persons = self.scheduler.process(frame.image)
+                if self.recorder is not None:
+                    self.recorder.record_frame(frame.frame_id, frame.capture_time, frame.image)
+                    self.recorder.record_detections(frame.frame_id, frame.capture_time, persons)
+                annotated_frame = annotate_frame(frame.image, persons) if config.ENABLE_VIDEO_DISPLAY else None
+                self.results.put(DetectionResult(frame.frame_id, frame.capture_time, persons, annotated_frame))
+        except Exception:
+            logger.exception("Detection failed. Stopping the pipeline.")
+        finally:
+            # Stops capture too, and lets consumers waiting on results see that the pipeline is down
+            self.stop_event.set()
+            self.frames.wake()
+            self.results.wake()
+
+
+class CameraPipeline:
+    """
+    Capture -> detection pipeline with latest-frame semantics.
+
+    Capture and inference each run on their own thread; the consumer calls
+    `get_latest()` and always receives the most recent detection result together
+    with the capture time of the frame it was computed from.
+
+    `detect` has the signature of `scan_for_person`, which it defaults to; a fleet passes
+    its shared DetectorPool's instead. `altitude` returns the vehicle's height above
+    ground in metres (or None), which the inference scheduler uses to size detections.
+    A MissionRecorder given as `recorder` records for as long as the pipeline runs.
+    `fixed_imgsz` is the one inference size a custom `detect` runs at, if it cannot
+    change it; for `scan_for_person` it is taken from the process's detector.
+    """
+
+    def __init__(self, source=config.CAMERA_SOURCE, detect=scan_for_person, altitude=None, recorder=None,
+                 fixed_imgsz=None):
+        self.source = source
+        self.detect = detect
+        self.fixed_imgsz = fixed_imgsz
+        self.altitude = altitude
+        self.recorder = recorder
+        self.capture = None
+        self.frames = LatestSlot(METRICS.counter("pipeline.frames_dropped"))
+        self.results = LatestSlot(METRICS.counter("pipeline.results_dropped"))
+        self.stop_event = threading.Event()
+        self.threads = []
+        self._result_version = 0
+
+    def start(self):
+        """Opens the source and starts capture and detection. Starting a running pipeline is a no-op."""
+        if self.threads:
+            return self.is_running
+        self.capture = open_capture(self.source)
+        if not self.capture.isOpened():
+            return False
+        # Keep the driver-side queue as short as the backend allows
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.stop_event.clear()
+        if self.recorder is not None:
+            self.recorder.start()
+        fixed_imgsz = get_detector().fixed_imgsz if self.detect is scan_for_person else self.fixed_imgsz
+        self.threads = [
+            FrameGrabber(self.capture, self.frames, self.stop_event),
+            DetectionWorker(self.frames, self.results, self.stop_event,
+                            InferenceScheduler(self.detect, self.altitude, fixed_imgsz=fixed_imgsz), self.recorder),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return True
+
+    @property
+    def is_running(self):
+        return not self.stop_event.is_set()
+
+    @property
+    def dropped_frames(self):
+        return self.frames.dropped
+
+    def wait_for_frame(self, timeout=None):
+        """Waits for the first captured frame, without taking it from detection. Returns it, or None on timeout."""
+        return self.frames.peek(timeout)
+
+    def get_latest(self, timeout=config.PIPELINE_RESULT_TIMEOUT_S):
+        """Returns the newest DetectionResult not yet returned, or None if none arrived within `timeout`."""
+        self._result_version, result = self.results.get_newer(self._result_version, timeout, self.stop_event)
+        if result is not None:
+            METRICS.histogram("pipeline.result_age", "seconds").record(result.age_s)
+        return result
+
+    async def get_latest_async(self, timeout=config.PIPELINE_RESULT_TIMEOUT_S):
+        """Awaitable version of `get_latest()`; the wait happens on an executor thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_latest, timeout)
+
+    def stop(self):
+        self.stop_event.set()
+        self.frames.wake()
+        self.results.wake()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        self.threads = []
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+        if self.recorder is not None:
+            self.recorder.stop()
+
+
+def create_pipeline(source=config.CAMERA_SOURCE, detect=scan_for_person, altitude=None, recorder=None,
+                    mode=config.PIPELINE_MODE):
+    """
+    Builds the camera pipeline for `mode` ("threads" or "processes"). A custom `detect`
+    or a callable `source` cannot be sent to another process, so those always get the
+    threaded pipeline.
+    """
+    if mode == "processes":
+        if detect is scan_for_person and not callable(source):
+            from src.process_pipeline import ProcessCameraPipeline
+            return ProcessCameraPipeline(source, altitude=altitude, recorder=recorder)
+        logger.warning("A custom detector or capture factory cannot run in another process; "
+                       "using the threaded pipeline.")
+    elif mode != "threads":
+        raise ValueError(f"Unknown pipeline mode '{mode}'. Expected 'threads' or 'processes'.")
+    return CameraPipeline(source, detect, altitude, recorder)
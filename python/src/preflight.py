@@ -0,0 +1,192 @@
+"""
+Start-up for the single-vehicle entry points (scout.py, deliver.py).
+
+Connecting to the vehicle, loading and warming up the detector, and opening the camera
+do not depend on each other, so they run at the same time instead of one after the
+other. The vehicle is only armed once all three have succeeded. The heavy modules
+(pymavlink, OpenCV, the detection runtime) are imported inside the step that needs them,
+so the entry point itself starts at once and the imports overlap with the waiting. Every
+step is timed; the breakdown is logged and recorded as `startup.*` histograms.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+from src import config
+from src.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Start-up is timed from the first import of this module, which the entry points do first
+STARTED = time.monotonic()
+
+
+class WarmPipelineFactory:
+    """Hands out the pipeline opened during preflight once, then builds new ones as before."""
+
+    def __init__(self, pipeline, factory):
+        self.pipeline = pipeline
+        self.factory = factory
+
+    def __call__(self):
+        pipeline, self.pipeline = self.pipeline, None
+        return pipeline if pipeline is not None else self.factory()
+
+
+class Preflight:
+    """
+    Brings the vehicle, the detector and the camera up concurrently.
+
+    After a successful `run()`, `drone` is a connected DroneController, armed in GUIDED
+    mode. With `keep_camera` the camera pipeline stays open and the drone's first vision
+    task picks it up (the scout starts searching straight away); otherwise the camera is
+    only checked for a first frame and released again (delivery opens it per target).
+    """
+
+    def __init__(self, connection_url=config.CONNECTION_URL, camera_source=config.CAMERA_SOURCE, keep_camera=True,
+                 camera_timeout_s=config.PREFLIGHT_CAMERA_TIMEOUT_S):
+        self.connection_url = connection_url
+        self.camera_source = camera_source
+        self.keep_camera = keep_camera
+        self.camera_timeout_s = camera_timeout_s
+        self.drone = None
+        self.pipeline = None
+        self.recorder = None  # shared by the drone and the warm pipeline
+        self.timings = {}  # step -> (start offset from STARTED, duration), in seconds
+        self.ready_s = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _step(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            with self._lock:
+                self.timings[name] = (start - STARTED, duration)
+            METRICS.histogram(f"startup.{name}", "seconds").record(duration)
+
+    def run(self):
+        """Runs every step at once and waits for all of them. Returns True if they all succeeded."""
+        results = {}
+        steps = {"vehicle": self._vehicle, "detector": self._detector, "camera": self._camera}
+        threads = [threading.Thread(target=self._run_step, args=(name, step, results),
+                                    name=f"preflight-{name}", daemon=True)
+                   for name, step in steps.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ready = all(results.get(name, False) for name in steps)
+        if ready:
+            # Arm last, so a failed detector or camera never leaves the vehicle armed on the ground
+            self._run_step("vehicle.arm", self._arm, results)
+            ready = results["vehicle.arm"]
+        self.ready_s = time.monotonic() - STARTED
+        METRICS.histogram("startup.ready", "seconds").record(self.ready_s)
+        self.report()
+
+        if ready and self.pipeline is not None:
+            self.drone.pipeline_factory = WarmPipelineFactory(self.pipeline, self.drone.pipeline_factory)
+        elif self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+        return ready
+
+    def _run_step(self, name, step, results):
+        try:
+            with self._step(name):
+                results[name] = step()
+        except Exception as e:
+            logger.error("Preflight step '%s' failed: %s", name, e)
+            results[name] = False
+
+    def _vehicle(self):
+        with self._step("vehicle.import"):
+            from src.drone_controller import DroneController
+        self.drone = DroneController(self.connection_url, self.camera_source, self._mission_recorder())
+        with self._step("vehicle.heartbeat"):
+            if not self.drone.connect():
+                logger.error("Failed to connect to drone.")
+                return False
+        return True
+
+    def _arm(self):
+        if not self.drone.start_offboard_mode():
+            logger.error("Failed to set offboard mode.")
+            return False
+        return True
+
+    def _detector(self):
+        if config.PIPELINE_MODE == "processes":
+            return True  # The inference process loads its own detector when the pipeline starts
+        with self._step("detector.import"):
+            from src import detection
+            detector = detection.get_detector()
+        with self._step("detector.load"):
+            detector.ensure_loaded()
+        return True
+
+    def _camera(self):
+        with self._step("camera.import"):
+            from src.capture import open_capture
+            from src.pipeline import create_pipeline
+        if not self.keep_camera:
+            with self._step("camera.open"):
+                capture = open_capture(self.camera_source)
+            try:
+                with self._step("camera.first_frame"):
+                    success, image = capture.read() if capture.isOpened() else (False, None)
+            finally:
+                capture.release()
+            if not success:
+                logger.error("Could not read a frame from camera source %s.", self.camera_source)
+                return False
+            self._check_frame_size(image)
+            return True
+
+        pipeline = create_pipeline(self.camera_source, altitude=self._relative_altitude,
+                                   recorder=self._mission_recorder())
+        with self._step("camera.open"):
+            opened = pipeline.start()
+        if not opened:
+            logger.error("Could not open camera source %s.", self.camera_source)
+            return False
+        with self._step("camera.first_frame"):
+            frame = pipeline.wait_for_frame(self.camera_timeout_s)
+        if frame is None:
+            logger.error("No frame from camera source %s within %.1fs.", self.camera_source, self.camera_timeout_s)
+            pipeline.stop()
+            return False
+        self._check_frame_size(frame.image)
+        self.pipeline = pipeline
+        return True
+
+    def _mission_recorder(self):
+        # The vehicle and camera steps race, so whichever gets here first creates it
+        with self._lock:
+            if self.recorder is None:
+                from src.recorder import MissionRecorder
+                self.recorder = MissionRecorder()
+            return self.recorder
+
+    def _relative_altitude(self):
+        return self.drone.relative_altitude() if self.drone is not None else None
+
+    @staticmethod
+    def _check_frame_size(image):
+        height, width = image.shape[:2]
+        if (width, height) != (config.FRAME_WIDTH, config.FRAME_HEIGHT):
+            logger.warning("Camera delivers %dx%d frames but FRAME_WIDTH/FRAME_HEIGHT are %dx%d; "
+                           "centering and geolocation assume the configured size.",
+                           width, height, config.FRAME_WIDTH, config.FRAME_HEIGHT)
+
+    def report(self):
+        """Logs when each step started and how long it took, in start order."""
+        lines = [f"  {name:<20} +{offset:6.2f}s  {duration:6.2f}s"
+                 for name, (offset, duration) in sorted(self.timings.items(), key=lambda item: item[1][0])]
+        logger.info("Startup finished in %.2fs:\n%s", self.ready_s, "\n".join(lines))
@@ -0,0 +1,351 @@
+"""
+Multi-process camera pipeline.
+
+Capture and inference each get their own process, so neither competes for the GIL with
+MAVLink, base-station traffic and control in the main process. Frames travel through a
+FrameRing: preallocated frame buffers in shared memory that the capture process writes
+and the inference process reads in place, by slot index. Only the detections come back
+to the main process, as raw PERSON_DTYPE bytes over a pipe.
+"""
+
+import logging
+import math
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from src import config
+from src.metrics import METRICS
+from src.pipeline import CameraPipeline, CapturedFrame, DetectionResult
+from src.shared import PERSON_DTYPE
+
+logger = logging.getLogger(__name__)
+
+# Control words at the start of the ring's shared memory block
+SEQUENCE, LATEST, READING = 0, 1, 2
+# Readers: the inference process, and the main process when it needs a frame itself
+INFERENCE_READER, MAIN_READER = 0, 1
+READERS = 2
+CONTROL_WORDS = READING + READERS
+
+# Result message: frame id, capture time, inference seconds, frames skipped since the last
+# result, followed by the persons as PERSON_DTYPE bytes
+RESULT_HEADER = struct.Struct("<qddI")
+
+
+class FrameRing:
+    """
+    A fixed number of frame buffers in shared memory, with latest-frame semantics.
+
+    One writer claims a slot no reader holds, fills it and publishes it as the latest
+    frame. A reader pins the latest frame while it uses the buffer in place and releases
+    it afterwards, so the writer never overwrites a frame that is being read. Only the
+    slot bookkeeping happens under the lock; the pixels are never copied between processes.
+    """
+
+    def __init__(self, shm, shape, slots, condition, owner):
+        self.shm = shm
+        self.shape = shape
+        self.slots = slots
+        self.condition = condition
+        self.owner = owner
+        self.next_slot = 0
+
+        offset = 0
+        self.control = np.ndarray(CONTROL_WORDS, dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.control.nbytes
+        self.frame_ids = np.ndarray(slots, dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.frame_ids.nbytes
+        self.capture_times = np.ndarray(slots, dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.capture_times.nbytes
+        self._altitude = np.ndarray(1, dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self._altitude.nbytes
+        self.images = np.ndarray((slots, *shape), dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def _size(shape, slots):
+        return 8 * (CONTROL_WORDS + 2 * slots + 1) + slots * math.prod(shape)
+
+    @classmethod
+    def create(cls, shape, slots, context):
+        if slots < 2 + READERS:
+            raise ValueError(f"A frame ring needs at least {2 + READERS} slots: one being written, the latest, "
+                             f"and one pinned by each of the {READERS} readers.")
+        shm = shared_memory.SharedMemory(create=True, size=cls._size(shape, slots))
+        ring = cls(shm, shape, slots, context.Condition(), owner=True)
+        ring.control[SEQUENCE] = 0
+        ring.control[LATEST] = -1
+        ring.control[READING:] = -1
+        ring._altitude[0] = np.nan
+        return ring
+
+    def spec(self):
+        """What another process needs to attach(); can be passed to a spawned process."""
+        return self.shm.name, self.shape, self.slots, self.condition
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, slots, condition = spec
+        # Spawned children share the creator's resource tracker, so attaching does not
+        # give them ownership: only the creator unlinks the block
+        return cls(shared_memory.SharedMemory(name=name), shape, slots, condition, owner=False)
+
+    def claim(self):
+        """Writer: a slot that is neither the latest frame nor held by a reader, waiting for one if need be."""
+        with self.condition:
+            while (slot := self._free_slot()) is None:
+                self.condition.wait(0.5)
+        self.next_slot = (slot + 1) % self.slots
+        return slot
+
+    def _free_slot(self):
+        # Called with self.condition held, so the control words cannot change under it
+        busy = {int(self.control[LATEST]), *self.control[READING:].tolist()}
+        candidates = ((self.next_slot + step) % self.slots for step in range(self.slots))
+        return next((slot for slot in candidates if slot not in busy), None)
+
+    def publish(self, slot, frame_id, capture_time):
+        """Writer: makes `slot` the latest frame and wakes the readers."""
+        self.frame_ids[slot] = frame_id
+        self.capture_times[slot] = capture_time
+        with self.condition:
+            self.control[LATEST] = slot
+            self.control[SEQUENCE] += 1
+            self.condition.notify_all()
+
+    def acquire(self, reader, after_sequence=0, timeout=None):
+        """
+        Reader: waits for a frame newer than `after_sequence` and pins it. Returns
+        (sequence, slot), or None on timeout; call `release()` when done with the slot.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.control[SEQUENCE] > after_sequence, timeout):
+                return None
+            slot = int(self.control[LATEST])
+            self.control[READING + reader] = slot
+            return int(self.control[SEQUENCE]), slot
+
+    def release(self, reader):
+        with self.condition:
+            self.control[READING + reader] = -1
+            self.condition.notify_all()
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    @property
+    def altitude(self):
+        """Relative altitude shared by the main process, or None when unknown."""
+        altitude_m = float(self._altitude[0])
+        return None if math.isnan(altitude_m) else altitude_m
+
+    @altitude.setter
+    def altitude(self, altitude_m):
+        self._altitude[0] = np.nan if altitude_m is None else altitude_m
+
+    def close(self):
+        # The views have to go before the mapping can be closed
+        del self.control, self.frame_ids, self.capture_times, self._altitude, self.images
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _capture_main(ring_spec, source, stop_event, opened):
+    """Capture process: reads the camera as fast as it delivers and publishes every frame to the ring."""
+    from src.capture import open_capture
+
+    ring = FrameRing.attach(ring_spec)
+    capture = open_capture(source)
+    try:
+        if not capture.isOpened():
+            return
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        opened.set()
+        height, width = ring.shape[:2]
+        frame_id = 0
+        while not stop_event.is_set():
+            slot = ring.claim()
+            buffer = ring.images[slot]
+            success, image = capture.read()
+            capture_time = time.monotonic()
+            if not success:
+                logger.warning("Failed to grab frame from video stream. Stopping capture.")
+                break
+            if image.shape == buffer.shape:
+                np.copyto(buffer, image)
+            else:
+                cv2.resize(image, (width, height), dst=buffer)
+            frame_id += 1
+            ring.publish(slot, frame_id, capture_time)
+    finally:
+        capture.release()
+        stop_event.set()
+        ring.wake()
+        ring.close()
+
+
+def _inference_main(ring_spec, results, stop_event, backend, model_path):
+    """Inference process: runs the scheduler on the latest frame, in place, and sends back the persons."""
+    from src import detection
+    from src.scheduler import InferenceScheduler
+
+    ring = FrameRing.attach(ring_spec)
+    detector = detection.create_detector(backend, model_path)
+
+    def detect(image, annotate=False, imgsz=None):
+        return detector.detect(image, imgsz), None
+
+    scheduler = InferenceScheduler(detect, altitude=lambda: ring.altitude, fixed_imgsz=detector.fixed_imgsz)
+    sequence = 0
+    try:
+        while not stop_event.is_set():
+            acquired = ring.acquire(INFERENCE_READER, sequence, timeout=0.5)
+            if acquired is None:
+                continue
+            skipped = acquired[0] - sequence - 1 if sequence else 0
+            sequence, slot = acquired
+            frame_id, capture_time = int(ring.frame_ids[slot]), float(ring.capture_times[slot])
+            start = time.perf_counter()
+            try:
+                persons = scheduler.process(ring.images[slot])
+            finally:
+                ring.release(INFERENCE_READER)
+            header = RESULT_HEADER.pack(frame_id, capture_time, time.perf_counter() - start, skipped)
+            results.send_bytes(header + np.ascontiguousarray(persons, dtype=PERSON_DTYPE).tobytes())
+    except (BrokenPipeError, EOFError):
+        pass  # The main process has gone away
+    finally:
+        results.close()
+        ring.close()
+
+
+class ProcessCameraPipeline(CameraPipeline):
+    """
+    CameraPipeline with capture and inference in their own processes.
+
+    The interface is the same as CameraPipeline's. The detector is created in the
+    inference process from `backend` and `model_path`, since a model cannot be shared
+    across processes. The main process keeps only the latest result.
+    """
+
+    def __init__(self, source=config.CAMERA_SOURCE, altitude=None, recorder=None, slots=config.FRAME_RING_SLOTS,
+                 backend=config.DETECTION_BACKEND, model_path=config.DETECTION_MODEL_PATH):
+        super().__init__(source, altitude=altitude, recorder=recorder)
+        self.slots = slots
+        self.backend = backend
+        self.model_path = model_path
+        self.ring = None
+        self.processes = []
+        self.dropped = 0
+        self.frames_dropped = METRICS.counter("pipeline.frames_dropped")
+        self._reader_lock = threading.Lock()  # the main process has one reader slot in the ring
+
+    def start(self):
+        """Starts both processes. Returns False if the camera could not be opened. A no-op when already running."""
+        if self.processes:
+            return self.is_running
+        context = multiprocessing.get_context("spawn")
+        self.ring = FrameRing.create((config.FRAME_HEIGHT, config.FRAME_WIDTH, 3), self.slots, context)
+        self.ring.altitude = self.altitude() if self.altitude is not None else None
+        self.stop_event = context.Event()
+        opened = context.Event()
+        receiver, sender = context.Pipe(duplex=False)
+        self.processes = [
+            context.Process(target=_capture_main, name="frame-capture", daemon=True,
+                            args=(self.ring.spec(), self.source, self.stop_event, opened)),
+            context.Process(target=_inference_main, name="frame-inference", daemon=True,
+                            args=(self.ring.spec(), sender, self.stop_event, self.backend, self.model_path)),
+        ]
+        for process in self.processes:
+            process.start()
+        sender.close()
+
+        deadline = time.monotonic() + config.PREFLIGHT_CAMERA_TIMEOUT_S
+        while not opened.wait(0.05):
+            if self.stop_event.is_set() or time.monotonic() > deadline:
+                self.stop()
+                return False
+        if self.recorder is not None:
+            self.recorder.start()
+        self.threads = [threading.Thread(target=self._receive, args=(receiver,), name="result-receiver", daemon=True)]
+        self.threads[0].start()
+        return True
+
+    def _receive(self, receiver):
+        try:
+            while not self.stop_event.is_set():
+                if not receiver.poll(0.5):
+                    continue
+                message = receiver.recv_bytes()
+                frame_id, capture_time, inference_s, skipped = RESULT_HEADER.unpack_from(message)
+                persons = np.frombuffer(message, dtype=PERSON_DTYPE, offset=RESULT_HEADER.size).copy()
+                METRICS.histogram("detection.inference", "seconds").record(inference_s)
+                if skipped:
+                    self.dropped += skipped
+                    self.frames_dropped.inc(skipped)
+                # Keep the inference process's scheduler up to date with the altitude
+                if self.altitude is not None:
+                    self.ring.altitude = self.altitude()
+                annotated_frame = None
+                recording = self.recorder is not None and self.recorder.is_recording
+                if config.ENABLE_VIDEO_DISPLAY or recording:
+                    # The latest frame in the ring, which may be newer than the one detected in
+                    frame = self.wait_for_frame(timeout=0)
+                    if frame is not None and recording:
+                        self.recorder.record_frame(frame.frame_id, frame.capture_time, frame.image)
+                    if frame is not None and config.ENABLE_VIDEO_DISPLAY:
+                        from src.detection import annotate_frame
+                        annotated_frame = annotate_frame(frame.image, persons)
+                if recording:
+                    self.recorder.record_detections(frame_id, capture_time, persons)
+                self.results.put(DetectionResult(frame_id, capture_time, persons, annotated_frame))
+        except (EOFError, OSError):
+            pass  # The inference process exited
+        finally:
+            receiver.close()
+            self.stop_event.set()
+            self.results.wake()
+
+    @property
+    def dropped_frames(self):
+        return self.dropped
+
+    def wait_for_frame(self, timeout=None):
+        """A copy of the latest captured frame, or None if there is none within `timeout`."""
+        with self._reader_lock:
+            acquired = self.ring.acquire(MAIN_READER, 0, timeout)
+            if acquired is None:
+                return None
+            _, slot = acquired
+            try:
+                return CapturedFrame(int(self.ring.frame_ids[slot]), float(self.ring.capture_times[slot]),
+                                     self.ring.images[slot].copy())
+            finally:
+                self.ring.release(MAIN_READER)
+
+    def stop(self):
+        self.stop_event.set()
+        self.results.wake()
+        if self.ring is not None:
+            self.ring.wake()
+        for process in self.processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        self.processes = []
+        self.threads = []
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.recorder is not None:
+            self.recorder.stop()
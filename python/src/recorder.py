@@ -0,0 +1,239 @@
+"""
+Post-flight record of what the camera saw and what the vehicle decided.
+
+The flight loops hand frames, detections, offsets, velocity commands and positions to a
+MissionRecorder, which only puts them on a bounded queue; encoding and file writes
+happen on the recorder's own thread. When that thread falls behind, new items are
+dropped (and counted) rather than making the loops wait.
+
+Each recording is a directory holding `video.mp4`, a `meta.json` that ties the
+time.monotonic() timestamps of the rows to wall-clock time, and numbered
+`<stream>-NNNNN.npz` chunks with one array per column. `load()` reads a stream back.
+"""
+
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from src import config
+from src.metrics import METRICS
+from src.shared import PERSON_DTYPE
+
+logger = logging.getLogger(__name__)
+
+# Columns of each stream; every `time` is a time.monotonic() value
+STREAM_DTYPES = {
+    # One row per frame in the video, in video order
+    "frames": np.dtype([("frame_id", np.int64), ("time", np.float64)]),
+    # One row per detected person, keyed by the frame it was detected in
+    "detections": np.dtype([("frame_id", np.int64), ("time", np.float64)] + PERSON_DTYPE.descr),
+    # The target person's pixel offset, per detection fed to the centering controller
+    "offsets": np.dtype([("time", np.float64), ("track_id", np.int32), ("x", np.float64), ("y", np.float64),
+                         ("is_centered", np.bool_)]),
+    "commands": np.dtype([("time", np.float64), ("north_m_s", np.float64), ("east_m_s", np.float64),
+                          ("down_m_s", np.float64)]),
+    # The vehicle's own GLOBAL_POSITION_INT stream
+    "positions": np.dtype([("time", np.float64), ("latitude_deg", np.float64), ("longitude_deg", np.float64),
+                           ("absolute_altitude_m", np.float64), ("relative_altitude_m", np.float64),
+                           ("north_m_s", np.float64), ("east_m_s", np.float64), ("down_m_s", np.float64)]),
+    # Ground positions of the persons seen while scouting
+    "fixes": np.dtype([("time", np.float64), ("latitude_deg", np.float64), ("longitude_deg", np.float64),
+                       ("absolute_altitude_m", np.float64)]),
+}
+
+VIDEO_FILE = "video.mp4"
+META_FILE = "meta.json"
+_STOP = object()
+
+
+class MissionRecorder:
+    """
+    Records one directory per `start()`/`stop()` under `directory`, named after the start
+    time and `name`. The `record_*` methods are safe from any thread, never block, and do
+    nothing unless the recorder is enabled and started.
+
+    Frames are the bulk of the work, so they are only accepted while the queue is less
+    than half full: a slow encoder costs video frames first, and the numeric streams keep
+    their headroom.
+    """
+
+    def __init__(self, directory=config.RECORDING_DIR, name=None, enabled=config.RECORDING_ENABLED,
+                 queue_size=config.RECORDING_QUEUE_SIZE, chunk_rows=config.RECORDING_CHUNK_ROWS,
+                 fps=config.RECORDING_VIDEO_FPS, fourcc=config.RECORDING_VIDEO_FOURCC):
+        self.directory = directory
+        self.name = name
+        self.enabled = enabled
+        self.chunk_rows = chunk_rows
+        self.fps = fps
+        self.fourcc = fourcc
+        self.queue_size = queue_size
+        self.queue = None
+        self.path = None
+        self.thread = None
+        self.dropped = METRICS.counter("recorder.dropped")
+
+    @property
+    def is_recording(self):
+        return self.thread is not None
+
+    def start(self):
+        """Opens a new recording directory and starts the writer thread. A no-op if disabled or already recording."""
+        if not self.enabled or self.thread is not None:
+            return
+        now = time.time()
+        label = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        self.path = os.path.join(self.directory, f"{label}-{self.name}" if self.name else label)
+        try:
+            os.makedirs(self.path)
+            with open(os.path.join(self.path, META_FILE), "w") as f:
+                json.dump({"name": self.name, "started_unix": now, "started_monotonic": time.monotonic()}, f)
+        except OSError as e:
+            logger.warning("Could not start recording in %s: %s", self.path, e)
+            return
+        # A fresh queue per recording, so nothing that raced with the last stop() leaks into it
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.thread = threading.Thread(target=self._run, args=(self.queue, self.path), name="mission-recorder",
+                                       daemon=True)
+        self.thread.start()
+        logger.info("Recording to %s", self.path)
+
+    def stop(self, timeout=10.0):
+        """Writes out everything queued so far and closes the recording, waiting at most about `timeout` seconds."""
+        thread, self.thread = self.thread, None
+        if thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Recorder in %s is not keeping up; closing without the rest of its queue.", self.path)
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("Recorder in %s did not finish writing within %.0fs.", self.path, timeout)
+
+    def _put(self, stream, item):
+        if self.thread is None:
+            return False
+        items = self.queue
+        if stream == "frames" and items.qsize() >= items.maxsize // 2:
+            self.dropped.inc()
+            return False
+        try:
+            items.put_nowait((stream, item))
+        except queue.Full:
+            self.dropped.inc()
+            return False
+        return True
+
+    def record_frame(self, frame_id, capture_time, image):
+        """Queues a frame for the video. `image` is kept by reference, so it must not be written to afterwards."""
+        return self._put("frames", (frame_id, capture_time, image))
+
+    def record_detections(self, frame_id, capture_time, persons):
+        """Queues the persons (a PERSON_DTYPE array) detected in frame `frame_id`."""
+        return self._put("detections", (frame_id, capture_time, persons))
+
+    def record_offset(self, capture_time, track_id, offset):
+        """Queues the target person's Offset in the frame captured at `capture_time`."""
+        return self._put("offsets", (capture_time, track_id, float(offset.x), float(offset.y), bool(offset.is_centered)))
+
+    def record_command(self, cmd):
+        return self._put("commands", (time.monotonic(), float(cmd.north_m_s), float(cmd.east_m_s), float(cmd.down_m_s)))
+
+    def record_position(self, msg):
+        """Queues a GLOBAL_POSITION_INT message."""
+        return self._put("positions", (time.monotonic(), msg.lat / 1e7, msg.lon / 1e7, msg.alt / 1000.0,
+                                       msg.relative_alt / 1000.0, msg.vx / 100.0, msg.vy / 100.0, msg.vz / 100.0))
+
+    def record_fix(self, capture_time, coords):
+        return self._put("fixes", (capture_time, coords.latitude_deg, coords.longitude_deg, coords.absolute_altitude_m))
+
+    def _run(self, items, directory):
+        rows = {stream: [] for stream in STREAM_DTYPES}
+        chunks = dict.fromkeys(STREAM_DTYPES, 0)
+        writer = None
+        video_failed = False
+
+        def flush(stream):
+            if not rows[stream]:
+                return
+            path = os.path.join(directory, f"{stream}-{chunks[stream]:05d}.npz")
+            try:
+                table = np.array(rows[stream], dtype=STREAM_DTYPES[stream])
+                np.savez(path, **{column: table[column] for column in table.dtype.names})
+            except OSError as e:
+                logger.warning("Could not write %s: %s", path, e)
+            finally:
+                # A chunk that cannot be built is lost, rather than failing every later flush
+                rows[stream].clear()
+                chunks[stream] += 1
+
+        while True:
+            item = items.get()
+            if item is _STOP:
+                break
+            stream, values = item
+            try:
+                with METRICS.span(f"recorder.{stream}"):
+                    if stream == "frames":
+                        frame_id, capture_time, image = values
+                        if writer is None and not video_failed:
+                            writer = self._open_video(directory, image)
+                            video_failed = writer is None
+                        if writer is None:
+                            continue
+                        writer.write(image)
+                        values = (frame_id, capture_time)
+                    elif stream == "detections":
+                        frame_id, capture_time, persons = values
+                        rows[stream].extend((frame_id, capture_time, *person) for person in persons.tolist())
+                        values = None
+                    if values is not None:
+                        rows[stream].append(values)
+                    if len(rows[stream]) >= self.chunk_rows:
+                        flush(stream)
+            except Exception:
+                # One bad item must not stop the writer, or the queue fills up behind it
+                logger.exception("Could not record a %s item.", stream)
+                self.dropped.inc()
+
+        for stream in STREAM_DTYPES:
+            try:
+                flush(stream)
+            except Exception:
+                logger.exception("Could not write the last %s chunk.", stream)
+        if writer is not None:
+            writer.release()
+        logger.info("Recording in %s closed.", directory)
+
+    def _open_video(self, directory, image):
+        height, width = image.shape[:2]
+        path = os.path.join(directory, VIDEO_FILE)
+        # Lets OpenCV use whatever hardware encoder the platform has, falling back to software
+        params = [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        writer = cv2.VideoWriter(path, cv2.CAP_ANY, cv2.VideoWriter_fourcc(*self.fourcc), self.fps,
+                                 (width, height), params)
+        if not writer.isOpened():
+            logger.warning("Could not open a %s video writer for %s; recording without video.", self.fourcc, path)
+            return None
+        return writer
+
+
+def load(path, stream):
+    """Reads all chunks of `stream` in the recording at `path` back into one structured array."""
+    dtype = STREAM_DTYPES[stream]
+    chunks = []
+    for chunk_path in sorted(glob.glob(os.path.join(path, f"{stream}-*.npz"))):
+        with np.load(chunk_path) as columns:
+            chunk = np.empty(len(columns[dtype.names[0]]), dtype=dtype)
+            for column in dtype.names:
+                chunk[column] = columns[column]
+            chunks.append(chunk)
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
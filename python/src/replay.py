@@ -0,0 +1,339 @@
+"""
+Offline stand-ins for the camera and the vehicle, so whole missions can run on a
+machine with neither. The fake autopilot speaks real MAVLink over a local UDP port,
+so DroneController, the telemetry reader and the command manager run unmodified.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+from pymavlink import mavutil
+
+from src import config, geo
+from src.drone_controller import DroneController
+from src.pipeline import CameraPipeline
+from src.shared import GPSCoordinates
+
+# Messages taken from a tlog instead of the simulated vehicle state
+TLOG_TELEMETRY_TYPES = ('GLOBAL_POSITION_INT', 'ATTITUDE', 'SYS_STATUS', 'BATTERY_STATUS')
+
+GUIDED_MODE = 4  # ArduCopter custom mode numbers
+LAND_MODE = 9
+
+
+class TlogPlayer:
+    """Replays the telemetry messages of a MAVLink tlog with their recorded spacing."""
+
+    def __init__(self, path, msg_types=TLOG_TELEMETRY_TYPES):
+        self.log = mavutil.mavlink_connection(path)
+        self.msg_types = list(msg_types)
+        self.offset = None  # wall clock minus log clock
+        self.pending = None
+        self.finished = False
+
+    def due_messages(self, now):
+        """Returns the logged messages whose (shifted) timestamps are at or before `now`."""
+        due = []
+        while not self.finished:
+            if self.pending is None:
+                self.pending = self.log.recv_match(type=self.msg_types)
+                if self.pending is None:
+                    self.finished = True
+                    break
+            if self.offset is None:
+                self.offset = now - self.pending._timestamp
+            if self.pending._timestamp + self.offset > now:
+                break
+            due.append(self.pending)
+            self.pending = None
+        return due
+
+
+class FakeAutopilot(threading.Thread):
+    """
+    Scripted ArduCopter stand-in that talks MAVLink on `url`.
+
+    It ACKs every COMMAND_LONG, arms, takes off, lands and returns home. It flies to
+    global position targets at `cruise_speed_m_s` and integrates local-NED velocity
+    setpoints. It also records when the payload servo opens. Telemetry comes from
+    that simulated state, or from `tlog` when one is given.
+    """
+
+    def __init__(self, url, home=(47.397742, 8.545594, 488.0), rate_hz=10.0, tlog=None,
+                 cruise_speed_m_s=10.0, climb_rate_m_s=2.0, velocity_timeout_s=1.0):
+        super().__init__(name="fake-autopilot", daemon=True)
+        self.conn = mavutil.mavlink_connection(url, source_system=1, source_component=1)
+        self.home = home
+        self.period = 1.0 / rate_hz
+        self.tlog = TlogPlayer(tlog) if tlog else None
+        self.cruise_speed_m_s = cruise_speed_m_s
+        self.climb_rate_m_s = climb_rate_m_s
+        self.velocity_timeout_s = velocity_timeout_s
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.boot_time = time.monotonic()
+
+        self.position = np.zeros(3)  # east, north, up in metres from home
+        self.velocity = np.zeros(3)
+        self.velocity_setpoint = None
+        self.velocity_setpoint_time = 0.0
+        self.position_target = None
+        self.armed = False
+        self.mode = GUIDED_MODE
+        self.distance_flown_m = 0.0
+        self.payload_released_at = None
+        self.commands_received = []
+        self._last_heartbeat = 0.0
+        self._last_status = 0.0
+        self._log_origin = None
+
+    def local_position(self):
+        """Current east/north/up offset from home (from the tlog position when replaying one)."""
+        with self.lock:
+            return self.position.copy()
+
+    def run(self):
+        last = time.monotonic()
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            while True:
+                msg = self.conn.recv_match(blocking=False)
+                if msg is None:
+                    break
+                self._handle(msg, now)
+            with self.lock:
+                self._step(now - last, now)
+            last = now
+            self._send_telemetry(now)
+            self.stop_event.wait(self.period)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=2.0)
+        self.conn.close()
+
+    def _handle(self, msg, now):
+        msg_type = msg.get_type()
+        with self.lock:
+            if msg_type == 'COMMAND_LONG':
+                self.commands_received.append((now, msg.command))
+                self._handle_command(msg, now)
+                self.conn.mav.command_ack_send(msg.command, mavutil.mavlink.MAV_RESULT_ACCEPTED)
+            elif msg_type == 'SET_POSITION_TARGET_LOCAL_NED':
+                self.velocity_setpoint = np.array([msg.vy, msg.vx, -msg.vz])
+                self.velocity_setpoint_time = now
+                self.position_target = None
+            elif msg_type == 'SET_POSITION_TARGET_GLOBAL_INT':
+                self.position_target = geo.geodetic_to_enu(
+                    msg.lat_int / 1e7, msg.lon_int / 1e7, self.home[2] + msg.alt,
+                    *self.home)
+                self.velocity_setpoint = None
+
+    def _handle_command(self, msg, now):
+        command = msg.command
+        if command == mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            self.armed = msg.param1 == 1
+        elif command == mavutil.mavlink.MAV_CMD_DO_SET_MODE:
+            self.mode = int(msg.param2)
+        elif command == mavutil.mavlink.MAV_CMD_NAV_TAKEOFF:
+            self._fly_to(self.position[0], self.position[1], msg.param7)
+        elif command == mavutil.mavlink.MAV_CMD_NAV_LAND:
+            self.mode = LAND_MODE
+            self._fly_to(self.position[0], self.position[1], 0.0)
+        elif command == mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH:
+            self._fly_to(0.0, 0.0, self.position[2])
+        elif command == mavutil.mavlink.MAV_CMD_DO_SET_SERVO:
+            if int(msg.param1) == config.PAYLOAD_SERVO_CHANNEL and int(msg.param2) == config.PAYLOAD_SERVO_OPEN_PWM:
+                self.payload_released_at = now
+
+    def _fly_to(self, east, north, up):
+        self.position_target = np.array([east, north, up])
+        self.velocity_setpoint = None
+
+    def _step(self, dt, now):
+        if self.tlog is not None:
+            return
+        velocity = np.zeros(3)
+        if self.velocity_setpoint is not None and now - self.velocity_setpoint_time <= self.velocity_timeout_s:
+            velocity = self.velocity_setpoint
+        elif self.position_target is not None:
+            error = self.position_target - self.position
+            horizontal = np.hypot(error[0], error[1])
+            if horizontal > 0:
+                velocity[:2] = error[:2] / horizontal * min(self.cruise_speed_m_s, horizontal / max(dt, 1e-3))
+            velocity[2] = np.clip(error[2] / max(dt, 1e-3), -self.climb_rate_m_s, self.climb_rate_m_s)
+        if not self.armed:
+            velocity = np.zeros(3)
+        self.velocity = velocity
+        self.position = self.position + velocity * dt
+        self.position[2] = max(self.position[2], 0.0)
+        self.distance_flown_m += float(np.linalg.norm(velocity * dt))
+
+    def _send_telemetry(self, now):
+        time_boot_ms = int((now - self.boot_time) * 1000)
+        if now - self._last_heartbeat >= 1.0:
+            base_mode = mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+            if self.armed:
+                base_mode |= mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+            self.conn.mav.heartbeat_send(
+                mavutil.mavlink.MAV_TYPE_QUADROTOR, mavutil.mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+                base_mode, self.mode, mavutil.mavlink.MAV_STATE_ACTIVE)
+            self._last_heartbeat = now
+
+        if self.tlog is not None:
+            for msg in self.tlog.due_messages(now):
+                if msg.get_type() == 'GLOBAL_POSITION_INT':
+                    self._track_logged_position(msg)
+                self.conn.mav.send(msg)
+            return
+
+        with self.lock:
+            position, velocity = self.position.copy(), self.velocity.copy()
+        lat, lon, alt = geo.enu_to_geodetic(position, *self.home)
+        self.conn.mav.global_position_int_send(
+            time_boot_ms, int(lat * 1e7), int(lon * 1e7),
+            int(alt * 1000), int(position[2] * 1000),
+            int(velocity[1] * 100), int(velocity[0] * 100), int(-velocity[2] * 100),
+            65535)
+        self.conn.mav.attitude_send(time_boot_ms, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        if now - self._last_status >= 1.0:
+            remaining = 100
+            if config.BATTERY_FULL_RANGE_M:
+                remaining = max(int(100 * (1 - self.distance_flown_m / config.BATTERY_FULL_RANGE_M)), 0)
+            self.conn.mav.sys_status_send(0, 0, 0, 500, 12000, -1, remaining, 0, 0, 0, 0, 0, 0)
+            self._last_status = now
+
+    def _track_logged_position(self, msg):
+        lat, lon, alt = msg.lat / 1e7, msg.lon / 1e7, msg.alt / 1000.0
+        if self._log_origin is None:
+            self._log_origin = (lat, lon, alt)
+        with self.lock:
+            self.position = geo.geodetic_to_enu(lat, lon, alt, *self._log_origin)
+
+
+class SimulatedCamera:
+    """
+    Downward camera stand-in: shifts each recorded frame by how far the fake vehicle has
+    moved since the camera opened, so centering closes the loop. Image up is north and
+    image right is east, matching the sign convention of the offset calculation.
+    """
+
+    def __init__(self, capture, autopilot: FakeAutopilot, pixels_per_m):
+        self.capture = capture
+        self.autopilot = autopilot
+        self.pixels_per_m = pixels_per_m
+        self.origin = autopilot.local_position()
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        success, image = self.capture.read()
+        if not success:
+            return success, image
+        east, north, _ = self.autopilot.local_position() - self.origin
+        shift = np.float32([[1, 0, -east * self.pixels_per_m], [0, 1, north * self.pixels_per_m]])
+        return True, cv2.warpAffine(image, shift, (image.shape[1], image.shape[0]))
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def release(self):
+        self.capture.release()
+
+
+class ReplayMetrics:
+    """End-to-end numbers for a replayed mission."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.results = 0
+        self.last_capture_time = None
+        self.command_latencies_s = []
+        self.center_started = None
+        self.centered_at = None
+        self.dropped_frames = 0
+
+    def on_result(self, result):
+        with self.lock:
+            self.results += 1
+            self.last_capture_time = result.capture_time
+
+    def on_velocity_command(self):
+        with self.lock:
+            if self.last_capture_time is not None:
+                self.command_latencies_s.append(time.monotonic() - self.last_capture_time)
+
+    def report(self):
+        duration = time.monotonic() - self.started
+        latencies_ms = np.array(self.command_latencies_s) * 1000
+        report = {
+            "duration_s": round(duration, 3),
+            "detection_results": self.results,
+            "detection_fps": round(self.results / duration, 2) if duration > 0 else 0.0,
+            "dropped_frames": self.dropped_frames,
+            "velocity_commands": len(latencies_ms),
+            "time_to_center_s": None,
+        }
+        if len(latencies_ms):
+            report.update({
+                "command_latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+                "command_latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+                "command_latency_max_ms": round(float(latencies_ms.max()), 2),
+            })
+        if self.center_started is not None and self.centered_at is not None:
+            report["time_to_center_s"] = round(self.centered_at - self.center_started, 3)
+        return report
+
+
+class RecordingPipeline(CameraPipeline):
+    def __init__(self, metrics: ReplayMetrics, source, altitude=None, recorder=None):
+        super().__init__(source, altitude=altitude, recorder=recorder)
+        self.metrics = metrics
+
+    def get_latest(self, timeout=config.PIPELINE_RESULT_TIMEOUT_S):
+        result = super().get_latest(timeout)
+        if result is not None:
+            self.metrics.on_result(result)
+        return result
+
+    def stop(self):
+        super().stop()
+        with self.metrics.lock:
+            self.metrics.dropped_frames += self.dropped_frames
+
+
+class ReplayDroneController(DroneController):
+    """DroneController that feeds a ReplayMetrics from the same code paths a real mission uses."""
+
+    def __init__(self, source, metrics: ReplayMetrics):
+        super().__init__()
+        self.metrics = metrics
+        self.pipeline_factory = lambda: RecordingPipeline(metrics, source, self.relative_altitude, self.recorder)
+
+    def send_velocity_command(self, cmd):
+        super().send_velocity_command(cmd)
+        self.metrics.on_velocity_command()
+
+    async def center_and_drop_async(self, pipeline=None):
+        if self.metrics.center_started is None:
+            self.metrics.center_started = time.monotonic()
+        return await super().center_and_drop_async(pipeline)
+
+    async def release_payload_async(self):
+        released = await super().release_payload_async()
+        if released and self.metrics.centered_at is None:
+            self.metrics.centered_at = time.monotonic()
+        return released
+
+
+def offset_position(origin, north_m, east_m, relative_altitude_m):
+    """The position `north_m`/`east_m` metres from `origin` (a (lat, lon, alt) tuple), e.g. for scripted targets."""
+    lat, lon, alt = geo.enu_to_geodetic([east_m, north_m, relative_altitude_m], *origin)
+    return GPSCoordinates(float(lat), float(lon), float(alt), relative_altitude_m)
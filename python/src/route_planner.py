@@ -0,0 +1,131 @@
+import numpy as np
+
+from src import geo
+from src.shared import GPSCoordinates
+
+
+def distance_matrix(latitudes, longitudes):
+    """Pairwise great-circle distances in metres between the given points, as an (N, N) array."""
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    return geo.haversine_m(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def path_length(matrix, path):
+    path = np.asarray(path)
+    return float(matrix[path[:-1], path[1:]].sum())
+
+
+def nearest_neighbor_path(matrix, start, end):
+    """Greedy path from `start` through every other node to `end`."""
+    visited = np.zeros(len(matrix), dtype=bool)
+    visited[[start, end]] = True
+    path = [start]
+    current = start
+    for _ in range(len(matrix) - 2):
+        current = int(np.where(visited, np.inf, matrix[current]).argmin())
+        visited[current] = True
+        path.append(current)
+    path.append(end)
+    return np.array(path)
+
+
+def two_opt(matrix, path, max_passes=50):
+    """
+    Improves a path with fixed first and last nodes by reversing segments while that
+    shortens it. For each segment start all segment ends are scored at once.
+    """
+    path = np.array(path)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(path) - 2):
+            a, b = path[i - 1], path[i]
+            c, d = path[i:-1], path[i + 1:]
+            delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+            j = int(delta.argmin())
+            if delta[j] < -1e-6:
+                path[i:i + j + 1] = path[i:i + j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return path
+
+
+class RoutePlanner:
+    """
+    Keeps the pending delivery targets in a short visiting order.
+
+    Routes start at the drone's current position. With a `home` position the return leg
+    is part of the route cost, so the order also ends near home; without one the route
+    ends at whichever target is last. Distances are horizontal only.
+    """
+
+    def __init__(self, home: GPSCoordinates = None):
+        self.home = home
+        self.targets = []  # pending targets in visiting order
+
+    def __len__(self):
+        return len(self.targets)
+
+    def _matrix(self, position, targets):
+        """Distance matrix over [position, *targets, end], where end is home or a free node."""
+        points = [position] + list(targets) + ([self.home] if self.home else [])
+        matrix = distance_matrix([p.latitude_deg for p in points], [p.longitude_deg for p in points])
+        if self.home is None:
+            # An open route ends at a free node that is zero distance from everything
+            matrix = np.pad(matrix, ((0, 1), (0, 1)))
+        return matrix
+
+    def _set_order(self, targets, path):
+        self.targets = [targets[node - 1] for node in path[1:-1]]
+
+    def replan(self, position: GPSCoordinates):
+        """Rebuilds the order from `position`: nearest neighbour, then 2-opt."""
+        if self.targets:
+            matrix = self._matrix(position, self.targets)
+            path = nearest_neighbor_path(matrix, 0, len(matrix) - 1)
+            self._set_order(self.targets, two_opt(matrix, path))
+        return list(self.targets)
+
+    def add(self, new_targets, position: GPSCoordinates = None):
+        """
+        Adds targets that arrived mid-mission. Each one is inserted where it lengthens the
+        current route least and the result is refined with 2-opt, keeping the existing order
+        as the starting point. Without a `position` the targets are appended as received.
+        """
+        targets = self.targets + list(new_targets)
+        if position is None:
+            self.targets = targets
+            return list(self.targets)
+
+        matrix = self._matrix(position, targets)
+        path = list(range(len(self.targets) + 1)) + [len(matrix) - 1]
+        for node in range(len(self.targets) + 1, len(targets) + 1):
+            route = np.array(path)
+            added = matrix[route[:-1], node] + matrix[node, route[1:]] - matrix[route[:-1], route[1:]]
+            path.insert(int(added.argmin()) + 1, node)
+        self._set_order(targets, two_opt(matrix, path))
+        return list(self.targets)
+
+    def route_length_m(self, position: GPSCoordinates):
+        """Length of the planned route from `position`, including the return home if there is one."""
+        matrix = self._matrix(position, self.targets)
+        return path_length(matrix, np.arange(len(matrix)))
+
+    def within_budget(self, position: GPSCoordinates, budget_m):
+        """
+        The leading part of the route that can be flown from `position` on `budget_m` metres
+        while still leaving enough to fly home from the last target visited.
+        """
+        if budget_m is None or not self.targets:
+            return list(self.targets)
+        matrix = self._matrix(position, self.targets)
+        nodes = np.arange(1, len(self.targets) + 1)
+        flown = np.cumsum(matrix[nodes - 1, nodes])
+        return_leg = matrix[nodes, len(matrix) - 1]
+        fits = flown + return_leg <= budget_m
+        count = len(fits) if fits.all() else int(fits.argmin())
+        return self.targets[:count]
+
+    def pop_next(self):
+        return self.targets.pop(0)
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+
+class MissionRuntime:
+    """
+    Owns the single asyncio event loop that mission code runs on.
+
+    The loop lives on a background thread so synchronous callers (scout.py, deliver.py
+    and the blocking DroneController methods) can hand it a coroutine with `run()` and
+    wait for the result, while telemetry waits, vision and base-station traffic progress
+    concurrently on the loop.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self._run, name="mission-runtime", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedules `coro` on the loop and returns a concurrent.futures.Future for its result."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Runs `coro` on the loop and blocks until it finishes. Must not be called from the loop itself."""
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("MissionRuntime.run() called from the event loop; await the coroutine instead.")
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        with self._lock:
+            if self.loop is not None and self.thread is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=2.0)
+            self.thread = None
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """Returns the process-wide mission runtime, starting its loop on first use."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = MissionRuntime()
+        _runtime.start()
+        return _runtime
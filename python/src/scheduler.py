@@ -0,0 +1,197 @@
+import math
+import time
+
+import cv2
+import numpy as np
+
+from src import config
+from src.detection import NO_PERSONS, PersonTracker, scan_for_person
+from src.metrics import METRICS
+from src.offset import ground_metres_per_pixel
+
+BOX_FIELDS = ["x_min", "y_min", "x_max", "y_max"]
+
+
+class FlowTracker:
+    """
+    Carries person boxes from one frame to the next with sparse Lucas-Kanade optical flow.
+    Each box moves by the median motion of the corners found inside it at the last
+    detection; a box whose corners have all been lost stays where it was.
+    """
+
+    def __init__(self, points_per_box=20):
+        self.points_per_box = points_per_box
+        self.gray = None
+        self.persons = NO_PERSONS
+        self.points = np.empty((0, 2), dtype=np.float32)
+        self.labels = np.empty(0, dtype=np.intp)
+
+    def reset(self, image, persons):
+        """Starts tracking `persons` as detected in `image`."""
+        self.gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.persons = persons.copy()
+        points, labels = [], []
+        height, width = self.gray.shape
+        for index, (x_min, y_min, x_max, y_max) in enumerate(persons[BOX_FIELDS].tolist()):
+            x0, y0 = max(int(x_min), 0), max(int(y_min), 0)
+            x1, y1 = min(int(math.ceil(x_max)), width), min(int(math.ceil(y_max)), height)
+            if x1 - x0 < 4 or y1 - y0 < 4:
+                continue
+            corners = cv2.goodFeaturesToTrack(self.gray[y0:y1, x0:x1], self.points_per_box, 0.01, 3)
+            if corners is None:
+                continue
+            points.append(corners.reshape(-1, 2) + (x0, y0))
+            labels.append(np.full(len(corners), index, dtype=np.intp))
+        self.points = np.concatenate(points).astype(np.float32) if points else np.empty((0, 2), dtype=np.float32)
+        self.labels = np.concatenate(labels) if labels else np.empty(0, dtype=np.intp)
+
+    def update(self, image):
+        """Returns the tracked persons moved to where they are in `image`."""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if len(self.points):
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, self.points.reshape(-1, 1, 2), None,
+                                                        winSize=(15, 15), maxLevel=2)
+            moved = moved.reshape(-1, 2)
+            good = status.reshape(-1) == 1
+            motion = moved - self.points
+            for index in np.unique(self.labels[good]):
+                dx, dy = np.median(motion[good & (self.labels == index)], axis=0)
+                self.persons["x_min"][index] += dx
+                self.persons["x_max"][index] += dx
+                self.persons["y_min"][index] += dy
+                self.persons["y_max"][index] += dy
+            self.points = moved[good]
+            self.labels = self.labels[good]
+        self.gray = gray
+        return self.persons.copy()
+
+
+class InferenceScheduler:
+    """
+    Decides, frame by frame, how much detection work to spend.
+
+    While searching, every frame is detected in full. Its inference size is the largest
+    of `sizes` whose measured latency fits `budget_s`, but never so small that a person
+    at the current altitude (from `altitude()`, in metres) would shrink below
+    `config.DETECTION_MIN_PERSON_PX` in the network's input.
+
+    Once persons are found, detection is cropped to a region around them, and when a
+    detection takes longer than the budget the frames in between are bridged by optical
+    flow, up to `max_stride` frames per detection. The whole frame is searched again at
+    least every `search_interval_s`, and as soon as a cropped detection finds nobody.
+
+    A backend that only runs at one size (an exported graph, see `Detector.dynamic_imgsz`)
+    is given as `fixed_imgsz`. It gets no size ladder: every detection runs at that size,
+    and only cropping and bridging apply.
+    """
+
+    def __init__(self, detect=scan_for_person, altitude=None, budget_s=config.INFERENCE_LATENCY_BUDGET_S,
+                 sizes=config.INFERENCE_IMGSZ_LADDER, max_stride=config.INFERENCE_MAX_STRIDE,
+                 roi_margin=config.INFERENCE_ROI_MARGIN, search_interval_s=config.INFERENCE_SEARCH_INTERVAL_S,
+                 enabled=config.ADAPTIVE_INFERENCE, fixed_imgsz=None, clock=time.monotonic):
+        self.detect = detect
+        self.altitude = altitude
+        self.budget_s = budget_s
+        self.sizes = sorted(sizes)
+        self.fixed_imgsz = fixed_imgsz
+        self.max_stride = max_stride
+        self.roi_margin = roi_margin
+        self.search_interval_s = search_interval_s
+        self.enabled = enabled
+        self.clock = clock
+        self.latency_s = {}  # inference size -> smoothed detection latency
+        self.tracker = PersonTracker()
+        self.flow = FlowTracker()
+        self.persons = NO_PERSONS
+        self.stride = 1
+        self.frames_since_detection = 0
+        self.last_search = None
+
+    def process(self, image):
+        """Returns the persons in `image` with stable track ids, detected or carried forward by optical flow."""
+        if not self.enabled:
+            with METRICS.span("detection.inference"):
+                persons, _ = self.detect(image, annotate=False)
+            return self.tracker.update(persons)
+
+        locked = len(self.persons) > 0
+        if locked and self.frames_since_detection + 1 < self.stride:
+            self.frames_since_detection += 1
+            with METRICS.span("detection.flow"):
+                self.persons = self.flow.update(image)
+            return self.persons
+
+        height, width = image.shape[:2]
+        now = self.clock()
+        if locked and now - self.last_search < self.search_interval_s:
+            x0, y0, x1, y1 = self._region_of_interest(width, height)
+        else:
+            x0, y0, x1, y1 = 0, 0, width, height
+            self.last_search = now
+        imgsz = self.choose_imgsz(x1 - x0, y1 - y0)
+
+        start = time.perf_counter()
+        with METRICS.span("detection.inference"):
+            persons, _ = self.detect(image[y0:y1, x0:x1], annotate=False, imgsz=imgsz)
+        self._record_latency(imgsz, time.perf_counter() - start)
+        METRICS.histogram("detection.imgsz").record(imgsz)
+        if x0 or y0:
+            persons = persons.copy()
+            persons["x_min"] += x0
+            persons["x_max"] += x0
+            persons["y_min"] += y0
+            persons["y_max"] += y0
+
+        self.persons = self.tracker.update(persons)
+        self.frames_since_detection = 0
+        self.stride = min(max(math.ceil(self.expected_latency(imgsz) / self.budget_s), 1), self.max_stride)
+        if self.stride > 1 and len(self.persons):
+            self.flow.reset(image, self.persons)
+        return self.persons
+
+    def _region_of_interest(self, width, height):
+        """The tracked persons' bounding box, padded by `roi_margin` box sizes and at least the smallest input size."""
+        x_min, y_min = float(self.persons["x_min"].min()), float(self.persons["y_min"].min())
+        x_max, y_max = float(self.persons["x_max"].max()), float(self.persons["y_max"].max())
+        box_size = float(np.max(np.maximum(self.persons["x_max"] - self.persons["x_min"],
+                                           self.persons["y_max"] - self.persons["y_min"])))
+        pad = self.roi_margin * box_size
+        half_w = max((x_max - x_min) / 2 + pad, self.sizes[0] / 2)
+        half_h = max((y_max - y_min) / 2 + pad, self.sizes[0] / 2)
+        cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+        x0, x1 = int(max(cx - half_w, 0)), int(min(cx + half_w, width))
+        y0, y1 = int(max(cy - half_h, 0)), int(min(cy + half_h, height))
+        return x0, y0, x1, y1
+
+    def choose_imgsz(self, region_width, region_height):
+        """Inference size for a region of the given size (in frame pixels)."""
+        if self.fixed_imgsz is not None:
+            return self.fixed_imgsz
+        longest = max(region_width, region_height)
+        # Going past the region's own resolution only adds cost, unless the altitude needs it
+        native = next((size for size in self.sizes if size >= longest), self.sizes[-1])
+        candidates = [size for size in self.sizes if size <= native]
+        fitting = [size for size in candidates if self.expected_latency(size) <= self.budget_s]
+        preferred = fitting[-1] if fitting else candidates[0]
+        return max(preferred, self._minimum_imgsz(longest))
+
+    def _minimum_imgsz(self, longest):
+        altitude_m = self.altitude() if self.altitude is not None else None
+        if altitude_m is None:
+            return self.sizes[-1]
+        person_px = config.PERSON_WIDTH_M / ground_metres_per_pixel(altitude_m)
+        needed = config.DETECTION_MIN_PERSON_PX / person_px * longest
+        return next((size for size in self.sizes if size >= needed), self.sizes[-1])
+
+    def expected_latency(self, imgsz):
+        """Smoothed latency at `imgsz`, scaled from the nearest measured size if it has not been run yet."""
+        if imgsz in self.latency_s:
+            return self.latency_s[imgsz]
+        if not self.latency_s:
+            return 0.0
+        measured = min(self.latency_s, key=lambda size: abs(size - imgsz))
+        return self.latency_s[measured] * (imgsz / measured) ** 2
+
+    def _record_latency(self, imgsz, latency_s):
+        previous = self.latency_s.get(imgsz)
+        self.latency_s[imgsz] = latency_s if previous is None else 0.7 * previous + 0.3 * latency_s
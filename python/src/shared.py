@@ -1,6 +1,39 @@
+import numpy as np
+
+# One detected person per element; track_id is -1 until a tracker assigns one
+PERSON_DTYPE = np.dtype([
+    ("x_min", np.float32),
+    ("y_min", np.float32),
+    ("x_max", np.float32),
+    ("y_max", np.float32),
+    ("confidence", np.float32),
+    ("track_id", np.int32),
+])
+
+
+def make_persons(boxes):
+    """Builds a PERSON_DTYPE array from an (N, 5) array of (x_min, y_min, x_max, y_max, confidence) rows."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 5)
+    persons = np.empty(len(boxes), dtype=PERSON_DTYPE)
+    for column, name in enumerate(PERSON_DTYPE.names[:5]):
+        persons[name] = boxes[:, column]
+    persons["track_id"] = -1
+    return persons
+
+
 class GPSCoordinates:
+    __slots__ = ("latitude_deg", "longitude_deg", "absolute_altitude_m", "relative_altitude_m")
+
     def __init__(self, latitude_deg, longitude_deg, absolute_altitude_m, relative_altitude_m):
         self.latitude_deg = latitude_deg
         self.longitude_deg = longitude_deg
         self.absolute_altitude_m = absolute_altitude_m
         self.relative_altitude_m = relative_altitude_m
+
+class VelocityCommand:
+    __slots__ = ("north_m_s", "east_m_s", "down_m_s")
+
+    def __init__(self, north_m_s, east_m_s, down_m_s):
+        self.north_m_s = north_m_s
+        self.east_m_s = east_m_s
+        self.down_m_s = down_m_s
@@ -0,0 +1,145 @@
+"""
+Spatial deduplication of person sightings.
+
+A scout sees the same person in every frame for as long as they are in view, and several
+scouts may see the same person. SightingIndex clusters the position fixes into one
+Sighting per person and says when a sighting is worth reporting. Fixes are bucketed in a
+grid of `radius_m` cells on a local east/north plane, so finding the sighting a fix
+belongs to only looks at the 3x3 cells around it, however many people have been seen.
+"""
+
+import math
+import time
+
+from src import config, geo
+from src.metrics import METRICS
+from src.shared import GPSCoordinates
+
+# Why a sighting should be reported, returned by SightingIndex.add()
+NEW = "new"
+MOVED = "moved"
+
+
+class Sighting:
+    """One person. The position is the running mean of every fix merged into it."""
+
+    __slots__ = ("sighting_id", "latitude_deg", "longitude_deg", "absolute_altitude_m", "relative_altitude_m",
+                 "east_m", "north_m", "fixes", "first_seen", "last_seen", "reported_east_m", "reported_north_m")
+
+    def __init__(self, sighting_id, coords: GPSCoordinates, east_m, north_m, now):
+        self.sighting_id = sighting_id
+        self.latitude_deg = coords.latitude_deg
+        self.longitude_deg = coords.longitude_deg
+        self.absolute_altitude_m = coords.absolute_altitude_m
+        self.relative_altitude_m = coords.relative_altitude_m
+        self.east_m = east_m
+        self.north_m = north_m
+        self.fixes = 1
+        self.first_seen = now
+        self.last_seen = now
+        self.reported_east_m = None
+        self.reported_north_m = None
+
+    def merge(self, coords: GPSCoordinates, east_m, north_m, now):
+        self.fixes += 1
+        weight = 1.0 / self.fixes
+        self.latitude_deg += (coords.latitude_deg - self.latitude_deg) * weight
+        self.longitude_deg += (coords.longitude_deg - self.longitude_deg) * weight
+        self.absolute_altitude_m += (coords.absolute_altitude_m - self.absolute_altitude_m) * weight
+        self.relative_altitude_m += (coords.relative_altitude_m - self.relative_altitude_m) * weight
+        self.east_m += (east_m - self.east_m) * weight
+        self.north_m += (north_m - self.north_m) * weight
+        self.last_seen = now
+
+    def coordinates(self):
+        return GPSCoordinates(self.latitude_deg, self.longitude_deg,
+                              self.absolute_altitude_m, self.relative_altitude_m)
+
+
+class SightingIndex:
+    """
+    Clusters position fixes into sightings of distinct people.
+
+    A fix within `radius_m` of an existing sighting refines that sighting (the nearest one
+    if several are in range); otherwise it starts a new one. `add()` flags a sighting for
+    reporting once it has `min_fixes` fixes, and again whenever its estimate has moved
+    `update_distance_m` from the last reported position.
+    """
+
+    def __init__(self, radius_m=config.SIGHTING_RADIUS_M, update_distance_m=config.SIGHTING_UPDATE_DISTANCE_M,
+                 min_fixes=config.SIGHTING_MIN_FIXES, clock=time.monotonic):
+        self.radius_m = radius_m
+        self.update_distance_m = update_distance_m
+        self.min_fixes = min_fixes
+        self.clock = clock
+        self.origin = None  # (lat, lon) of the first fix; the grid is laid out around it
+        self.cells = {}  # (column, row) -> sightings whose estimate lies in that cell
+        self.sightings = []
+
+    def __len__(self):
+        return len(self.sightings)
+
+    def __iter__(self):
+        return iter(self.sightings)
+
+    def _local(self, coords: GPSCoordinates):
+        if self.origin is None:
+            self.origin = (coords.latitude_deg, coords.longitude_deg)
+        east, north, _ = geo.geodetic_to_enu(coords.latitude_deg, coords.longitude_deg, 0.0, *self.origin, 0.0)
+        return float(east), float(north)
+
+    def _cell(self, east_m, north_m):
+        return math.floor(east_m / self.radius_m), math.floor(north_m / self.radius_m)
+
+    def _nearest(self, east_m, north_m):
+        column, row = self._cell(east_m, north_m)
+        nearest, nearest_distance = None, self.radius_m
+        for cell in ((column + dc, row + dr) for dc in (-1, 0, 1) for dr in (-1, 0, 1)):
+            for sighting in self.cells.get(cell, ()):
+                distance = math.hypot(sighting.east_m - east_m, sighting.north_m - north_m)
+                if distance <= nearest_distance:
+                    nearest, nearest_distance = sighting, distance
+        return nearest
+
+    def nearest(self, coords: GPSCoordinates):
+        """Returns the sighting `coords` would be merged into, or None if it would start a new one."""
+        return self._nearest(*self._local(coords))
+
+    def add(self, coords: GPSCoordinates):
+        """
+        Merges a fix into the index. Returns (sighting, event), where event is NEW or MOVED
+        when the sighting should be reported and None otherwise.
+        """
+        now = self.clock()
+        east, north = self._local(coords)
+        sighting = self._nearest(east, north)
+        if sighting is None:
+            sighting = Sighting(len(self.sightings) + 1, coords, east, north, now)
+            self.sightings.append(sighting)
+            self.cells.setdefault(self._cell(east, north), []).append(sighting)
+        else:
+            old_cell = self._cell(sighting.east_m, sighting.north_m)
+            sighting.merge(coords, east, north, now)
+            new_cell = self._cell(sighting.east_m, sighting.north_m)
+            if new_cell != old_cell:
+                self.cells[old_cell].remove(sighting)
+                if not self.cells[old_cell]:
+                    del self.cells[old_cell]
+                self.cells.setdefault(new_cell, []).append(sighting)
+        METRICS.counter("sightings.fixes").inc()
+        return sighting, self._event(sighting)
+
+    def _event(self, sighting: Sighting):
+        if sighting.fixes < self.min_fixes:
+            return None
+        if sighting.reported_east_m is None:
+            event = NEW
+        elif math.hypot(sighting.east_m - sighting.reported_east_m,
+                        sighting.north_m - sighting.reported_north_m) >= self.update_distance_m:
+            event = MOVED
+        else:
+            return None
+        sighting.reported_east_m = sighting.east_m
+        sighting.reported_north_m = sighting.north_m
+        METRICS.counter(f"sightings.{event}").inc()
+        return event
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+# Each record is its payload length and CRC32 followed by the JSON-encoded message
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".spool"
+CURSOR_FILE = "cursor"
+
+
+class MessageSpool:
+    """
+    Append-only on-disk spool for base station messages that could not be delivered.
+
+    Records are appended to numbered segment files; a small cursor file remembers how far
+    replay has got. Segments that have been fully replayed are deleted, and when the spool
+    grows past `max_bytes` the oldest segments are dropped.
+
+    Every append is flushed to the operating system, so it survives a crash of this
+    process. It is fsynced, to survive a power loss, once `sync_bytes` have been written
+    or `sync_interval_s` has passed since the last fsync, so a burst of appends pays for
+    one fsync rather than one each.
+    """
+
+    def __init__(self, directory=config.SPOOL_DIR, segment_bytes=config.SPOOL_SEGMENT_BYTES,
+                 max_bytes=config.SPOOL_MAX_BYTES, sync_bytes=config.SPOOL_SYNC_BYTES,
+                 sync_interval_s=config.SPOOL_SYNC_INTERVAL_S):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.sync_bytes = sync_bytes
+        self.sync_interval_s = sync_interval_s
+        self.unsynced_bytes = 0
+        self.last_sync = time.monotonic()
+        self.lock = threading.Lock()
+        self.dropped_segments = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit())
+        self.read_segment, self.read_offset = self._load_cursor()
+        if not self.segments:
+            self.segments = [self.read_segment]
+        # Never append to a segment written by an earlier run; its tail may be torn
+        self._open_segment(self.segments[-1] + 1 if os.path.exists(self._path(self.segments[-1])) else self.segments[-1])
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                segment, offset = (int(value) for value in f.read().split())
+        except (OSError, ValueError):
+            return (self.segments[0] if self.segments else 0), 0
+        if self.segments and segment < self.segments[0]:
+            return self.segments[0], 0
+        return segment, offset
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self.read_segment} {self.read_offset}")
+        os.replace(path + ".tmp", path)
+
+    def _open_segment(self, segment):
+        if segment not in self.segments:
+            self.segments.append(segment)
+        self.write_segment = segment
+        self.write_file = open(self._path(segment), "ab")
+
+    def _segment_size(self, segment):
+        if segment == self.write_segment:
+            return self.write_file.tell()
+        try:
+            return os.path.getsize(self._path(segment))
+        except OSError:
+            return 0
+
+    def append(self, message):
+        payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            if self.write_file.tell() + len(record) > self.segment_bytes and self.write_file.tell() > 0:
+                self._sync()
+                self.write_file.close()
+                self._open_segment(self.write_segment + 1)
+                self._enforce_size_limit()
+            self.write_file.write(record)
+            self.write_file.flush()
+            self.unsynced_bytes += len(record)
+            if self.unsynced_bytes >= self.sync_bytes or time.monotonic() - self.last_sync >= self.sync_interval_s:
+                self._sync()
+
+    def _sync(self):
+        self.write_file.flush()
+        os.fsync(self.write_file.fileno())
+        self.unsynced_bytes = 0
+        self.last_sync = time.monotonic()
+
+    def _enforce_size_limit(self):
+        while len(self.segments) > 1 and sum(self._segment_size(s) for s in self.segments) > self.max_bytes:
+            oldest = self.segments.pop(0)
+            self._remove_segment(oldest)
+            self.dropped_segments += 1
+            logger.warning("Spool exceeded %d bytes. Dropped oldest segment %s.", self.max_bytes, oldest)
+            if self.read_segment <= oldest:
+                self.read_segment, self.read_offset = self.segments[0], 0
+                self._save_cursor()
+
+    def _remove_segment(self, segment):
+        try:
+            os.remove(self._path(segment))
+        except OSError:
+            pass
+
+    def has_pending(self):
+        with self.lock:
+            return (self.read_segment < self.write_segment
+                    or self.read_offset < self.write_file.tell())
+
+    def read_batch(self, max_records):
+        """
+        Returns (messages, position) for up to `max_records` of the oldest unreplayed messages.
+        Pass `position` to `commit()` once the messages have been delivered.
+        """
+        with self.lock:
+            self.write_file.flush()
+            segment, offset = self.read_segment, self.read_offset
+            messages = []
+            while len(messages) < max_records and segment <= self.write_segment:
+                try:
+                    with open(self._path(segment), "rb") as f:
+                        f.seek(offset)
+                        while len(messages) < max_records:
+                            header = f.read(RECORD_HEADER.size)
+                            if len(header) < RECORD_HEADER.size:
+                                break
+                            length, crc = RECORD_HEADER.unpack(header)
+                            payload = f.read(length)
+                            if len(payload) < length or zlib.crc32(payload) != crc:
+                                # Torn or corrupt tail: nothing after it in this segment is trustworthy
+                                logger.warning("Skipping corrupt record in spool segment %s.", segment)
+                                offset = self._segment_size(segment)
+                                break
+                            messages.append(json.loads(payload))
+                            offset = f.tell()
+                except FileNotFoundError:
+                    pass
+                if len(messages) >= max_records or segment == self.write_segment:
+                    break
+                segment, offset = segment + 1, 0
+            return messages, (segment, offset)
+
+    def commit(self, position):
+        """Marks everything before `position` as delivered and deletes fully replayed segments."""
+        with self.lock:
+            self.read_segment, self.read_offset = position
+            while self.segments and self.segments[0] < self.read_segment:
+                self._remove_segment(self.segments.pop(0))
+            if self.read_segment == self.write_segment and self.read_offset == self.write_file.tell():
+                # Everything has been replayed; start over with an empty segment
+                self.write_file.close()
+                self._remove_segment(self.write_segment)
+                self.segments = []
+                self.read_segment, self.read_offset = self.write_segment + 1, 0
+                self._open_segment(self.read_segment)
+            self._save_cursor()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def close(self):
+        with self.lock:
+            if self.write_file.closed:
+                return
+            self._sync()
+            self.write_file.close()
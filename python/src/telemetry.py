@@ -0,0 +1,173 @@
+import asyncio
+import collections
+import logging
+import threading
+import time
+
+from pymavlink import mavutil
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryCache:
+    """
+    Thread-safe store of the most recent MAVLink messages of each type.
+
+    Every message gets a global sequence number and a receive timestamp. A few recent
+    messages are kept per type, so a caller that notes `sequence()` before sending a
+    command can still find a reply that arrives before it starts waiting.
+    """
+
+    def __init__(self, history_length=config.TELEMETRY_HISTORY_LENGTH):
+        self._condition = threading.Condition()
+        self._history = collections.defaultdict(lambda: collections.deque(maxlen=history_length))
+        self._sequence = 0
+        self._listeners = []
+
+    def sequence(self):
+        with self._condition:
+            return self._sequence
+
+    def update(self, msg):
+        with self._condition:
+            self._sequence += 1
+            self._history[msg.get_type()].append((self._sequence, time.monotonic(), msg))
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(msg)
+
+    def add_listener(self, callback):
+        """Calls `callback(msg)` on the reader thread for every message received."""
+        with self._condition:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._condition:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def latest(self, msg_type, max_age=None):
+        """Returns the newest message of `msg_type`, or None if there is none (or it is older than `max_age` seconds)."""
+        with self._condition:
+            history = self._history.get(msg_type)
+            if not history:
+                return None
+            _, received, msg = history[-1]
+        if max_age is not None and time.monotonic() - received > max_age:
+            return None
+        return msg
+
+    def at(self, msg_type, timestamp, tolerance=None):
+        """
+        Returns the kept message of `msg_type` received closest to `timestamp` (a
+        time.monotonic() value), or None if there is none within `tolerance` seconds of it.
+        """
+        with self._condition:
+            history = list(self._history.get(msg_type, ()))
+        if not history:
+            return None
+        _, received, msg = min(history, key=lambda entry: abs(entry[1] - timestamp))
+        if tolerance is not None and abs(received - timestamp) > tolerance:
+            return None
+        return msg
+
+    def age(self, msg_type):
+        with self._condition:
+            history = self._history.get(msg_type)
+            return time.monotonic() - history[-1][1] if history else None
+
+    def wait_for(self, msg_type, condition=None, timeout=None, since=None):
+        """
+        Waits for a message of `msg_type` received after sequence number `since` (default: now)
+        that satisfies `condition`. Returns the message, or None on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            last_seen = self._sequence if since is None else since
+            while True:
+                for seq, _, msg in self._history.get(msg_type, ()):
+                    if seq > last_seen:
+                        last_seen = seq
+                        if condition is None or condition(msg):
+                            return msg
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    async def wait_for_async(self, msg_type, condition=None, timeout=None):
+        """Awaitable version of `wait_for()` for new messages; `condition` runs on the reader thread."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(msg):
+            if not future.done():
+                future.set_result(msg)
+
+        def listener(msg):
+            if msg.get_type() == msg_type and (condition is None or condition(msg)):
+                loop.call_soon_threadsafe(resolve, msg)
+
+        self.add_listener(listener)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.remove_listener(listener)
+
+
+class MavlinkReader(threading.Thread):
+    """Drains the MAVLink connection continuously and publishes every message into a TelemetryCache."""
+
+    def __init__(self, master, cache: TelemetryCache):
+        super().__init__(name="mavlink-reader", daemon=True)
+        self.master = master
+        self.cache = cache
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                msg = self.master.recv_match(blocking=True, timeout=0.5)
+            except Exception as e:
+                logger.warning("Error reading MAVLink connection: %s", e)
+                time.sleep(0.1)
+                continue
+            if msg is None or msg.get_type() == 'BAD_DATA':
+                continue
+            self.cache.update(msg)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=2.0)
+
+
+def request_message_interval(master, msg_type, rate_hz):
+    """Asks the autopilot to stream `msg_type` (e.g. 'ATTITUDE') at `rate_hz`. A rate of 0 stops the stream."""
+    message_id = getattr(mavutil.mavlink, f"MAVLINK_MSG_ID_{msg_type}")
+    interval_us = int(1e6 / rate_hz) if rate_hz > 0 else -1
+    master.mav.command_long_send(
+        master.target_system, master.target_component,
+        mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, 0,
+        message_id, interval_us, 0, 0, 0, 0, 0)
+
+
+class MavlinkTelemetry(TelemetryCache):
+    """Latest-value cache for one MAVLink connection, fed by its own background reader thread."""
+
+    def __init__(self, master):
+        super().__init__()
+        self.master = master
+        self.reader = MavlinkReader(master, self)
+
+    def start(self, stream_rates_hz=config.TELEMETRY_STREAM_RATES_HZ):
+        self.reader.start()
+        for msg_type, rate_hz in stream_rates_hz.items():
+            request_message_interval(self.master, msg_type, rate_hz)
+
+    def stop(self):
+        self.reader.stop()
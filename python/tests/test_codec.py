@@ -0,0 +1,89 @@
+import unittest
+
+from src import codec
+from src.codec import CodecError, decode_frame, encode_binary, encode_frame
+
+
+def gps(timestamp, drone_id=None):
+    message = {"message_type": "gps_coordinates", "timestamp": timestamp, "latitude": 47.3769123,
+               "longitude": -8.5416987, "altitude": 61.5}
+    if drone_id is not None:
+        message["drone_id"] = drone_id
+    return message
+
+
+PAYLOAD = {"message_type": "payload_status", "timestamp": 1700000000123, "dropped": True}
+DETECTION = {"message_type": "person_detection_status", "timestamp": 1700000000456, "detected": False}
+
+
+class BinaryRoundTripTest(unittest.TestCase):
+    def test_every_record_type(self):
+        messages = decode_frame(encode_binary([gps(1700000000000), PAYLOAD, DETECTION]))
+
+        self.assertEqual(messages[1:], [PAYLOAD, DETECTION])
+        position = messages[0]
+        self.assertEqual(position["message_type"], "gps_coordinates")
+        self.assertEqual(position["timestamp"], 1700000000000)
+        self.assertAlmostEqual(position["latitude"], 47.3769123, places=7)
+        self.assertAlmostEqual(position["longitude"], -8.5416987, places=7)
+        self.assertAlmostEqual(position["altitude"], 61.5, places=4)
+
+    def test_vehicle_records_tag_the_messages_after_them(self):
+        frame = encode_binary([gps(1, drone_id=2), gps(2, drone_id=2), gps(3), gps(4, drone_id=7)])
+
+        # One vehicle record per change of drone, including back to untagged
+        self.assertEqual(frame[3], 7)
+        self.assertEqual([message.get("drone_id") for message in decode_frame(frame)], [2, 2, None, 7])
+
+    def test_json_round_trip(self):
+        message = dict(gps(5, drone_id=3))
+        self.assertEqual(decode_frame(encode_frame([message], "json")), [message])
+
+
+class BinaryLimitsTest(unittest.TestCase):
+    def test_record_limit(self):
+        limit = codec.MAX_RECORDS_PER_FRAME
+        self.assertEqual(len(decode_frame(encode_binary([gps(index) for index in range(limit)]))), limit)
+        with self.assertRaises(CodecError):
+            encode_binary([gps(index) for index in range(limit + 1)])
+
+    def test_vehicle_records_count_towards_the_limit(self):
+        with self.assertRaises(CodecError):
+            encode_binary([gps(index, drone_id=1) for index in range(codec.MAX_RECORDS_PER_FRAME)])
+
+    def test_unencodable_messages(self):
+        for message in ({**PAYLOAD, "message_type": "mission_plan"}, {**gps(1), "altitude": None},
+                        {**gps(1), "latitude": float("nan")}, gps(1, drone_id=256), {"message_type": "payload_status"}):
+            with self.subTest(message=message), self.assertRaises(CodecError):
+                encode_binary([message])
+
+    def test_json_frames_carry_one_message(self):
+        with self.assertRaises(CodecError):
+            encode_frame([PAYLOAD, DETECTION], "json")
+        with self.assertRaises(CodecError):
+            encode_frame([PAYLOAD], "xml")
+
+
+class MalformedFrameTest(unittest.TestCase):
+    def test_rejected_frames(self):
+        frame = encode_binary([gps(1), PAYLOAD])
+        cases = {
+            "truncated header": frame[:3],
+            "truncated record": frame[:-1],
+            "missing record": frame[:codec.HEADER.size + 1 + codec.GPS_RECORD.size],
+            "bad version": frame[:2] + bytes((codec.VERSION + 1,)) + frame[3:],
+            "unknown record type": frame[:codec.HEADER.size] + b"\x09" + frame[codec.HEADER.size + 1:],
+            "invalid json": b"{not json",
+            "invalid utf-8": b"\xff\xfe",
+        }
+        for name, payload in cases.items():
+            with self.subTest(name), self.assertRaises(CodecError):
+                decode_frame(payload)
+
+    def test_bad_magic(self):
+        with self.assertRaises(CodecError):
+            codec.decode_binary(b"XX" + encode_binary([PAYLOAD])[2:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from pymavlink import mavutil
+
+from src.drone_controller import DroneController
+
+MODE = mavutil.mavlink.MAV_CMD_DO_SET_MODE
+ARM = mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM
+LAND = mavutil.mavlink.MAV_CMD_NAV_LAND
+
+
+class ScriptedCommands:
+    """A CommandManager stand-in that accepts or refuses each command id and logs every send and wait."""
+
+    def __init__(self, refused=()):
+        self.refused = set(refused)
+        self.log = []
+
+    def send(self, command, *params, **kwargs):
+        self.log.append(("send", command, params[:1]))
+        future = Future()
+        future.set_result(command)
+        return future
+
+    async def wait_accepted_async(self, future):
+        command = future.result()
+        self.log.append(("ack", command))
+        return command not in self.refused
+
+
+class OffboardModeTest(unittest.TestCase):
+    def setUp(self):
+        self.drone = DroneController()
+        self.drone.is_connected = True
+        self.drone.master = mock.Mock()
+        self.drone.master.mode_mapping.return_value = {"GUIDED": 4}
+
+    def start(self, refused=()):
+        self.drone.commands = ScriptedCommands(refused)
+        return self.drone.start_offboard_mode(), self.drone.commands.log
+
+    def test_arms_only_after_mode_is_acknowledged(self):
+        armed, log = self.start()
+
+        self.assertTrue(armed)
+        self.assertEqual(log, [("send", MODE, (mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED,)), ("ack", MODE),
+                               ("send", ARM, (1,)), ("ack", ARM)])
+
+    def test_refused_mode_never_arms(self):
+        armed, log = self.start(refused={MODE})
+
+        self.assertFalse(armed)
+        self.assertNotIn(ARM, [entry[1] for entry in log])
+
+    def test_failed_arm_disarms(self):
+        armed, log = self.start(refused={ARM})
+
+        self.assertFalse(armed)
+        self.assertEqual(log[-2:], [("send", ARM, (0,)), ("ack", ARM)])
+
+
+class LandTest(unittest.TestCase):
+    def test_refused_land_fails_without_waiting_for_touchdown(self):
+        drone = DroneController()
+        drone.is_connected = True
+        drone.commands = ScriptedCommands(refused={LAND})
+        drone.telemetry = mock.Mock()
+
+        self.assertFalse(drone.land())
+        drone.telemetry.wait_for_async.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
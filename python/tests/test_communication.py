@@ -0,0 +1,73 @@
+import contextlib
+import socket
+import threading
+import time
+import unittest
+
+from src import codec
+from src.codec import FRAME_HEADER
+from src.communication import BaseStationLink
+
+
+class RecordingBaseStation(threading.Thread):
+    """Accepts one link, decodes every frame it sends and ACKs it."""
+
+    ACK = codec.encode_json({"status": "success"})
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.messages = []
+
+    def run(self):
+        sock, _ = self.listener.accept()
+        self.listener.close()
+        buffer = b""
+        with sock, contextlib.suppress(ConnectionError):
+            # The link may reset the connection when it closes with an ACK still unread
+            while data := sock.recv(65536):
+                buffer += data
+                while len(buffer) >= FRAME_HEADER.size:
+                    (length,) = FRAME_HEADER.unpack_from(buffer)
+                    if len(buffer) < FRAME_HEADER.size + length:
+                        break
+                    payload, buffer = buffer[FRAME_HEADER.size:FRAME_HEADER.size + length], buffer[FRAME_HEADER.size + length:]
+                    self.messages.extend(codec.decode_frame(payload))
+                    sock.sendall(FRAME_HEADER.pack(len(self.ACK)) + self.ACK)
+
+
+def gps(latitude, drone_id=0):
+    return {"message_type": "gps_coordinates", "timestamp": 1700000000000, "latitude": latitude,
+            "longitude": 8.5, "altitude": 20.0, "drone_id": drone_id}
+
+
+class UnencodableMessageTest(unittest.TestCase):
+    def send(self, wire_format, messages):
+        server = RecordingBaseStation()
+        server.start()
+        link = BaseStationLink("127.0.0.1", server.port, wire_format=wire_format)
+        try:
+            with self.assertLogs("src.communication", "ERROR"):
+                for message in messages:
+                    link.enqueue(message)
+                deadline = time.monotonic() + 5.0
+                while len(server.messages) < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            self.assertTrue(link.thread.is_alive())
+        finally:
+            link.close()
+            server.join(timeout=2.0)
+        return [message["latitude"] for message in server.messages]
+
+    def test_bad_binary_messages_are_dropped_and_the_rest_sent(self):
+        sent = self.send("binary", [gps(47.1), gps(float("nan")), gps(None), gps(47.2, drone_id=300), gps(47.3)])
+        self.assertEqual(sent, [47.1, 47.3])
+
+    def test_bad_json_message_is_dropped_and_the_rest_sent(self):
+        sent = self.send("json", [gps(47.1), {**gps(47.2), "extra": object()}, gps(47.3)])
+        self.assertEqual(sent, [47.1, 47.3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+
+from src import config
+from src.drone_controller import DroneController
+from src.shared import GPSCoordinates
+
+
+class StoppedPipeline:
+    """A camera pipeline that opens but never delivers a result."""
+
+    is_running = False
+
+    def start(self):
+        return True
+
+    async def get_latest_async(self):
+        return None
+
+    def stop(self):
+        pass
+
+
+class DeliveryAltitudeTest(unittest.TestCase):
+    def setUp(self):
+        self.drone = DroneController()
+        self.drone.pipeline_factory = StoppedPipeline
+        self.goto = mock.AsyncMock(return_value=False)
+        self.drone.goto_async = self.goto
+
+    def test_geolocated_target_is_flown_at_delivery_altitude(self):
+        # A geolocated fix lies on the ground: 0 m above home
+        fix = GPSCoordinates(47.3977, 8.5456, 488.0, 0.0)
+        self.drone.deliver_to(fix)
+
+        target = self.goto.await_args.args[0]
+        self.assertEqual((target.latitude_deg, target.longitude_deg), (fix.latitude_deg, fix.longitude_deg))
+        self.assertEqual(target.relative_altitude_m, config.DEFAULT_TAKEOFF_ALTITUDE_DELIVER)
+
+    def test_cruise_altitude_overrides_target_altitude(self):
+        self.drone.deliver_to(GPSCoordinates(47.3977, 8.5456, 548.0, 60.0), cruise_altitude_m=15.0)
+
+        self.assertEqual(self.goto.await_args.args[0].relative_altitude_m, 15.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
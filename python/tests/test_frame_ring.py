@@ -0,0 +1,66 @@
+import multiprocessing
+import threading
+import unittest
+from multiprocessing import shared_memory
+
+from src.process_pipeline import INFERENCE_READER, MAIN_READER, READERS, SEQUENCE, FrameRing
+
+SHAPE = (4, 4, 3)
+
+
+class FrameRingTest(unittest.TestCase):
+    def setUp(self):
+        self.ring = FrameRing.create(SHAPE, 2 + READERS, multiprocessing.get_context("spawn"))
+        self.addCleanup(self.ring.close)
+
+    def publish(self, frame_id):
+        slot = self.ring.claim()
+        self.ring.images[slot] = frame_id
+        self.ring.publish(slot, frame_id, float(frame_id))
+        return slot
+
+    def test_needs_a_slot_per_reader(self):
+        with self.assertRaisesRegex(ValueError, "at least 4 slots"):
+            FrameRing.create(SHAPE, 3, multiprocessing.get_context("spawn"))
+
+    def test_writer_never_claims_a_pinned_slot(self):
+        # Each reader pins a different frame, and a third one is the latest
+        self.publish(1)
+        _, inference_slot = self.ring.acquire(INFERENCE_READER)
+        self.publish(2)
+        _, main_slot = self.ring.acquire(MAIN_READER)
+        latest = self.publish(3)
+        self.assertEqual(len({inference_slot, main_slot, latest}), 3)
+
+        for frame_id in range(4, 12):
+            slot = self.publish(frame_id)
+            self.assertNotIn(slot, {inference_slot, main_slot})
+        self.assertTrue((self.ring.images[inference_slot] == 1).all())
+        self.assertTrue((self.ring.images[main_slot] == 2).all())
+
+    def test_claim_waits_for_a_release(self):
+        # Too small a ring, built past create()'s check: the latest frame and two pins fill it
+        context = multiprocessing.get_context("spawn")
+        ring = FrameRing(shared_memory.SharedMemory(create=True, size=FrameRing._size(SHAPE, 3)), SHAPE, 3,
+                         context.Condition(), owner=True)
+        self.addCleanup(ring.close)
+        ring.control[:] = -1
+        ring.control[SEQUENCE] = 0
+        for frame_id, reader in ((1, INFERENCE_READER), (2, MAIN_READER), (3, None)):
+            ring.publish(ring.claim(), frame_id, float(frame_id))
+            if reader is not None:
+                ring.acquire(reader)
+
+        claimed = []
+        writer = threading.Thread(target=lambda: claimed.append(ring.claim()), daemon=True)
+        writer.start()
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive())
+
+        ring.release(INFERENCE_READER)
+        writer.join(2.0)
+        self.assertEqual(claimed, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from src.metrics import MetricsRegistry, prometheus_text
+
+
+class PrometheusUnitTest(unittest.TestCase):
+    def test_only_timed_histograms_get_the_seconds_suffix(self):
+        registry = MetricsRegistry()
+        with registry.span("detection.inference"):
+            pass
+        registry.histogram("mavlink.command_ack", "seconds").record(0.02)
+        registry.histogram("detection.imgsz").record(480)
+        registry.counter("pipeline.dropped_frames").inc()
+
+        types = {line.split()[2] for line in prometheus_text(registry.snapshot()).splitlines() if line.startswith("# TYPE")}
+        self.assertEqual(types, {"drone_detection_inference_seconds", "drone_mavlink_command_ack_seconds",
+                                 "drone_detection_imgsz", "drone_pipeline_dropped_frames_total"})
+
+    def test_unit_is_kept_in_the_snapshot(self):
+        registry = MetricsRegistry()
+        registry.histogram("startup.ready", "seconds").record(1.5)
+        registry.histogram("detector_pool.batch_size").record(3)
+
+        histograms = registry.snapshot()["histograms"]
+        self.assertEqual(histograms["startup.ready"]["unit"], "seconds")
+        self.assertNotIn("unit", histograms["detector_pool.batch_size"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src import offset
+from src.shared import make_persons
+
+BOXES = [(300, 200, 380, 330, 0.9), (316, 236, 324, 244, 0.8), (0, 0, 40, 100, 0.5)]
+
+
+class SmallFrameTest(unittest.TestCase):
+    """Frames small enough for the plain-Python path must match the vectorized one."""
+
+    def check(self, persons):
+        small = offset.calculate_offset(persons)
+        small_command = offset.calculate_velocity_command(small)
+        with mock.patch.object(offset, "SCALAR_PATH_MAX_PERSONS", -1):
+            vectorized = offset.calculate_offset(persons)
+            vectorized_command = offset.calculate_velocity_command(vectorized)
+        np.testing.assert_allclose(small.x, vectorized.x)
+        np.testing.assert_allclose(small.y, vectorized.y)
+        np.testing.assert_array_equal(small.is_centered, vectorized.is_centered)
+        np.testing.assert_allclose(small_command.north_m_s, vectorized_command.north_m_s)
+        np.testing.assert_allclose(small_command.east_m_s, vectorized_command.east_m_s)
+        np.testing.assert_array_equal(small_command.down_m_s, np.zeros(len(persons)))
+
+    def test_frames(self):
+        for count in range(offset.SCALAR_PATH_MAX_PERSONS + 1):
+            with self.subTest(count=count):
+                self.check(make_persons(BOXES[:count]))
+
+    def test_single_person_gives_scalars(self):
+        persons = make_persons(BOXES)
+        for index in range(len(persons)):
+            box = offset.PersonBoundingBox(*BOXES[index])
+            for person in (persons[index], box):
+                command = offset.calculate_velocity_command(offset.calculate_offset(person))
+                expected = offset.calculate_velocity_command(offset.calculate_offset(persons)).east_m_s[index]
+                self.assertEqual(np.ndim(command.east_m_s), 0)
+                self.assertAlmostEqual(command.east_m_s, expected, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import time
+import unittest
+
+import numpy as np
+
+from src.pipeline import CameraPipeline
+
+
+class EndlessCapture:
+    """A camera that delivers a blank frame every few milliseconds."""
+
+    def read(self):
+        time.sleep(0.005)
+        return True, np.zeros((480, 640, 3), dtype=np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return True
+
+    def release(self):
+        pass
+
+
+def failing_detect(image, annotate=False, imgsz=None):
+    raise RuntimeError("detector crashed")
+
+
+class DetectionFailureTest(unittest.TestCase):
+    def test_failing_detector_stops_the_pipeline(self):
+        pipeline = CameraPipeline(EndlessCapture, failing_detect)
+        self.assertTrue(pipeline.start())
+        try:
+            with self.assertLogs("src.pipeline", "ERROR"):
+                self.assertIsNone(pipeline.get_latest(timeout=2.0))
+            self.assertFalse(pipeline.is_running)
+            # Consumers polling a stopped pipeline return at once instead of waiting out the timeout
+            start = time.monotonic()
+            self.assertIsNone(pipeline.get_latest(timeout=2.0))
+            self.assertLess(time.monotonic() - start, 1.0)
+        finally:
+            pipeline.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src import recorder
+from src.recorder import MissionRecorder
+from src.shared import VelocityCommand, make_persons
+
+
+class RecorderFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_bad_items_do_not_stop_the_writer(self):
+        rec = MissionRecorder(self.directory, enabled=True, chunk_rows=2)
+        rec.start()
+        with self.assertLogs("src.recorder", "ERROR"):
+            rec.record_detections(1, 0.0, [("not", "a person array")])
+            # Wrong columns: only fails when the chunk is built
+            rec.record_detections(2, 0.0, np.zeros(2, dtype=[("x", np.float64)]))
+            rec.record_detections(3, 0.0, make_persons([(1, 2, 3, 4, 0.9)]))
+            for north in (1.0, 2.0, 3.0):
+                rec.record_command(VelocityCommand(north, 0.0, 0.0))
+            rec.stop()
+
+        self.assertEqual(recorder.load(rec.path, "commands")["north_m_s"].tolist(), [1.0, 2.0, 3.0])
+        self.assertGreater(rec.dropped.value, 0)
+
+    def test_stop_gives_up_on_a_stuck_writer(self):
+        rec = MissionRecorder(self.directory, enabled=True, queue_size=2)
+        stuck = threading.Event()
+        self.addCleanup(stuck.set)
+        with mock.patch.object(MissionRecorder, "_open_video", lambda self, directory, image: stuck.wait() and None):
+            rec.start()
+            rec.record_frame(1, 0.0, np.zeros((4, 4, 3), dtype=np.uint8))
+            time.sleep(0.1)  # the writer is now stuck opening the video
+            rec.record_command(VelocityCommand(0.0, 0.0, 0.0))
+            rec.record_command(VelocityCommand(0.0, 0.0, 0.0))
+
+            start = time.monotonic()
+            with self.assertLogs("src.recorder", "WARNING"):
+                rec.stop(timeout=0.2)
+            self.assertLess(time.monotonic() - start, 2.0)
+            self.assertFalse(rec.is_recording)
+
+
+if __name__ == "__main__":
+    unittest.main()
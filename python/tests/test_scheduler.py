@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from src.detection import NO_PERSONS
+from src.scheduler import InferenceScheduler
+
+
+class RecordingDetect:
+    def __init__(self):
+        self.sizes = []
+
+    def __call__(self, image, annotate=False, imgsz=None):
+        self.sizes.append(imgsz)
+        return NO_PERSONS, None
+
+
+class FixedSizeBackendTest(unittest.TestCase):
+    """With every detection over budget, only a backend that can change its input size steps down the ladder."""
+
+    def run_frames(self, fixed_imgsz):
+        detect = RecordingDetect()
+        scheduler = InferenceScheduler(detect, altitude=lambda: 5.0, budget_s=1e-9, sizes=(320, 640),
+                                       enabled=True, fixed_imgsz=fixed_imgsz)
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        for _ in range(3):
+            scheduler.process(image)
+        return detect.sizes
+
+    def test_dynamic_backend_uses_the_ladder(self):
+        self.assertEqual(self.run_frames(None), [640, 320, 320])
+
+    def test_fixed_backend_always_runs_at_its_size(self):
+        self.assertEqual(self.run_frames(640), [640, 640, 640])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.spool import RECORD_HEADER, SEGMENT_SUFFIX, MessageSpool
+
+
+def message(index):
+    return {"message_type": "gps_coordinates", "timestamp": index, "latitude": 47.0, "longitude": 8.0,
+            "altitude": 20.0}
+
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open(self, **kwargs):
+        spool = MessageSpool(self.directory, **kwargs)
+        self.addCleanup(spool.close)
+        return spool
+
+    def segment_files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def read_all(self, spool):
+        messages, _ = spool.read_batch(1000)
+        return [m["timestamp"] for m in messages]
+
+    def test_torn_tail_is_skipped_after_a_crash(self):
+        spool = self.open()
+        for index in range(3):
+            spool.append(message(index))
+        spool.close()
+        # A crash in the middle of the last write
+        [segment] = self.segment_files()
+        path = os.path.join(self.directory, segment)
+        os.truncate(path, os.path.getsize(path) - 5)
+
+        spool = self.open()
+        spool.append(message(3))
+        with self.assertLogs("src.spool", "WARNING"):
+            self.assertEqual(self.read_all(spool), [0, 1, 3])
+
+    def test_corrupt_record_fails_its_crc(self):
+        spool = self.open()
+        for index in range(3):
+            spool.append(message(index))
+        spool.close()
+        [segment] = self.segment_files()
+        path = os.path.join(self.directory, segment)
+        with open(path, "r+b") as f:
+            data = f.read()
+            second = RECORD_HEADER.size + RECORD_HEADER.unpack_from(data)[0]
+            f.seek(second + RECORD_HEADER.size + 2)
+            f.write(b"#")
+
+        spool = self.open()
+        with self.assertLogs("src.spool", "WARNING"):
+            # Nothing after a bad record in the same segment is trusted
+            self.assertEqual(self.read_all(spool), [0])
+
+    def test_cursor_survives_reopening(self):
+        spool = self.open()
+        for index in range(5):
+            spool.append(message(index))
+        messages, position = spool.read_batch(2)
+        self.assertEqual([m["timestamp"] for m in messages], [0, 1])
+        spool.commit(position)
+        spool.close()
+
+        spool = self.open()
+        self.assertTrue(spool.has_pending())
+        self.assertEqual(self.read_all(spool), [2, 3, 4])
+
+    def test_uncommitted_batch_is_read_again(self):
+        spool = self.open()
+        for index in range(4):
+            spool.append(message(index))
+        first, _ = spool.read_batch(2)
+        again, position = spool.read_batch(2)
+        self.assertEqual(again, first)
+
+        spool.commit(position)
+        messages, position = spool.read_batch(10)
+        self.assertEqual([m["timestamp"] for m in messages], [2, 3])
+        spool.commit(position)
+        self.assertFalse(spool.has_pending())
+
+    def test_segments_rotate_and_are_deleted_once_replayed(self):
+        record_size = RECORD_HEADER.size + len(json.dumps(message(0), separators=(",", ":")))
+        spool = self.open(segment_bytes=2 * record_size)
+        for index in range(6):
+            spool.append(message(index))
+        self.assertEqual(len(self.segment_files()), 3)
+
+        # A batch that ends inside the second segment deletes only the first
+        messages, position = spool.read_batch(3)
+        self.assertEqual([m["timestamp"] for m in messages], [0, 1, 2])
+        spool.commit(position)
+        self.assertEqual(len(self.segment_files()), 2)
+
+        spool.commit(spool.read_batch(10)[1])
+        self.assertFalse(spool.has_pending())
+        self.assertLessEqual(len(self.segment_files()), 1)
+
+    def test_oldest_segments_are_dropped_past_the_size_limit(self):
+        spool = self.open(segment_bytes=200, max_bytes=600)
+        with self.assertLogs("src.spool", "WARNING"):
+            for index in range(40):
+                spool.append(message(index))
+        self.assertGreater(spool.dropped_segments, 0)
+
+        remaining = self.read_all(spool)
+        # The newest messages are kept, in order, and replay starts at the oldest kept one
+        self.assertEqual(remaining, list(range(remaining[0], 40)))
+        self.assertGreater(remaining[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()